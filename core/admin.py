@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import InvestmentProfile
+from .models import InvestmentProfile, AllocationResult, AllocationJob
 
 @admin.register(InvestmentProfile)
 class InvestmentProfileAdmin(admin.ModelAdmin):
@@ -16,3 +16,18 @@ class InvestmentProfileAdmin(admin.ModelAdmin):
             'fields': ('confidence', 'knowledge', 'comfort_with_negatives', 'market_awareness', 'experience')
         }),
     )
+
+
+@admin.register(AllocationResult)
+class AllocationResultAdmin(admin.ModelAdmin):
+    list_display = ('id', 'profile', 'risk_profile', 'model_version', 'data_version', 'updated_at')
+    list_filter = ('risk_profile', 'model_version', 'data_version')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+
+@admin.register(AllocationJob)
+class AllocationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'profile', 'status', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
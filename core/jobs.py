@@ -0,0 +1,122 @@
+import logging
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AllocationJob
+from .serializers import InvestmentProfileSerializer
+from .utils import get_investment_allocation, save_allocation_result
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_allocation_job(profile):
+    """
+    Queue an allocation computation for a saved profile.
+
+    Args:
+        profile (InvestmentProfile): Profile to compute the allocation for
+
+    Returns:
+        AllocationJob: The pending job
+    """
+    return AllocationJob.objects.create(profile=profile)
+
+
+def claim_allocation_job(worker_id, batch=10):
+    """
+    Atomically claim the oldest pending job for a worker.
+
+    Each candidate is claimed with a conditional UPDATE on status, so two workers
+    can never both move the same job to running, even on SQLite where
+    SELECT ... FOR UPDATE SKIP LOCKED is unavailable.
+
+    Args:
+        worker_id (str): Identifier stored on the claimed job
+        batch (int): Pending candidates tried before giving up
+
+    Returns:
+        AllocationJob: The claimed job, or None if nothing is pending
+    """
+    candidates = (AllocationJob.objects
+                  .filter(status=AllocationJob.STATUS_PENDING)
+                  .order_by('created_at', 'id')
+                  .values_list('id', flat=True)[:batch])
+    for job_id in candidates:
+        claimed = AllocationJob.objects.filter(pk=job_id, status=AllocationJob.STATUS_PENDING).update(
+            status=AllocationJob.STATUS_RUNNING,
+            worker=worker_id,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return AllocationJob.objects.select_related('profile').get(pk=job_id)
+    return None
+
+
+def run_allocation_job(job, max_attempts=3):
+    """
+    Compute and store the allocation for a claimed job.
+
+    Failed jobs go back to pending until they have been attempted
+    ``max_attempts`` times, after which they are marked failed.
+
+    Args:
+        job (AllocationJob): Job claimed by claim_allocation_job
+        max_attempts (int): Attempts allowed before the job fails for good
+
+    Returns:
+        bool: True if the allocation was computed and stored
+    """
+    try:
+        profile_data = InvestmentProfileSerializer(job.profile).data
+        result = get_investment_allocation(profile_data)
+        if not result:
+            raise RuntimeError("Allocation prediction returned no result")
+        save_allocation_result(job.profile, result)
+    except Exception as e:
+        logger.error(f"Allocation job {job.id} failed (attempt {job.attempts}): {str(e)}")
+        job.error = str(e)
+        if job.attempts >= max_attempts:
+            job.status = AllocationJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = AllocationJob.STATUS_PENDING
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return False
+
+    job.status = AllocationJob.STATUS_SUCCEEDED
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return True
+
+
+def requeue_stale_jobs(stale_after, max_attempts=3):
+    """
+    Return running jobs abandoned by a dead worker to the queue.
+
+    A job that has already been attempted ``max_attempts`` times is marked
+    failed instead, so a job that keeps killing its worker (out of memory, a
+    crash in native code) is not retried forever.
+
+    Args:
+        stale_after (float): Seconds a job may stay running before it is considered abandoned
+        max_attempts (int): Attempts allowed before an abandoned job fails for good
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = AllocationJob.objects.filter(status=AllocationJob.STATUS_RUNNING, started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=AllocationJob.STATUS_FAILED,
+        error=f"Worker stopped responding on each of {max_attempts} attempts",
+        finished_at=timezone.now(),
+    )
+    if failed:
+        logger.error(f"Marked {failed} stale allocation jobs failed after {max_attempts} attempts")
+    requeued = stale.filter(attempts__lt=max_attempts).update(status=AllocationJob.STATUS_PENDING, worker='')
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale allocation jobs")
+    return requeued
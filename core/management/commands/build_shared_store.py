@@ -0,0 +1,62 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils import _add_scripts_path
+
+
+def _entry_size(directory):
+    import shared_store
+    version_dir = os.path.join(directory, shared_store.entry_version(directory))
+    return sum(entry.stat().st_size for entry in os.scandir(version_dir) if entry.is_file())
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the compiled allocation model and every market dataset as memory-mapped "
+        "arrays, shared read-only by all web workers, allocation workers and optimizer "
+        "service processes on the host. Rerun after changing the model or a data file; "
+        "until then processes fall back to loading their own copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store',
+                            help='Store directory (default: NEXALT_SHARED_STORE or scripts/shared_store)')
+
+    def handle(self, *args, **options):
+        _add_scripts_path()
+        import shared_store
+        from compiled_model import compile_model
+        from market_data import MarketDataRegistry, register_default_datasets
+        from market_snapshot import SNAPSHOT_EXTENSION
+
+        store_dir = options['store'] or shared_store.DEFAULT_STORE_DIR
+
+        # Compile from the joblib files rather than reusing a model this process mapped
+        # from the store it is about to replace
+        import prediction_allocation
+        compiled = compile_model(prediction_allocation.model, prediction_allocation.scaler)
+        if compiled is None:
+            raise CommandError("The allocation model cannot be compiled; nothing to share")
+        model_entry = shared_store.entry_path('model', store_dir)
+        compiled.to_store(model_entry, prediction_allocation.MODEL_VERSION)
+        self.stdout.write(f"model {prediction_allocation.MODEL_VERSION}: {_entry_size(model_entry) / 1024:.0f} KB")
+
+        # A registry without a store parses every file afresh
+        registry = MarketDataRegistry()
+        register_default_datasets(registry)
+        exported = 0
+        for name in registry.names():
+            dataset = registry.get(name)
+            if dataset is None:
+                continue
+            if dataset.path.endswith(SNAPSHOT_EXTENSION):
+                self.stdout.write(f"market/{name}: memory-mapped from {dataset.path} already, skipped")
+                continue
+            entry = shared_store.entry_path(f'market/{name}', store_dir)
+            dataset.to_store(entry)
+            exported += 1
+            self.stdout.write(f"market/{name} {dataset.fingerprint[:12]}: {len(dataset):,} rows, "
+                              f"{_entry_size(entry) / 1024:.0f} KB")
+
+        self.stdout.write(self.style.SUCCESS(f"Exported the model and {exported} market datasets to {store_dir}"))
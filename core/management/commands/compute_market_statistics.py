@@ -0,0 +1,103 @@
+import os
+import glob
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils import _add_scripts_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the Mean Daily Return and Daily Volatility of every instrument from raw daily "
+        "price files (Date,Symbol,Close rows, or a Date column plus one price column per "
+        "instrument) and write them in the statistics format the optimizers read. Files are "
+        "streamed in chunks and per-instrument running statistics are kept, so later runs only "
+        "process days that were not seen before. The asset class's snapshot is rewritten too "
+        "when one exists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('asset_class', help='bond, crypto, currency or equity')
+        parser.add_argument('price_files', nargs='*',
+                            help='Price CSVs, processed in order (default: scripts/prices/<asset class>/*.csv)')
+        parser.add_argument('--output', help='Statistics CSV to write (default: the file the optimizer reads)')
+        parser.add_argument('--chunk-size', type=int, default=200000,
+                            help='Price rows parsed per chunk (default: 200000)')
+        parser.add_argument('--min-days', type=int, default=2,
+                            help='Daily returns an instrument needs to be included (default: 2)')
+        parser.add_argument('--full', action='store_true',
+                            help='Discard the running statistics and recompute from the files alone')
+        parser.add_argument('--record', action='store_true',
+                            help='Also store the result in the snapshot history under the last price date')
+
+    def handle(self, *args, **options):
+        _add_scripts_path()
+        import market_snapshot
+        from market_data import SCRIPT_DIR, DATASET_FILES, EQUITY_FILE_PREFIX, market_data
+        from price_statistics import PRICE_DIR, PriceStatistics
+        from snapshot_history import SnapshotHistory, key_date
+
+        asset_class = options['asset_class']
+        if asset_class not in market_snapshot.SCHEMAS:
+            raise CommandError(f"Unknown asset class '{asset_class}', expected one of {list(market_snapshot.SCHEMAS)}")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        paths = options['price_files'] or sorted(glob.glob(os.path.join(PRICE_DIR, asset_class, '*.csv')))
+        if not paths:
+            raise CommandError(f"No price files given and none in {os.path.join(PRICE_DIR, asset_class)}")
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            raise CommandError(f"Price files not found: {missing}")
+
+        statistics = PriceStatistics(asset_class)
+        if options['full']:
+            statistics.reset()
+
+        started = time.perf_counter()
+        for path in paths:
+            try:
+                added = statistics.update_from_file(path, options['chunk_size'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"{path}: " + ("unchanged, skipped" if added is None else f"{added:,} new daily returns"))
+
+        last_date = statistics.last_date()
+        columns = statistics.columns(options['min_days'])
+        if last_date is None or not len(columns['symbol']):
+            raise CommandError(f"No instrument has {options['min_days']} daily returns yet")
+
+        if asset_class == 'bond':
+            # Raw bond prices rarely carry names; keep the ones the current file has
+            current = market_data.get('bond')
+            if current is not None:
+                known = dict(zip(current['symbol'], current['name']))
+                columns['name'] = [name if name != symbol else known.get(symbol, name)
+                                   for symbol, name in zip(columns['symbol'], columns['name'])]
+
+        if options['output']:
+            output = options['output']
+        elif asset_class == 'equity':
+            output = os.path.join(SCRIPT_DIR, f'{EQUITY_FILE_PREFIX}{last_date}.csv')
+        else:
+            output = os.path.join(SCRIPT_DIR, DATASET_FILES[asset_class])
+        market_snapshot.write_csv_columns(output, asset_class, columns)
+
+        # The optimizers read the snapshot ahead of the CSV, so keep it in step
+        snapshot = market_snapshot.snapshot_path(asset_class)
+        if not options['output'] and os.path.exists(snapshot):
+            market_snapshot.convert_csv(output, asset_class, snapshot)
+            self.stdout.write(f"Updated {snapshot}")
+
+        if options['record']:
+            source = {'path': os.path.basename(output)}
+            stored = SnapshotHistory(asset_class).add(last_date, columns, source)
+            self.stdout.write(f"History {key_date(last_date)}: " + ("stored" if stored else "unchanged, not stored"))
+
+        # Saved last: if anything above fails, the next run reprocesses the same days
+        statistics.save()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(columns['symbol']):,} {asset_class} instruments to {output} "
+            f"(prices to {key_date(last_date)}) in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils import _add_scripts_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the market statistics CSVs to binary snapshots (scripts/snapshots/<asset class>.mds): "
+        "typed columns under one normalised schema, a content hash, and memory-mapped loading. "
+        "The optimizers read an asset class's snapshot instead of its CSV once it exists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('asset_classes', nargs='*',
+                            help='Asset classes to convert (default: bond, crypto, currency and equity)')
+        parser.add_argument('--output-dir', help='Snapshot directory (default: scripts/snapshots)')
+        parser.add_argument('--verify', action='store_true',
+                            help='Re-read every snapshot and check it against its content hash and the CSV')
+
+    def handle(self, *args, **options):
+        _add_scripts_path()
+        import market_snapshot
+        from market_data import SCRIPT_DIR, DATASET_FILES, latest_equity_file
+
+        asset_classes = options['asset_classes'] or list(market_snapshot.SCHEMAS)
+        unknown = [name for name in asset_classes if name not in market_snapshot.SCHEMAS]
+        if unknown:
+            raise CommandError(f"Unknown asset classes {unknown}, expected some of {list(market_snapshot.SCHEMAS)}")
+        output_dir = options['output_dir'] or market_snapshot.SNAPSHOT_DIR
+
+        for asset_class in asset_classes:
+            if asset_class == 'equity':
+                csv_path = latest_equity_file(SCRIPT_DIR)
+            else:
+                csv_path = os.path.join(SCRIPT_DIR, DATASET_FILES[asset_class])
+            if csv_path is None or not os.path.exists(csv_path):
+                raise CommandError(f"No CSV found for {asset_class}")
+
+            path, content_hash = market_snapshot.convert_csv(
+                csv_path, asset_class, market_snapshot.snapshot_path(asset_class, output_dir)
+            )
+            started = time.perf_counter()
+            header, columns = market_snapshot.read_snapshot(path, asset_class)
+            load_us = (time.perf_counter() - started) * 1e6
+            self.stdout.write(
+                f"{asset_class}: {os.path.basename(csv_path)} -> {path} ({header['rows']:,} rows, "
+                f"{os.path.getsize(path) / 1024:.0f} KB, {content_hash[:12]}, loads in {load_us:.0f} us)"
+            )
+
+            if options['verify']:
+                with open(csv_path, 'rb') as f:
+                    expected = market_snapshot.read_csv_columns(asset_class, f.read())
+                matches = all((columns[name] == values).all() for name, values in expected.items())
+                if not market_snapshot.verify_snapshot(path) or not matches:
+                    raise CommandError(f"{path} does not match {csv_path}")
+
+        self.stdout.write(self.style.SUCCESS(f"Converted {len(asset_classes)} asset classes"))
@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils import _add_scripts_path
+
+# Market dataset -> allocation key of the optimizer that reads it
+ALLOCATION_KEYS = {
+    'equity': 'equity',
+    'crypto': 'crypto',
+    'currency': 'cash',
+    'bond': 'debt',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep dated versions of the market statistics (scripts/snapshots/history) and replay "
+        "the optimizers against any of them. 'record' stores the current data under a date, "
+        "'import-files' stores every dated nifty100_simulation_data_YYYYMMDD.csv under its own "
+        "date, 'list' shows what is stored and 'replay' computes recommendations as of a date."
+    )
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+
+        record = actions.add_parser('record', help='Store the current statistics under a date')
+        record.add_argument('asset_classes', nargs='*', help='Default: every asset class')
+        record.add_argument('--date', help='Date the statistics apply from, YYYY-MM-DD (default: today)')
+
+        actions.add_parser('import-files', help='Store every dated equity statistics file under its date')
+
+        listing = actions.add_parser('list', help='Show the stored dates')
+        listing.add_argument('asset_classes', nargs='*', help='Default: every asset class')
+
+        replay = actions.add_parser('replay', help='Recommendations from the statistics in force on a date, '
+                                                   'always with uncorrelated assets')
+        replay.add_argument('date', help='YYYY-MM-DD')
+        replay.add_argument('amount', type=float, help='Amount invested in each asset class')
+        replay.add_argument('asset_classes', nargs='*', help='Default: every asset class')
+
+    def handle(self, *args, **options):
+        _add_scripts_path()
+        import market_snapshot
+
+        asset_classes = options.get('asset_classes') or list(market_snapshot.SCHEMAS)
+        unknown = [name for name in asset_classes if name not in market_snapshot.SCHEMAS]
+        if unknown:
+            raise CommandError(f"Unknown asset classes {unknown}, expected some of {list(market_snapshot.SCHEMAS)}")
+
+        try:
+            getattr(self, options['action'].replace('-', '_'))(asset_classes, options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+    def _history(self, asset_class):
+        from snapshot_history import SnapshotHistory
+        return SnapshotHistory(asset_class)
+
+    def record(self, asset_classes, options):
+        from market_data import market_data
+        date = options['date'] or datetime.date.today().isoformat()
+
+        for asset_class in asset_classes:
+            dataset = market_data.get(asset_class)
+            if dataset is None:
+                raise CommandError(f"No current {asset_class} data to record")
+            source = {'path': os.path.basename(dataset.path), 'fingerprint': dataset.fingerprint}
+            stored = self._history(asset_class).add(date, dataset.columns, source)
+            self.stdout.write(f"{asset_class} {date}: " + ("stored" if stored else "unchanged, not stored"))
+
+    def import_files(self, asset_classes, options):
+        from market_data import SCRIPT_DIR, EQUITY_FILE_PREFIX
+        import market_snapshot
+
+        pattern = re.compile(rf'^{EQUITY_FILE_PREFIX}(\d{{8}})\.csv$')
+        files = sorted(name for name in os.listdir(SCRIPT_DIR) if pattern.match(name))
+        if not files:
+            raise CommandError(f"No {EQUITY_FILE_PREFIX}YYYYMMDD.csv files in {SCRIPT_DIR}")
+
+        history = self._history('equity')
+        for name in files:
+            with open(os.path.join(SCRIPT_DIR, name), 'rb') as f:
+                columns = market_snapshot.read_csv_columns('equity', f.read())
+            date = pattern.match(name).group(1)
+            stored = history.add(date, columns, {'path': name})
+            self.stdout.write(f"equity {date}: {name} " + ("stored" if stored else "unchanged, not stored"))
+
+    def list(self, asset_classes, options):
+        for asset_class in asset_classes:
+            history = self._history(asset_class)
+            if not len(history):
+                self.stdout.write(f"{asset_class}: no history")
+                continue
+            rows = sum(int(history.offsets[i + 1] - history.offsets[i]) for i in range(len(history)))
+            self.stdout.write(f"{asset_class}: {len(history)} dates, {rows:,} instrument rows "
+                              f"stored as {history.pool_size():,} distinct rows")
+            for i, date in enumerate(history.date_list()):
+                source = history.sources[i].get('path', '') if i < len(history.sources) else ''
+                count = int(history.offsets[i + 1] - history.offsets[i])
+                self.stdout.write(f"  {date}  {count:>6,} instruments  {str(history.hashes[i])[:12]}  {source}")
+
+    def replay(self, asset_classes, options):
+        from asset_optimizers import run_optimizer
+
+        results = {}
+        for asset_class in asset_classes:
+            history = self._history(asset_class)
+            effective = history.effective_date(options['date'])
+            if effective is None:
+                raise CommandError(f"No {asset_class} statistics recorded on or before {options['date']}")
+            result = run_optimizer(
+                ALLOCATION_KEYS[asset_class], options['amount'],
+                mode=getattr(settings, 'PORTFOLIO_OPTIMIZER_MODE', 'monte_carlo'),
+                use_cache=False,
+                covariance_model=getattr(settings, 'PORTFOLIO_COVARIANCE_MODEL', 'diagonal'),
+                sampler=getattr(settings, 'PORTFOLIO_SAMPLER', 'random'),
+                as_of=options['date'],
+            )
+            if result is None:
+                raise CommandError(f"The {asset_class} optimizer failed as of {options['date']}")
+            results[asset_class] = {'statistics_date': effective.isoformat(), **result}
+
+        self.stdout.write(json.dumps(results, indent=2, default=float))
@@ -0,0 +1,108 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import AllocationResult
+from core.serializers import InvestmentProfileSerializer
+from core.utils import (
+    compute_allocation_versions, compute_block_versions, compute_investment_allocations,
+    refresh_stale_blocks,
+)
+
+UPDATE_FIELDS = [
+    'allocation', 'recommended_instruments', 'recommendations', 'risk_profile',
+    'model_version', 'data_version', 'block_versions', 'updated_at',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring stored allocation results up to date with the current model and market data. "
+        "Results from an older model are recomputed in full; otherwise only the recommendation "
+        "blocks whose market data changed are re-optimized, so refreshing crypto_stats.csv "
+        "leaves the equity, currency and bond recommendations untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Results loaded, recomputed and written per batch (default: 500)')
+        parser.add_argument('--all', action='store_true',
+                            help='Treat every block as stale, e.g. after changing optimizer settings')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the stale results and blocks')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        # Computed in this process, like the results it writes
+        model_version, data_version = compute_allocation_versions()
+        block_versions = compute_block_versions()
+
+        results = AllocationResult.objects.select_related('profile').order_by('pk')
+        if not options['all']:
+            results = results.exclude(model_version=model_version, data_version=data_version)
+
+        started = time.perf_counter()
+        counts = Counter()
+        batch = []
+        for stored in results.iterator(chunk_size=batch_size):
+            if options['all']:
+                stored.block_versions = {}
+            batch.append(stored)
+            if len(batch) == batch_size:
+                self._refresh_batch(batch, model_version, data_version, block_versions, counts, options['dry_run'])
+                batch = []
+        if batch:
+            self._refresh_batch(batch, model_version, data_version, block_versions, counts, options['dry_run'])
+
+        for key in AllocationResult.RECOMMENDATION_KEYS:
+            self.stdout.write(f"{key}: {counts[key]:,}")
+        verb = "need refreshing" if options['dry_run'] else "refreshed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['results']:,} results {verb} ({counts['full']:,} in full for model {model_version}) "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def _refresh_batch(self, batch, model_version, data_version, block_versions, counts, dry_run):
+        outdated = [stored for stored in batch if stored.model_version != model_version]
+        current = [stored for stored in batch if stored.model_version == model_version]
+        counts['results'] += len(batch)
+        counts['full'] += len(outdated)
+        if dry_run:
+            counts.update({key: len(outdated) for key in AllocationResult.RECOMMENDATION_KEYS})
+            for stored in current:
+                counts.update(stored.stale_blocks(block_versions))
+            return
+
+        updated = []
+        now = timezone.now()
+
+        # A new model can move every allocation; score the whole batch in one pass
+        if outdated:
+            profiles_data = InvestmentProfileSerializer([stored.profile for stored in outdated], many=True).data
+            for stored, result in zip(outdated, compute_investment_allocations(profiles_data)):
+                if not result:
+                    continue
+                stored.update_from_result(result)
+                stored.model_version = model_version
+                stored.block_versions = dict(block_versions)
+                counts.update(key for key in AllocationResult.RECOMMENDATION_KEYS if key in result)
+                updated.append(stored)
+
+        for stored in current:
+            refreshed = refresh_stale_blocks(stored, block_versions)
+            counts.update(refreshed)
+            updated.append(stored)
+
+        for stored in updated:
+            # A result is current once every block is; a failed block keeps it stale for the next run
+            if not stored.stale_blocks(block_versions):
+                stored.data_version = data_version
+            stored.updated_at = now
+        with transaction.atomic():
+            AllocationResult.objects.bulk_update(updated, UPDATE_FIELDS)
@@ -0,0 +1,101 @@
+import os
+import time
+import socket
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from core.jobs import claim_allocation_job, run_allocation_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued allocation jobs. Each worker thread claims the oldest "
+        "pending job, computes its allocation and stores the result."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Jobs processed in parallel (default: 2)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty (default: 1.0)')
+        parser.add_argument('--max-attempts', type=int, default=3,
+                            help='Attempts before a job is marked failed (default: 3)')
+        parser.add_argument('--stale-after', type=float, default=600.0,
+                            help='Seconds after which a running job is requeued (default: 600)')
+        parser.add_argument('--requeue-interval', type=float, default=60.0,
+                            help='Seconds between checks for stale jobs of crashed workers (default: 60)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        poll_interval = options['poll_interval']
+        if concurrency < 1 or options['max_attempts'] < 1:
+            raise CommandError("--concurrency and --max-attempts must be positive")
+
+        worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        requeue_stale_jobs(options['stale_after'], options['max_attempts'])
+
+        stop = threading.Event()
+        counts = {'succeeded': 0, 'failed': 0}
+        counts_lock = threading.Lock()
+        requeued_at = [time.monotonic()]
+        requeue_lock = threading.Lock()
+
+        def requeue_if_due():
+            # Another worker may have crashed with jobs still running; one thread checks per interval
+            if time.monotonic() - requeued_at[0] < options['requeue_interval']:
+                return
+            if not requeue_lock.acquire(blocking=False):
+                return
+            try:
+                if time.monotonic() - requeued_at[0] >= options['requeue_interval']:
+                    requeued_at[0] = time.monotonic()
+                    requeue_stale_jobs(options['stale_after'], options['max_attempts'])
+            finally:
+                requeue_lock.release()
+
+        def work(thread_index):
+            worker_id = f"{worker_name}:{thread_index}"
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    requeue_if_due()
+                    job = claim_allocation_job(worker_id)
+                    if job is None:
+                        if options['once']:
+                            return
+                        stop.wait(poll_interval)
+                        continue
+
+                    succeeded = run_allocation_job(job, max_attempts=options['max_attempts'])
+                    with counts_lock:
+                        counts['succeeded' if succeeded else 'failed'] += 1
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"[{worker_id}] job {job.id}: {'done' if succeeded else 'failed'}")
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=work, args=(index,), name=f'allocation-worker-{index}', daemon=True)
+            for index in range(concurrency)
+        ]
+        self.stdout.write(f"Allocation worker {worker_name} started with {concurrency} threads")
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after in-flight jobs finish...")
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Allocation worker stopped: {counts['succeeded']} succeeded, {counts['failed']} failed attempts"
+        ))
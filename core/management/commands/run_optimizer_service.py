@@ -0,0 +1,64 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.optimizer_service import OptimizerService, default_socket_path
+from core.utils import _add_scripts_path, configure_optimizer_executor, preload_allocation_data
+
+
+def _warm_worker():
+    """Import the optimizers and load every market dataset in an executor worker"""
+    preload_allocation_data()
+    return os.getpid()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the optimizer service: a long-lived process that preloads the allocation "
+        "model and market data, keeps a warm optimizer pool and answers allocation "
+        "requests from web workers over a Unix-domain socket."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket',
+                            help='Socket path (default: OPTIMIZER_SERVICE_SOCKET or BASE_DIR/optimizer.sock)')
+        parser.add_argument('--executor', choices=['process', 'thread'], default='process',
+                            help="Pool that runs the per-asset-class optimizers (default: process)")
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'ALLOCATION_MAX_WORKERS', 4),
+                            help='Optimizer pool size (default: ALLOCATION_MAX_WORKERS)')
+
+    def handle(self, *args, **options):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise CommandError("The optimizer service needs Unix-domain sockets, which this platform lacks")
+        if options['workers'] < 1:
+            raise CommandError("--workers must be positive")
+        path = options['socket'] or default_socket_path()
+
+        started = time.monotonic()
+        _add_scripts_path()
+        import prediction_allocation
+        executor = configure_optimizer_executor(options['executor'], options['workers'])
+        _warm_worker()
+        for future in [executor.submit(_warm_worker) for _ in range(options['workers'])]:
+            future.result()
+        self.stdout.write(
+            f"Loaded model {prediction_allocation.MODEL_VERSION[:12]} and market data, "
+            f"{options['workers']} warm {options['executor']} worker(s) in {time.monotonic() - started:.1f}s"
+        )
+
+        try:
+            server = OptimizerService(path)
+        except OSError as e:
+            raise CommandError(f"Cannot listen on {path}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Optimizer service listening on {path}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping optimizer service...")
+        finally:
+            server.server_close()
+            executor.shutdown(wait=True)
@@ -0,0 +1,144 @@
+import os
+import time
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils import _add_scripts_path
+
+
+def _read_chunks(path, input_format, chunk_size):
+    """Yield DataFrames of at most ``chunk_size`` profiles from a CSV or JSONL file"""
+    if input_format == 'csv':
+        return pd.read_csv(path, chunksize=chunk_size)
+    return pd.read_json(path, lines=True, chunksize=chunk_size)
+
+
+def _score_chunk(chunk, id_column):
+    """
+    Score one chunk of profiles; runs in the parent or in a worker process.
+
+    Rows with a missing or non-numeric feature are left out rather than failing
+    the whole chunk.
+
+    Returns:
+        tuple: (scores DataFrame, or None if every row was skipped; number of rows skipped)
+    """
+    _add_scripts_path()
+    from prediction_allocation import FEATURES, predict_allocation_frame
+
+    features = chunk.reindex(columns=FEATURES).apply(pd.to_numeric, errors='coerce')
+    valid = features.notna().all(axis=1).to_numpy()
+    if not valid.any():
+        return None, len(chunk)
+    scores = predict_allocation_frame(features[valid])
+    if id_column and id_column in chunk:
+        scores.insert(0, id_column, chunk[id_column].to_numpy()[valid])
+    return scores, int(len(chunk) - valid.sum())
+
+
+def _detect_format(path, explicit):
+    if explicit:
+        return explicit
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.json', '.ndjson'):
+        return 'jsonl'
+    raise CommandError(f"Cannot infer the format of {path}; pass --input-format/--output-format")
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-score investment profiles from a CSV/JSONL file in fixed-size chunks, "
+        "streaming allocation percentages and risk profiles to an output file. Rows "
+        "with a missing or non-numeric feature are skipped and counted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='CSV or JSONL file with one profile per row')
+        parser.add_argument('output', help='CSV or JSONL file to write scores to')
+        parser.add_argument('--input-format', choices=['csv', 'jsonl'])
+        parser.add_argument('--output-format', choices=['csv', 'jsonl'])
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Profiles scored per chunk (default: 10000)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes scoring chunks in parallel (default: 1)')
+        parser.add_argument('--id-column', default='id',
+                            help='Input column copied to the output when present (default: id)')
+
+    def handle(self, *args, **options):
+        input_path = options['input']
+        output_path = options['output']
+        input_format = _detect_format(input_path, options['input_format'])
+        output_format = _detect_format(output_path, options['output_format'])
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        id_column = options['id_column']
+
+        if not os.path.exists(input_path):
+            raise CommandError(f"Input file {input_path} does not exist")
+        if chunk_size < 1 or workers < 1:
+            raise CommandError("--chunk-size and --workers must be positive")
+
+        # Load the scaler and model once in this process; forked workers inherit them
+        _add_scripts_path()
+        import prediction_allocation
+
+        chunks = _read_chunks(input_path, input_format, chunk_size)
+        first = next(chunks, None)
+        if first is None:
+            raise CommandError(f"Input file {input_path} has no profiles")
+        missing = [feature for feature in prediction_allocation.FEATURES if feature not in first]
+        if missing:
+            raise CommandError(f"Input file {input_path} is missing the columns {missing}")
+        chunks = itertools.chain([first], chunks)
+
+        started = time.perf_counter()
+        total = 0
+        skipped = 0
+
+        with open(output_path, 'w', newline='') as output:
+            for scores, chunk_skipped in self._score_stream(chunks, id_column, workers):
+                skipped += chunk_skipped
+                if scores is None:
+                    continue
+                if output_format == 'csv':
+                    scores.to_csv(output, header=(total == 0), index=False)
+                else:
+                    lines = scores.to_json(orient='records', lines=True)
+                    output.write(lines if lines.endswith('\n') else lines + '\n')
+
+                total += len(scores)
+                if options['verbosity'] > 1:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"Scored {total:,} profiles, skipped {skipped:,} "
+                                      f"({total / elapsed:,.0f} profiles/s)")
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed > 0 else 0.0
+        if skipped:
+            self.stderr.write(f"Skipped {skipped:,} rows with missing or non-numeric features")
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {total:,} profiles in {elapsed:.2f}s ({rate:,.0f} profiles/s), "
+            f"skipped {skipped:,} -> {output_path}"
+        ))
+
+    def _score_stream(self, chunks, id_column, workers):
+        """Yield (scores, rows skipped) per chunk in input order, keeping at most 2 * workers chunks in flight"""
+        if workers == 1:
+            for chunk in chunks:
+                yield _score_chunk(chunk, id_column)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_score_chunk, chunk, id_column))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllocationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('allocation', models.JSONField()),
+                ('recommended_instruments', models.JSONField(blank=True, default=dict)),
+                ('recommendations', models.JSONField(blank=True, default=dict)),
+                ('risk_profile', models.CharField(blank=True, max_length=20)),
+                ('model_version', models.CharField(max_length=64)),
+                ('data_version', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='allocation_result', to='core.investmentprofile')),
+            ],
+        ),
+    ]
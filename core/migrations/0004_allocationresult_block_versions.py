@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_allocationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationresult',
+            name='block_versions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -17,3 +17,92 @@ class InvestmentProfile(models.Model):
     
     def __str__(self):
         return f"Investment Profile {self.id}"
+
+
+class AllocationResult(models.Model):
+    """Allocation and recommendations computed for a profile, stored once and reused by the result page."""
+    
+    RECOMMENDATION_KEYS = (
+        'equity_recommendations',
+        'crypto_recommendations',
+        'currency_recommendations',
+        'bond_recommendations',
+    )
+    
+    profile = models.OneToOneField(InvestmentProfile, on_delete=models.CASCADE, related_name='allocation_result')
+    allocation = models.JSONField()
+    recommended_instruments = models.JSONField(default=dict, blank=True)
+    recommendations = models.JSONField(default=dict, blank=True)
+    risk_profile = models.CharField(max_length=20, blank=True)
+    model_version = models.CharField(max_length=64)
+    data_version = models.CharField(max_length=64)
+    # Recommendation key -> data version that block was computed from
+    block_versions = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Allocation Result for Profile {self.profile_id}"
+    
+    @classmethod
+    def from_result(cls, profile, result, model_version, data_version, block_versions=None):
+        """Build an unsaved instance from a get_investment_allocation result"""
+        instance = cls(profile=profile, model_version=model_version, data_version=data_version,
+                       block_versions=block_versions or {})
+        instance.update_from_result(result)
+        return instance
+    
+    def update_from_result(self, result):
+        """Copy the fields of a get_investment_allocation result onto this instance"""
+        self.allocation = result['allocation']
+        self.recommended_instruments = result.get('recommended_instruments', {})
+        self.risk_profile = result.get('risk_profile', '')
+        self.recommendations = {
+            key: result[key] for key in self.RECOMMENDATION_KEYS if key in result
+        }
+    
+    def stale_blocks(self, block_versions):
+        """Recommendation keys whose stored data version differs from ``block_versions``"""
+        return [key for key, version in block_versions.items() if self.block_versions.get(key) != version]
+    
+    def as_result(self):
+        """Rebuild the get_investment_allocation result layout"""
+        result = {'allocation': self.allocation}
+        if self.recommended_instruments:
+            result['recommended_instruments'] = self.recommended_instruments
+        if self.risk_profile:
+            result['risk_profile'] = self.risk_profile
+        result.update(self.recommendations)
+        return result
+
+
+class AllocationJob(models.Model):
+    """Queued allocation computation for a profile, processed by run_allocation_worker."""
+    
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    profile = models.ForeignKey(InvestmentProfile, on_delete=models.CASCADE, related_name='allocation_jobs')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='core_job_status_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Allocation Job {self.id} ({self.status})"
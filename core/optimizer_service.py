@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import socket
+import struct
+import logging
+import threading
+import socketserver
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Each message is a 4-byte big-endian length followed by that many bytes of UTF-8 JSON
+_HEADER = struct.Struct('>I')
+
+# Largest message either side accepts, a guard against a corrupt length prefix
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+# Socket file name under BASE_DIR when neither the setting nor --socket gives a path
+DEFAULT_SOCKET_NAME = 'optimizer.sock'
+
+
+class OptimizerServiceUnavailable(Exception):
+    """The optimizer service could not be reached; the caller should compute in-process"""
+
+
+class OptimizerServiceError(Exception):
+    """The optimizer service was reached but failed to handle the request"""
+
+
+def _json_default(value):
+    """Encode NumPy scalars and arrays that end up in allocation results"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def send_message(sock, payload):
+    """Write one length-prefixed JSON message"""
+    body = json.dumps(payload, default=_json_default).encode()
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _receive_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-message")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def receive_message(sock):
+    """
+    Read one length-prefixed JSON message.
+
+    Returns:
+        object: Decoded payload, or None if the peer closed the connection between messages
+    """
+    header = sock.recv(_HEADER.size, socket.MSG_WAITALL)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        raise ConnectionError("Connection closed mid-header")
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise ValueError(f"Message of {size} bytes exceeds the {MAX_MESSAGE_BYTES} byte limit")
+    return json.loads(_receive_exactly(sock, size))
+
+
+def default_socket_path():
+    """Socket path from OPTIMIZER_SERVICE_SOCKET, falling back to BASE_DIR/optimizer.sock"""
+    path = getattr(settings, 'OPTIMIZER_SERVICE_SOCKET', None) or os.path.join(settings.BASE_DIR, DEFAULT_SOCKET_NAME)
+    return os.fspath(path)
+
+
+class OptimizerServiceClient:
+    """
+    Calls the optimizer service over its Unix-domain socket.
+
+    A connection is opened per call, which costs microseconds on a local socket
+    and keeps the client safe to share between threads. When the socket is
+    missing or refuses connections the service is assumed down for
+    ``retry_interval`` seconds, so requests fall back to in-process computation
+    without paying for a connect attempt each time.
+    """
+
+    def __init__(self, path, timeout=60.0, retry_interval=5.0):
+        self.path = os.fspath(path)
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._unavailable_until = 0.0
+
+    def call(self, op, **params):
+        """
+        Send one request and return the service's result.
+
+        Args:
+            op (str): Operation name, e.g. 'allocate'
+            **params: JSON-serialisable operation arguments
+
+        Returns:
+            object: The operation's result
+
+        Raises:
+            OptimizerServiceUnavailable: The service is not running or cannot be connected to
+            OptimizerServiceError: The service reported an error, failed mid-request or did
+                not answer within the timeout
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            raise OptimizerServiceUnavailable("Unix-domain sockets are not supported on this platform")
+        if time.monotonic() < self._unavailable_until:
+            raise OptimizerServiceUnavailable(f"Optimizer service at {self.path} was recently unreachable")
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                # Not running, as opposed to busy or slow; stop trying for a while
+                self._unavailable_until = time.monotonic() + self.retry_interval
+                logger.warning(f"Optimizer service at {self.path} unavailable, computing in-process: {e}")
+                raise OptimizerServiceUnavailable(f"Optimizer service at {self.path} unavailable: {e}") from e
+            except OSError as e:
+                logger.warning(f"Optimizer service at {self.path} unavailable, computing in-process: {e}")
+                raise OptimizerServiceUnavailable(f"Optimizer service at {self.path} unavailable: {e}") from e
+
+            # Connected, so the service is running: a slow or failed request is its error,
+            # never a reason to repeat the whole computation in this process
+            try:
+                send_message(sock, {'op': op, 'params': params})
+                response = receive_message(sock)
+            except socket.timeout as e:
+                raise OptimizerServiceError(f"Optimizer service did not answer '{op}' within {self.timeout}s") from e
+            except (OSError, ValueError) as e:
+                raise OptimizerServiceError(f"Optimizer service request '{op}' failed: {e}") from e
+
+        if response is None:
+            raise OptimizerServiceError("Optimizer service closed the connection without replying")
+        if not response.get('ok'):
+            raise OptimizerServiceError(response.get('error', 'Unknown optimizer service error'))
+        return response.get('result')
+
+    def allocate(self, profile_data, budget=None):
+        """Remote get_investment_allocation"""
+        return self.call('allocate', profile=profile_data, budget=budget)
+
+    def allocate_batch(self, profiles_data):
+        """Remote get_investment_allocations"""
+        return self.call('allocate_batch', profiles=profiles_data)
+
+    def versions(self):
+        """Remote get_allocation_versions"""
+        return tuple(self.call('versions'))
+
+    def block_versions(self):
+        """Remote get_block_versions"""
+        return self.call('block_versions')
+
+    def ping(self):
+        """Process id of the service, raising OptimizerServiceUnavailable if it is not running"""
+        return self.call('ping')
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_optimizer_service_client():
+    """
+    Shared client for OPTIMIZER_SERVICE_SOCKET, or None when no service is configured.
+    """
+    global _client
+    path = getattr(settings, 'OPTIMIZER_SERVICE_SOCKET', None)
+    if not path:
+        return None
+    with _client_lock:
+        if _client is None or _client.path != os.fspath(path):
+            _client = OptimizerServiceClient(
+                path,
+                timeout=getattr(settings, 'OPTIMIZER_SERVICE_TIMEOUT', 60.0),
+                retry_interval=getattr(settings, 'OPTIMIZER_SERVICE_RETRY_INTERVAL', 5.0),
+            )
+        return _client
+
+
+def _allocate(profile, budget=None):
+    from .utils import compute_investment_allocation
+    return compute_investment_allocation(profile, budget)
+
+
+def _allocate_batch(profiles):
+    from .utils import compute_investment_allocations
+    return compute_investment_allocations(profiles)
+
+
+def _versions():
+    from .utils import compute_allocation_versions
+    return list(compute_allocation_versions())
+
+
+def _block_versions():
+    from .utils import compute_block_versions
+    return compute_block_versions()
+
+
+# Operation name -> handler; handlers run the in-process implementations
+OPERATIONS = {
+    'allocate': _allocate,
+    'allocate_batch': _allocate_batch,
+    'versions': _versions,
+    'block_versions': _block_versions,
+    'ping': os.getpid,
+}
+
+
+class OptimizerRequestHandler(socketserver.BaseRequestHandler):
+    """Answers every request sent on one connection until the client closes it"""
+
+    def handle(self):
+        while True:
+            try:
+                request = receive_message(self.request)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping optimizer service connection: {e}")
+                return
+            if request is None:
+                return
+
+            handler = OPERATIONS.get(request.get('op')) if isinstance(request, dict) else None
+            if handler is None:
+                response = {'ok': False, 'error': f"Unknown operation {request!r:.100}"}
+            else:
+                try:
+                    response = {'ok': True, 'result': handler(**request.get('params', {}))}
+                except Exception as e:
+                    logger.error(f"Optimizer service '{request['op']}' failed: {str(e)}")
+                    response = {'ok': False, 'error': str(e)}
+
+            try:
+                send_message(self.request, response)
+            except OSError as e:
+                logger.warning(f"Could not reply to optimizer service client: {e}")
+                return
+
+
+class OptimizerService(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded Unix-domain socket server; each connection gets its own thread"""
+
+    daemon_threads = True
+
+    # Connections waiting to be accepted; every web worker thread may connect at once
+    request_queue_size = 128
+
+    def __init__(self, path):
+        path = os.fspath(path)
+        if os.path.exists(path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(path)
+                except OSError:
+                    # A socket left behind by a service that did not shut down cleanly
+                    os.unlink(path)
+                else:
+                    raise OSError(f"An optimizer service is already listening on {path}")
+        super().__init__(path, OptimizerRequestHandler)
+        os.chmod(path, 0o660)
+        self.path = path
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
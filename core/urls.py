@@ -6,4 +6,6 @@ urlpatterns = [
     path('investment/', views.investment_form, name='investment_form'),
     path('allocation-result/<int:profile_id>/', views.allocation_result, name='allocation_result'),
     path('api/investment-profile/', views.create_investment_profile, name='create_investment_profile'),
+    path('api/investment-profile/batch/', views.create_investment_profiles_batch, name='create_investment_profiles_batch'),
+    path('api/allocation-jobs/<int:job_id>/', views.allocation_job_status, name='allocation_job_status'),
 ]
\ No newline at end of file
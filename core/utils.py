@@ -1,26 +1,131 @@
 import os
 import sys
+import time
+import threading
 import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
-def get_investment_allocation(profile_data):
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _add_scripts_path():
+    """Make the modules in the scripts directory importable"""
+    scripts_dir = os.path.join(settings.BASE_DIR, 'scripts')
+    if scripts_dir not in sys.path:
+        sys.path.append(scripts_dir)
+
+
+def _make_executor(kind, max_workers):
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers)
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='optimizer')
+    raise ValueError(f"Unknown ALLOCATION_EXECUTOR '{kind}', expected 'thread' or 'process'")
+
+
+def get_optimizer_executor():
+    """
+    Shared, bounded executor that runs the per-asset-class optimizers.
+    
+    ALLOCATION_EXECUTOR picks 'thread' or 'process' workers and
+    ALLOCATION_MAX_WORKERS bounds the pool size.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = _make_executor(
+                getattr(settings, 'ALLOCATION_EXECUTOR', 'thread'),
+                getattr(settings, 'ALLOCATION_MAX_WORKERS', 4)
+            )
+        return _executor
+
+
+def configure_optimizer_executor(kind, max_workers):
+    """
+    Replace the shared optimizer executor, e.g. with a larger process pool in the optimizer service.
+    
+    Returns:
+        Executor: The new executor
+    """
+    global _executor
+    with _executor_lock:
+        previous, _executor = _executor, _make_executor(kind, max_workers)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    return _executor
+
+
+def preload_allocation_data():
+    """
+    Import the allocation model and optimizers and load every market dataset.
+    
+    Run in a server's master process before it forks workers (ALLOCATION_PRELOAD),
+    so the workers inherit everything already loaded; with a shared store
+    from `manage.py build_shared_store` the arrays are file-backed and stay
+    shared however long the workers run.
+    """
+    _add_scripts_path()
+    import prediction_allocation  # noqa: F401
+    import asset_optimizers
+    from market_data import market_data
+    
+    for _, module_name, _, _ in asset_optimizers.ASSET_CLASS_OPTIMIZERS.values():
+        __import__(module_name)
+    for name in market_data.names():
+        market_data.get(name)
+
+
+def _get_service_client():
+    """Optimizer service client when one is configured, otherwise None"""
+    from .optimizer_service import get_optimizer_service_client
+    return get_optimizer_service_client()
+
+
+def get_investment_allocation(profile_data, budget=None):
     """
     Get investment allocation prediction for a given profile.
     
+    With OPTIMIZER_SERVICE_SOCKET set, the optimizer service computes it so this
+    process never loads the model or market data; when the service is not
+    running the allocation is computed here instead.
+    
     Args:
         profile_data (dict): Dictionary containing user financial and risk profile data
+        budget (float): Seconds the whole computation may take, defaults to
+                        ALLOCATION_REQUEST_BUDGET (None for no limit)
     
     Returns:
         dict: Dictionary with allocation and recommended instruments,
               or None if prediction fails
     """
+    from .optimizer_service import OptimizerServiceUnavailable, OptimizerServiceError
+    
+    client = _get_service_client()
+    if client is not None:
+        try:
+            return client.allocate(profile_data, budget)
+        except OptimizerServiceUnavailable as e:
+            logger.debug(f"{str(e)}; computing allocation in-process")
+        except OptimizerServiceError as e:
+            logger.error(f"Error predicting allocation: {str(e)}")
+            return None
+    
+    return compute_investment_allocation(profile_data, budget)
+
+
+def compute_investment_allocation(profile_data, budget=None):
+    """In-process get_investment_allocation, also run by the optimizer service"""
+    if budget is None:
+        budget = getattr(settings, 'ALLOCATION_REQUEST_BUDGET', None)
+    deadline = time.monotonic() + budget if budget else None
+    
     try:
         # Add path to scripts directory to Python path
-        scripts_dir = os.path.join(settings.BASE_DIR, 'scripts')
-        if scripts_dir not in sys.path:
-            sys.path.append(scripts_dir)
+        _add_scripts_path()
         
         # Import prediction module
         from prediction_allocation import predict_allocation
@@ -28,63 +133,342 @@ def get_investment_allocation(profile_data):
         # Get allocation prediction with recommended instruments
         result = predict_allocation(profile_data, include_instruments=True)
         
-        # Get Monte Carlo recommendations for equity, crypto, and cash
-        if result and 'allocation' in result:
-            total_amount = profile_data.get('capital', 100000)
-            
-            # Add amount values to allocation
-            for asset_class, percentage in result['allocation'].items():
-                amount = total_amount * (percentage / 100)
-                result['allocation'][asset_class] = {
-                    'percentage': percentage,
-                    'amount': amount
-                }
-            
-            # Equity recommendations
-            if 'equity' in result['allocation']:
-                equity_amount = total_amount * (result['allocation']['equity']['percentage'] / 100)
-                if equity_amount > 0:
-                    from equity_monte_carlo import AdvancedMonteCarloOptimizer
-                    optimizer = AdvancedMonteCarloOptimizer()
-                    equity_recs = optimizer.get_stock_recommendations(equity_amount)
-                    if equity_recs:
-                        result['equity_recommendations'] = equity_recs['recommendations']
-            
-            # Crypto recommendations
-            if 'crypto' in result['allocation']:
-                crypto_amount = total_amount * (result['allocation']['crypto']['percentage'] / 100)
-                if crypto_amount > 0:
-                    from crypto_monte_carlo import CryptoMonteCarloOptimizer
-                    crypto_optimizer = CryptoMonteCarloOptimizer()
-                    crypto_recs = crypto_optimizer.get_crypto_recommendations(crypto_amount)
-                    if crypto_recs:
-                        result['crypto_recommendations'] = crypto_recs['recommendations']
-            
-            # Currency recommendations for cash allocation
-            if 'cash' in result['allocation']:
-                cash_amount = total_amount * (result['allocation']['cash']['percentage'] / 100)
-                if cash_amount > 0:
-                    from currency_monte_carlo import CurrencyMonteCarloOptimizer
-                    currency_optimizer = CurrencyMonteCarloOptimizer()
-                    currency_recs = currency_optimizer.get_currency_recommendations(cash_amount)
-                    if currency_recs:
-                        result['currency_recommendations'] = currency_recs['recommendations']
-            
-            # Bond recommendations for debt allocation
-            if 'debt' in result['allocation']:
-                debt_amount = total_amount * (result['allocation']['debt']['percentage'] / 100)
-                if debt_amount > 0:
-                    from bond_monte_carlo import BondMonteCarloOptimizer
-                    bond_optimizer = BondMonteCarloOptimizer()
-                    bond_recs = bond_optimizer.get_bond_recommendations(debt_amount)
-                    if bond_recs:
-                        result['bond_recommendations'] = bond_recs['recommendations']
-        
-        return result
+        return _add_recommendations(result, profile_data, deadline)
         
     except Exception as e:
         logger.error(f"Error predicting allocation: {str(e)}")
         return None
+
+
+def get_investment_allocations(profiles_data):
+    """
+    Get investment allocation predictions for many profiles at once.
+    
+    The scaler and model run once over the whole batch; optimizer
+    recommendations are then added per profile.
+    
+    Args:
+        profiles_data (list): Profile dictionaries as accepted by get_investment_allocation
+    
+    Returns:
+        list: One result per profile in input order, None where prediction failed
+    """
+    from .optimizer_service import OptimizerServiceUnavailable, OptimizerServiceError
+    
+    client = _get_service_client()
+    if client is not None:
+        try:
+            return client.allocate_batch(profiles_data)
+        except OptimizerServiceUnavailable as e:
+            logger.debug(f"{str(e)}; computing batch allocation in-process")
+        except OptimizerServiceError as e:
+            logger.error(f"Error predicting batch allocation: {str(e)}")
+            return [None] * len(profiles_data)
+    
+    return compute_investment_allocations(profiles_data)
+
+
+def compute_investment_allocations(profiles_data):
+    """In-process get_investment_allocations, also run by the optimizer service"""
+    try:
+        _add_scripts_path()
+        
+        from prediction_allocation import predict_allocations
+        
+        results = predict_allocations(profiles_data, include_instruments=True)
+    except Exception as e:
+        logger.error(f"Error predicting batch allocation: {str(e)}")
+        return [None] * len(profiles_data)
+    
+    allocations = []
+    for profile_data, result in zip(profiles_data, results):
+        try:
+            allocations.append(_add_recommendations(result, profile_data))
+        except Exception as e:
+            logger.error(f"Error adding recommendations: {str(e)}")
+            allocations.append(None)
+    return allocations
+
+
+def _add_recommendations(result, profile_data, deadline=None):
+    """Add amounts and Monte Carlo recommendations for equity, crypto, cash and debt to a prediction"""
+    if result and 'allocation' in result:
+        total_amount = profile_data.get('capital', 100000)
+        
+        # Add amount values to allocation
+        for asset_class, percentage in result['allocation'].items():
+            amount = total_amount * (percentage / 100)
+            result['allocation'][asset_class] = {
+                'percentage': percentage,
+                'amount': amount
+            }
+        
+        result.update(get_optimizer_recommendations(result['allocation'], deadline))
+    
+    return result
+
+
+def get_allocation_versions():
+    """
+    Versions that a stored allocation must match to be reused.
+    
+    Returns:
+        tuple: (model_version, data_version)
+    
+    Raises:
+        OptimizerServiceError: The optimizer service is running but did not answer
+    """
+    from .optimizer_service import OptimizerServiceUnavailable
+    
+    client = _get_service_client()
+    if client is not None:
+        try:
+            return client.versions()
+        except OptimizerServiceUnavailable:
+            pass
+    
+    return compute_allocation_versions()
+
+
+def compute_allocation_versions():
+    """In-process get_allocation_versions, also run by the optimizer service"""
+    _add_scripts_path()
+    from prediction_allocation import MODEL_VERSION
+    from market_data import data_version
+    return MODEL_VERSION, data_version()
+
+
+def get_block_versions():
+    """
+    Data version behind each recommendation block, see asset_optimizers.block_versions.
+    
+    Returns:
+        dict: Result key (e.g. 'crypto_recommendations') -> version string
+    
+    Raises:
+        OptimizerServiceError: The optimizer service is running but did not answer
+    """
+    from .optimizer_service import OptimizerServiceUnavailable
+    
+    client = _get_service_client()
+    if client is not None:
+        try:
+            return client.block_versions()
+        except OptimizerServiceUnavailable:
+            pass
+    
+    return compute_block_versions()
+
+
+def compute_block_versions():
+    """In-process get_block_versions, also run by the optimizer service"""
+    _add_scripts_path()
+    from asset_optimizers import block_versions
+    return block_versions(getattr(settings, 'PORTFOLIO_COVARIANCE_MODEL', 'diagonal'))
+
+
+def save_allocation_result(profile, result, versions=None, block_versions=None):
+    """
+    Persist a computed allocation for a profile, replacing any previous one.
+    
+    Args:
+        profile (InvestmentProfile): Profile the result belongs to
+        result (dict): Output of get_investment_allocation
+        versions (tuple): (model_version, data_version), looked up when omitted
+        block_versions (dict): Data version of each recommendation block, looked up when omitted
+    
+    Returns:
+        AllocationResult: The stored result
+    """
+    from .models import AllocationResult
+    
+    model_version, data_version = versions or get_allocation_versions()
+    if block_versions is None:
+        block_versions = get_block_versions()
+    stored = AllocationResult.objects.filter(profile=profile).first()
+    if stored is None:
+        stored = AllocationResult.from_result(profile, result, model_version, data_version, block_versions)
+    else:
+        stored.update_from_result(result)
+        stored.model_version = model_version
+        stored.data_version = data_version
+        stored.block_versions = block_versions
+    stored.save()
+    return stored
+
+
+def refresh_stale_blocks(stored, block_versions):
+    """
+    Recompute the recommendation blocks of a stored result whose data changed, in place.
+    
+    The allocation itself is kept; only the optimizers behind stale blocks run,
+    for the amounts already stored. A block whose optimizer fails keeps its
+    previous recommendations and version, so it is retried next time.
+    
+    Args:
+        stored (AllocationResult): Result to update; not saved
+        block_versions (dict): Current data version of each block, see get_block_versions
+    
+    Returns:
+        list: Recommendation keys that were recomputed
+    """
+    _add_scripts_path()
+    from asset_optimizers import ASSET_CLASS_OPTIMIZERS
+    
+    stale = set(stored.stale_blocks(block_versions))
+    allocation = {
+        asset_class: stored.allocation[asset_class]
+        for asset_class, (result_key, _, _, _) in ASSET_CLASS_OPTIMIZERS.items()
+        if result_key in stale and asset_class in stored.allocation
+    }
+    recommendations = get_optimizer_recommendations(allocation) if allocation else {}
+    
+    refreshed = []
+    for asset_class, (result_key, _, _, _) in ASSET_CLASS_OPTIMIZERS.items():
+        if result_key not in stale:
+            continue
+        if result_key in recommendations:
+            stored.recommendations[result_key] = recommendations[result_key]
+        elif asset_class in allocation and allocation[asset_class]['amount'] > 0:
+            continue
+        else:
+            # Nothing allocated to the class, so there is nothing to recompute
+            stored.recommendations.pop(result_key, None)
+        stored.block_versions[result_key] = block_versions[result_key]
+        refreshed.append(result_key)
+    return refreshed
+
+
+def get_profile_allocation(profile, refresh=False):
+    """
+    Stored allocation for a profile, recomputed only when missing, stale or refreshed.
+    
+    A result from the current model whose market data changed keeps its
+    allocation; only the recommendation blocks whose own dataset changed are
+    re-optimized (see refresh_stale_blocks), so a crypto refresh does not
+    recompute equities, bonds and currencies.
+    
+    Args:
+        profile (InvestmentProfile): Profile, ideally fetched with select_related('allocation_result')
+        refresh (bool): Recompute even if a current result is stored
+    
+    Returns:
+        dict: get_investment_allocation layout, or None if prediction fails
+    """
+    from .models import AllocationResult
+    from .serializers import InvestmentProfileSerializer
+    from .optimizer_service import OptimizerServiceError
+    
+    try:
+        stored = profile.allocation_result
+    except AllocationResult.DoesNotExist:
+        stored = None
+    
+    try:
+        versions = get_allocation_versions()
+        if stored is not None and not refresh and (stored.model_version, stored.data_version) == versions:
+            return stored.as_result()
+        if stored is not None and not refresh and stored.model_version == versions[0]:
+            block_versions = get_block_versions()
+            refresh_stale_blocks(stored, block_versions)
+            if not stored.stale_blocks(block_versions):
+                stored.data_version = versions[1]
+            stored.save(update_fields=['recommendations', 'block_versions', 'data_version', 'updated_at'])
+            return stored.as_result()
+    except OptimizerServiceError as e:
+        # The service is overloaded; a possibly stale result beats none
+        logger.error(f"Cannot check allocation versions: {str(e)}")
+        return stored.as_result() if stored is not None else None
+    
+    result = get_investment_allocation(InvestmentProfileSerializer(profile).data)
+    if result:
+        save_allocation_result(profile, result, versions)
+    return result
+
+
+def get_optimizer_recommendations(allocation, deadline=None):
+    """
+    Run the equity, crypto, currency and bond optimizers concurrently.
+    
+    Each asset class with a positive amount is submitted to the shared executor
+    and given ALLOCATION_CLASS_TIMEOUT seconds from submission (a number, or a
+    dict keyed by asset class). The optimizer is passed that limit as its
+    deadline, so a timed-out class stops sampling and frees its executor slot
+    instead of running on behind later requests. A class that fails or times
+    out is logged and left out; the others are still returned.
+    
+    With a deadline, each optimizer gets its ALLOCATION_BUDGET_SHARES fraction of
+    the remaining time and returns its best portfolio so far when that runs out;
+    nothing is waited for past the deadline itself. The response then carries
+    'optimizer_quality', the share of its planned sampling each class completed.
+    'optimizer_simulations' always reports the weight draws each class used, so
+    sample counts and adaptive sampling can be tuned per asset class.
+    
+    Args:
+        allocation (dict): Asset class -> {'percentage': ..., 'amount': ...}
+        deadline (float): time.monotonic() value by which results are needed, None for no limit
+    
+    Returns:
+        dict: Result key (e.g. 'equity_recommendations') -> list of recommendations,
+        plus 'optimizer_simulations' (and 'optimizer_quality' with a deadline),
+        each keyed by result key
+    """
+    from asset_optimizers import ASSET_CLASS_OPTIMIZERS, run_optimizer
+    
+    optimizer_mode = getattr(settings, 'PORTFOLIO_OPTIMIZER_MODE', 'monte_carlo')
+    use_cache = getattr(settings, 'RECOMMENDATION_CACHE_ENABLED', True)
+    covariance_model = getattr(settings, 'PORTFOLIO_COVARIANCE_MODEL', 'diagonal')
+    adaptive = getattr(settings, 'PORTFOLIO_ADAPTIVE_SAMPLING', False)
+    sampler = getattr(settings, 'PORTFOLIO_SAMPLER', 'random')
+    workers = getattr(settings, 'PORTFOLIO_SIMULATION_WORKERS', None)
+    timeouts = getattr(settings, 'ALLOCATION_CLASS_TIMEOUT', 30)
+    budget_shares = getattr(settings, 'ALLOCATION_BUDGET_SHARES', {})
+    
+    executor = get_optimizer_executor()
+    started = time.monotonic()
+    futures = {}
+    wait_until = {}
+    for asset_class in ASSET_CLASS_OPTIMIZERS:
+        if asset_class not in allocation:
+            continue
+        amount = allocation[asset_class]['amount']
+        if amount > 0:
+            timeout = timeouts.get(asset_class, 30) if isinstance(timeouts, dict) else timeouts
+            wait_until[asset_class] = class_deadline = started + timeout
+            if deadline is not None:
+                wait_until[asset_class] = min(wait_until[asset_class], deadline)
+                class_deadline = min(class_deadline,
+                                     started + max(0, deadline - started) * budget_shares.get(asset_class, 1.0))
+            futures[asset_class] = executor.submit(
+                run_optimizer, asset_class, amount, optimizer_mode, use_cache, covariance_model,
+                adaptive, sampler, class_deadline, workers
+            )
+    
+    recommendations = {}
+    quality = {}
+    simulations = {}
+    for asset_class, future in futures.items():
+        result_key = ASSET_CLASS_OPTIMIZERS[asset_class][0]
+        try:
+            optimizer_result = future.result(timeout=max(0, wait_until[asset_class] - time.monotonic()))
+        except TimeoutError:
+            # Only drops a job that has not started; a running optimizer stops at its deadline
+            future.cancel()
+            logger.warning(f"{asset_class} optimizer timed out after {wait_until[asset_class] - started:.2f}s")
+            continue
+        except Exception as e:
+            logger.error(f"{asset_class} optimizer failed: {str(e)}")
+            continue
+        
+        if optimizer_result:
+            recommendations[result_key] = optimizer_result['recommendations']
+            quality[result_key] = optimizer_result.get('quality', 1.0)
+            simulations[result_key] = optimizer_result.get('simulations_used', 0)
+    
+    recommendations['optimizer_simulations'] = simulations
+    if deadline is not None:
+        recommendations['optimizer_quality'] = quality
+    return recommendations
     
 
 def main():
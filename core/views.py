@@ -1,15 +1,20 @@
 from django.shortcuts import render, redirect
 from django.views.generic import ListView, DetailView
 from django.http import JsonResponse
+from django.conf import settings
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 import json
 import logging
 
-from .models import InvestmentProfile
+from .models import InvestmentProfile, AllocationResult, AllocationJob
 from .serializers import InvestmentProfileSerializer
-from .utils import get_investment_allocation
+from .utils import (
+    get_investment_allocation, get_investment_allocations, get_profile_allocation,
+    get_allocation_versions, get_block_versions, save_allocation_result,
+)
+from .jobs import enqueue_allocation_job
 
 logger = logging.getLogger(__name__)
 
@@ -27,26 +32,11 @@ def allocation_result(request, profile_id):
     Display the allocation results for a specific profile.
     """
     try:
-        profile = InvestmentProfile.objects.get(pk=profile_id)
+        profile = InvestmentProfile.objects.select_related('allocation_result').get(pk=profile_id)
         
-        # Convert model instance to dictionary for prediction
-        profile_data = {
-            'age': profile.age,
-            'income': profile.income,
-            'capital': profile.capital,
-            'expenses': profile.expenses,
-            'emi': profile.emi,
-            'liquidity_need': profile.liquidity_need,
-            'dependents': profile.dependents,
-            'confidence': profile.confidence,
-            'knowledge': profile.knowledge,
-            'comfort_with_negatives': profile.comfort_with_negatives,
-            'market_awareness': profile.market_awareness,
-            'experience': profile.experience,
-        }
-        
-        # Get allocation prediction
-        result = get_investment_allocation(profile_data)
+        # Reuse the stored allocation; recompute only on ?refresh=1 or a version change
+        refresh = request.GET.get('refresh') == '1'
+        result = get_profile_allocation(profile, refresh=refresh)
         
         if not result:
             # If prediction fails, create a default allocation
@@ -90,6 +80,13 @@ def allocation_result(request, profile_id):
         logger.error(f"Error in allocation_result view: {str(e)}")
         return redirect('investment_form')
 
+def _use_async_allocation(request):
+    """Whether to queue the allocation: ?async=1/0 overrides ALLOCATION_ASYNC_MODE"""
+    requested = request.query_params.get('async')
+    if requested is not None:
+        return requested == '1'
+    return getattr(settings, 'ALLOCATION_ASYNC_MODE', False)
+
 @api_view(['POST'])
 def create_investment_profile(request):
     """
@@ -103,10 +100,26 @@ def create_investment_profile(request):
             profile_data = serializer.data
             profile_id = profile.id
             
+            # Queue the allocation for run_allocation_worker instead of computing it inline
+            if _use_async_allocation(request):
+                job = enqueue_allocation_job(profile)
+                logger.info(f"API ACCEPTED: Profile {profile_id} created, allocation job {job.id} queued")
+                return Response({
+                    'profile': serializer.data,
+                    'job_id': job.id,
+                    'status': job.status,
+                    'job_url': request.build_absolute_uri(f'/api/allocation-jobs/{job.id}/'),
+                    'result_url': request.build_absolute_uri(f'/allocation-result/{profile_id}/')
+                }, status=status.HTTP_202_ACCEPTED)
+            
             # Get allocation prediction using utility function
             result = get_investment_allocation(profile_data)
             
             if result:
+                try:
+                    save_allocation_result(profile, result)
+                except Exception as e:
+                    logger.error(f"Failed to store allocation for profile {profile_id}: {str(e)}")
                 response_data = {
                     'profile': serializer.data,
                     'result_url': request.build_absolute_uri(f'/allocation-result/{profile_id}/')
@@ -122,3 +135,107 @@ def create_investment_profile(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     return Response({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@api_view(['POST'])
+def create_investment_profiles_batch(request):
+    """
+    Create many investment profiles and their allocations in one call.
+    
+    Accepts a list of profiles (or {"profiles": [...]}). Valid profiles are
+    bulk-inserted and scored together; invalid ones are reported by index.
+    Results come back in input order.
+    """
+    profiles = request.data.get('profiles') if isinstance(request.data, dict) else request.data
+    if not isinstance(profiles, list) or not profiles:
+        return Response({'error': 'Expected a non-empty list of profiles'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    max_profiles = getattr(settings, 'ALLOCATION_BATCH_MAX_PROFILES', 1000)
+    if len(profiles) > max_profiles:
+        return Response({'error': f'At most {max_profiles} profiles per batch'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Validate every profile so failures can be reported individually
+    results = [None] * len(profiles)
+    valid = []
+    for index, item in enumerate(profiles):
+        serializer = InvestmentProfileSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, InvestmentProfile(**serializer.validated_data)))
+        else:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': serializer.errors}
+    
+    if valid:
+        created = InvestmentProfile.objects.bulk_create([profile for _, profile in valid])
+        profiles_data = InvestmentProfileSerializer(created, many=True).data
+        allocations = get_investment_allocations(profiles_data)
+        
+        try:
+            model_version, data_version = get_allocation_versions()
+            block_versions = get_block_versions()
+            AllocationResult.objects.bulk_create([
+                AllocationResult.from_result(profile, allocation, model_version, data_version, block_versions)
+                for profile, allocation in zip(created, allocations) if allocation
+            ])
+        except Exception as e:
+            logger.error(f"Failed to store batch allocations: {str(e)}")
+        
+        for (index, _), profile, profile_data, allocation in zip(valid, created, profiles_data, allocations):
+            item_result = {
+                'index': index,
+                'status': 'created',
+                'profile_id': profile.id,
+                'profile': profile_data,
+                'result_url': request.build_absolute_uri(f'/allocation-result/{profile.id}/')
+            }
+            if allocation:
+                item_result.update(allocation)
+            else:
+                item_result['status'] = 'allocation_failed'
+            results[index] = item_result
+    
+    failed = sum(1 for item in results if item['status'] != 'created')
+    logger.info(f"API BATCH: {len(valid)} of {len(profiles)} profiles created, {failed} failed")
+    
+    if not valid:
+        response_status = status.HTTP_400_BAD_REQUEST
+    elif failed:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_201_CREATED
+    
+    return Response({
+        'created': len(valid),
+        'failed': failed,
+        'results': results
+    }, status=response_status)
+
+
+@api_view(['GET'])
+def allocation_job_status(request, job_id):
+    """
+    Report the state of a queued allocation job, with the allocation once it has succeeded.
+    """
+    try:
+        job = AllocationJob.objects.select_related('profile__allocation_result').get(pk=job_id)
+    except AllocationJob.DoesNotExist:
+        return Response({'error': f'Allocation job {job_id} not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    response_data = {
+        'job_id': job.id,
+        'profile_id': job.profile_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+    
+    if job.status == AllocationJob.STATUS_SUCCEEDED:
+        response_data['result_url'] = request.build_absolute_uri(f'/allocation-result/{job.profile_id}/')
+        stored = getattr(job.profile, 'allocation_result', None)
+        if stored is not None:
+            response_data.update(stored.as_result())
+    elif job.status == AllocationJob.STATUS_FAILED:
+        response_data['error'] = job.error
+    
+    return Response(response_data)
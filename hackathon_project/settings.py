@@ -136,6 +136,68 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Portfolio optimizers
+# 'monte_carlo' runs the random-sampling search, 'exact' solves the max-Sharpe portfolio directly,
+# 'cardinality' solves it with exactly the tiered number of stocks (scales to thousands of tickers)
+PORTFOLIO_OPTIMIZER_MODE = 'monte_carlo'
+
+# 'diagonal' treats assets as uncorrelated; 'factor' estimates correlations for equity and
+# crypto from scripts/nifty100_returns_*.csv and scripts/crypto_returns.csv when present
+PORTFOLIO_COVARIANCE_MODEL = 'diagonal'
+
+# Monte Carlo sampling: with adaptive sampling draws stop once the best Sharpe ratio stops
+# improving (capped at 50,000) instead of using each optimizer's fixed count; the sampler
+# is 'random' or quasi-random 'sobol'
+PORTFOLIO_ADAPTIVE_SAMPLING = False
+PORTFOLIO_SAMPLER = 'random'
+
+# Processes one Monte Carlo simulation is split across (independent seeded streams of 5,000
+# draws each); None keeps the single-stream draws. Results do not depend on the count
+PORTFOLIO_SIMULATION_WORKERS = None
+
+# Reuse optimized portfolios across requests in the same amount bucket
+RECOMMENDATION_CACHE_ENABLED = True
+
+# Per-asset-class optimizers run concurrently on a bounded pool of 'thread' or 'process' workers
+ALLOCATION_EXECUTOR = 'thread'
+ALLOCATION_MAX_WORKERS = 4
+
+# Seconds each asset class may take before it is left out of the response
+ALLOCATION_CLASS_TIMEOUT = 30
+
+# Latency budget in seconds for one allocation request (None for no limit). Optimizers
+# return their best portfolio so far when their share runs out; classes run concurrently,
+# so shares need not sum to 1 and the remainder is headroom for queueing and assembly
+ALLOCATION_REQUEST_BUDGET = None
+ALLOCATION_BUDGET_SHARES = {
+    'equity': 0.8,
+    'crypto': 0.7,
+    'cash': 0.7,
+    'debt': 0.7,
+}
+
+# Largest number of profiles accepted by the batch allocation API
+ALLOCATION_BATCH_MAX_PROFILES = 1000
+
+# Queue allocations for `manage.py run_allocation_worker` and answer 202 with a job URL
+# (a request can still choose with ?async=1 or ?async=0)
+ALLOCATION_ASYNC_MODE = False
+
+# Socket of `manage.py run_optimizer_service`, which keeps the model, market data and a
+# warm optimizer pool in one long-lived process, e.g. BASE_DIR / 'optimizer.sock'.
+# None computes allocations in the web worker; so does a configured service that is not
+# running, retried every OPTIMIZER_SERVICE_RETRY_INTERVAL seconds
+OPTIMIZER_SERVICE_SOCKET = None
+OPTIMIZER_SERVICE_TIMEOUT = 60
+OPTIMIZER_SERVICE_RETRY_INTERVAL = 5
+
+# Load the allocation model and market data in wsgi.py, i.e. in the master process of a
+# preloading server such as `gunicorn --preload`, so forked workers share them. Export a
+# shared store with `manage.py build_shared_store` (scripts/shared_store, or the
+# NEXALT_SHARED_STORE environment variable) to memory-map the model and market data in
+# every process on the host instead of giving each its own copy
+ALLOCATION_PRELOAD = False
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hackathon_project.settings')
 
 application = get_wsgi_application()
+
+# Load the model and market data once in the master when the server preloads the
+# application (e.g. gunicorn --preload), so forked workers share them
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'ALLOCATION_PRELOAD', False):
+    from core.utils import preload_allocation_data  # noqa: E402
+    preload_allocation_data()
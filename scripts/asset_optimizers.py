@@ -0,0 +1,96 @@
+import importlib
+import logging
+from functools import lru_cache
+from factor_covariance import RETURN_HISTORY_DATASETS
+from market_data import data_version
+
+logger = logging.getLogger(__name__)
+
+# Allocation key -> (result key, module, optimizer class, recommendation method)
+ASSET_CLASS_OPTIMIZERS = {
+    'equity': ('equity_recommendations', 'equity_monte_carlo', 'AdvancedMonteCarloOptimizer', 'get_stock_recommendations'),
+    'crypto': ('crypto_recommendations', 'crypto_monte_carlo', 'CryptoMonteCarloOptimizer', 'get_crypto_recommendations'),
+    'cash': ('currency_recommendations', 'currency_monte_carlo', 'CurrencyMonteCarloOptimizer', 'get_currency_recommendations'),
+    'debt': ('bond_recommendations', 'bond_monte_carlo', 'BondMonteCarloOptimizer', 'get_bond_recommendations'),
+}
+
+# Allocation key -> market dataset its optimizer reads
+ASSET_CLASS_DATASETS = {
+    'equity': 'equity',
+    'crypto': 'crypto',
+    'cash': 'currency',
+    'debt': 'bond',
+}
+
+
+def block_versions(covariance_model='diagonal', registry=None):
+    """
+    Data version behind each recommendation block.
+
+    A block depends only on its own asset class's statistics, plus its return
+    history when the factor covariance model is used, so refreshing one file
+    changes one block's version and leaves the others alone.
+
+    Args:
+        covariance_model (str): 'diagonal' or 'factor'
+        registry (MarketDataRegistry): Registry to read, defaults to the process-wide one
+
+    Returns:
+        dict: Result key (e.g. 'crypto_recommendations') -> version string
+    """
+    versions = {}
+    for asset_class, (result_key, _, _, _) in ASSET_CLASS_OPTIMIZERS.items():
+        names = [ASSET_CLASS_DATASETS[asset_class]]
+        if covariance_model == 'factor' and asset_class in RETURN_HISTORY_DATASETS:
+            names.append(RETURN_HISTORY_DATASETS[asset_class])
+        versions[result_key] = data_version(registry, names)
+    return versions
+
+
+def run_optimizer(asset_class, investment_amount, mode='monte_carlo', use_cache=True,
+                  covariance_model='diagonal', adaptive=False, sampler='random', deadline=None,
+                  workers=None, as_of=None):
+    """
+    Run the optimizer behind one allocation asset class.
+
+    Module-level so it can be submitted to a thread or process pool.
+
+    Args:
+        asset_class (str): Allocation key ('equity', 'crypto', 'cash' or 'debt')
+        investment_amount (float): Amount allocated to the asset class
+        mode (str): Optimizer mode, 'monte_carlo', 'exact' or 'cardinality'
+        use_cache (bool): Reuse cached portfolios for the same amount bucket
+        covariance_model (str): 'diagonal' or 'factor'; only equity and crypto
+            have return histories, the others always treat assets as uncorrelated
+        adaptive (bool): Stop sampling once the best Sharpe ratio converges
+        sampler (str): 'random' or 'sobol' weight draws
+        deadline (float): time.monotonic() value by which to return the best portfolio
+            found so far; CLOCK_MONOTONIC is system-wide, so this also holds in worker processes
+        workers (int): Processes to split each Monte Carlo simulation across, None for one stream
+        as_of (date or str): Replay the statistics in force on this date from the snapshot
+            history instead of using the current data; replays ignore covariance_model and
+            treat assets as uncorrelated, since return histories are not versioned
+
+    Returns:
+        dict: Optimizer result with 'recommendations' and 'quality', or None if it failed
+    """
+    method_name = ASSET_CLASS_OPTIMIZERS[asset_class][3]
+    optimizer = get_optimizer(asset_class, mode, use_cache, covariance_model, adaptive, sampler, workers)
+    return getattr(optimizer, method_name)(investment_amount, deadline=deadline, as_of=as_of)
+
+
+@lru_cache(maxsize=None)
+def get_optimizer(asset_class, mode='monte_carlo', use_cache=True, covariance_model='diagonal',
+                  adaptive=False, sampler='random', workers=None):
+    """
+    Shared optimizer instance for one asset class and configuration.
+
+    Optimizers keep no per-call state, so a single instance is safe to use from
+    every thread of the allocation executor.
+    """
+    _, module_name, class_name, _ = ASSET_CLASS_OPTIMIZERS[asset_class]
+    module = importlib.import_module(module_name)
+    options = {'mode': mode, 'use_cache': use_cache, 'adaptive': adaptive, 'sampler': sampler, 'workers': workers}
+    if asset_class in RETURN_HISTORY_DATASETS:
+        options['covariance_model'] = covariance_model
+    return getattr(module, class_name)(**options)
@@ -1,103 +1,112 @@
-import pandas as pd
 import numpy as np
 import os
 import logging
+from monte_carlo_engine import simulate_portfolios, simulation_frame, find_best_portfolio, validate_sampler, validate_mode, call_seed
+from recommendation_cache import recommendation_cache, scale_portfolio, is_complete
+from market_data import market_data
+from snapshot_history import dataset_as_of
 
 logger = logging.getLogger(__name__)
 
 class BondMonteCarloOptimizer:
-    def __init__(self):
+    """
+    Bond optimizer. Instances hold configuration only: build_portfolio and
+    get_bond_recommendations keep every intermediate frame local, so one instance
+    can serve concurrent threads.
+    """
+    
+    def __init__(self, mode='monte_carlo', use_cache=True, adaptive=False, sampler='random',
+                 workers=None):
         self.script_dir = os.path.dirname(__file__)
         self.bond_data = None
-        
-    def load_bond_data(self):
-        """Load bond data from CSV"""
-        try:
-            file_path = os.path.join(self.script_dir, "bond_daily_stats.csv")
-            self.bond_data = pd.read_csv(file_path)
-            return True
-        except Exception as e:
-            logger.error(f"Failed to load bond data: {e}")
+        self.mode = validate_mode(mode)
+        self.use_cache = use_cache
+        self.adaptive = adaptive
+        self.sampler = validate_sampler(sampler)
+        self.workers = workers
+        
+    def load_bond_data(self, dataset=None):
+        """Load bond data from the market data registry"""
+        bond_data = self.read_bond_data(dataset)
+        if bond_data is None:
             return False
+        self.bond_data = bond_data
+        return True
+    
+    def read_bond_data(self, dataset=None):
+        """Fresh DataFrame of the bond dataset for one call, or None if it is unavailable"""
+        if dataset is None:
+            dataset = market_data.get('bond')
+        if dataset is None:
+            logger.error("Failed to load bond data")
+            return None
+        return dataset.to_frame()
     
-    def run_monte_carlo_simulation(self, num_simulations=3000):
+    def run_monte_carlo_simulation(self, num_simulations=3000, bond_data=None, rng=None):
         """Run Monte Carlo simulation for bond portfolio"""
-        if self.bond_data is None or self.bond_data.empty:
+        if bond_data is None:
+            bond_data = self.bond_data
+        if bond_data is None or bond_data.empty:
             return None
         
-        np.random.seed(42)
-        
-        returns = self.bond_data['Mean Daily Return'].values
-        volatilities = self.bond_data['Daily Volatility'].values
-        names = self.bond_data['Name'].values
-        symbols = self.bond_data['Symbol'].values
-        
-        num_assets = len(names)
-        risk_free_rate = 0.0001
-        
-        all_weights = []
-        all_returns = []
-        all_vols = []
-        all_sharpes = []
+        returns = bond_data['mean_daily_return'].values
+        volatilities = bond_data['daily_volatility'].values
+        names = bond_data['name'].values
+        symbols = bond_data['symbol'].values
         
-        for _ in range(num_simulations):
-            weights = np.random.random(num_assets)
-            weights /= np.sum(weights)
-            
-            port_return = np.dot(weights, returns)
-            port_volatility = np.sqrt(np.dot(weights.T, np.dot(np.diag(volatilities ** 2), weights)))
-            
-            sharpe_ratio = (port_return - risk_free_rate) / port_volatility if port_volatility > 0 else 0
-            
-            all_weights.append(weights)
-            all_returns.append(port_return)
-            all_vols.append(port_volatility)
-            all_sharpes.append(sharpe_ratio)
-        
-        results_df = pd.DataFrame({
-            "Return": all_returns,
-            "Volatility": all_vols,
-            "Sharpe Ratio": all_sharpes
-        })
-        
-        for i, name in enumerate(names):
-            results_df[name] = [w[i] for w in all_weights]
-        
-        results_df_sorted = results_df.sort_values(by="Sharpe Ratio", ascending=False)
+        results = simulate_portfolios(returns, volatilities, num_simulations, seed=call_seed(rng))
+        results_df_sorted = simulation_frame(results, names, include_var=False)
         
         return results_df_sorted, names, symbols
     
-    def get_bond_recommendations(self, investment_amount):
-        """Get bond recommendations based on investment amount"""
+    def select_best_portfolio(self, num_simulations=3000, deadline=None, bond_data=None, rng=None):
+        """Find the best bond portfolio with the configured optimizer mode"""
+        if bond_data is None:
+            bond_data = self.bond_data
+        if bond_data is None or bond_data.empty:
+            return None, None, None
+        
+        returns = bond_data['mean_daily_return'].values
+        volatilities = bond_data['daily_volatility'].values
+        names = bond_data['name'].values
+        symbols = bond_data['symbol'].values
+        
+        best = find_best_portfolio(returns, volatilities, num_simulations, mode=self.mode, seed=call_seed(rng),
+                                   adaptive=self.adaptive, sampler=self.sampler, deadline=deadline,
+                                   workers=self.workers)
+        return best, names, symbols
+    
+    def get_target_count(self, investment_amount):
+        """Number of bonds to recommend for an investment amount"""
         if investment_amount < 20000:
-            target_bonds = 2
+            return 2
         elif investment_amount < 50000:
-            target_bonds = 3
+            return 3
         elif investment_amount < 100000:
-            target_bonds = 5
+            return 5
         else:
-            target_bonds = 8
-        
-        if not self.load_bond_data():
+            return 8
+    
+    def build_portfolio(self, target_bonds, dataset=None, deadline=None, rng=None):
+        """Optimize the bond portfolio for a target count, without amounts"""
+        bond_data = self.read_bond_data(dataset)
+        if bond_data is None:
             return None
         
         # Filter stable bonds (lower volatility, positive returns)
-        stable_bonds = self.bond_data[
-            (self.bond_data['Mean Daily Return'] > 0) & 
-            (self.bond_data['Daily Volatility'] < 0.005)
+        stable_bonds = bond_data[
+            (bond_data['mean_daily_return'] > 0) & 
+            (bond_data['daily_volatility'] < 0.005)
         ]
         
         if len(stable_bonds) < target_bonds:
-            stable_bonds = self.bond_data.nlargest(target_bonds * 2, 'Mean Daily Return')
+            stable_bonds = bond_data.nlargest(target_bonds * 2, 'mean_daily_return')
         
-        self.bond_data = stable_bonds
-        
-        results_df, names, symbols = self.run_monte_carlo_simulation()
-        if results_df is None:
+        best, names, symbols = self.select_best_portfolio(deadline=deadline, bond_data=stable_bonds, rng=rng)
+        if best is None:
             return None
         
-        best_portfolio = results_df.iloc[0]
-        weights = best_portfolio[names].values
+        weights = best['weights']
         
         # Get top weighted bonds
         bond_weights = list(zip(names, symbols, weights))
@@ -110,23 +119,67 @@ class BondMonteCarloOptimizer:
         recommendations = []
         for name, symbol, weight in top_bonds:
             normalized_weight = (weight / total_weight) * 100
-            amount = investment_amount * (normalized_weight / 100)
             
             recommendations.append({
                 'name': name,
                 'symbol': symbol,
-                'weight': normalized_weight,
-                'amount': amount
+                'weight': normalized_weight
             })
         
-        result = {
+        return {
             'recommendations': recommendations,
-            'portfolio_return': best_portfolio['Return'] * 365 * 100,
-            'portfolio_volatility': best_portfolio['Volatility'] * np.sqrt(365) * 100,
-            'sharpe_ratio': best_portfolio['Sharpe Ratio']
+            'portfolio_return': best['Return'] * 365 * 100,
+            'portfolio_volatility': best['Volatility'] * np.sqrt(365) * 100,
+            'sharpe_ratio': best['Sharpe Ratio'],
+            'simulations_used': best['simulations_used'],
+            'quality': best['quality']
         }
+    
+    def get_bond_recommendations(self, investment_amount, deadline=None, as_of=None):
+        """Get bond recommendations based on investment amount, optionally as of a past date"""
+        target_bonds = self.get_target_count(investment_amount)
+        
+        dataset = market_data.get('bond') if as_of is None else dataset_as_of('bond', as_of)
+        if dataset is None:
+            logger.error("Failed to load bond data")
+            return None
+        
+        # Replays bypass the cache: their fingerprints would evict the live portfolios
+        if not self.use_cache or as_of is not None:
+            portfolio = self.build_portfolio(target_bonds, dataset, deadline)
+        else:
+            cache_key = ('bond', target_bonds, self.mode, self.adaptive, self.sampler, self.workers,
+                         dataset.fingerprint)
+            portfolio = recommendation_cache.get_or_compute(
+                cache_key, lambda: self.build_portfolio(target_bonds, dataset, deadline), cacheable=is_complete
+            )
+        
+        if portfolio is None:
+            return None
         
-        return result
+        return scale_portfolio(portfolio, investment_amount)
+    
+def build_bond_portfolio(dataset, target_bonds, rng=None, deadline=None, mode='monte_carlo',
+                         adaptive=False, sampler='random', workers=None):
+    """
+    Functional entry point: optimize a bond portfolio from an explicit snapshot.
+    
+    Shares no mutable state with other calls, so concurrent calls need no locks
+    and equal inputs give equal portfolios.
+    
+    Args:
+        dataset (MarketDataset): Bond snapshot
+        target_bonds (int): Number of holdings to select
+        rng (np.random.Generator): Source of the weight draws; None uses the fixed seed
+        deadline (float): time.monotonic() value by which to return the best portfolio so far
+        mode, adaptive, sampler, workers: As for BondMonteCarloOptimizer
+    
+    Returns:
+        dict: Portfolio without amounts (see scale_portfolio), or None on failure
+    """
+    optimizer = BondMonteCarloOptimizer(mode=mode, use_cache=False, adaptive=adaptive, sampler=sampler,
+                                        workers=workers)
+    return optimizer.build_portfolio(target_bonds, dataset, deadline, rng)
     
 def main():
     """Test the advanced Monte Carlo optimizer"""
@@ -0,0 +1,116 @@
+import time
+import warnings
+import numpy as np
+from equity_monte_carlo import AdvancedMonteCarloOptimizer
+from market_data import MarketDataset, market_data
+warnings.filterwarnings('ignore')
+
+# Universe sizes from Nifty 100 up to beyond the full NSE list
+UNIVERSE_SIZES = [113, 500, 2000, 5000]
+
+# Smallest, middle and largest equity tiers
+TARGET_COUNTS = [3, 10, 18]
+
+BENCHMARK_MODES = ['monte_carlo', 'cardinality']
+
+# One investment amount inside each equity target-count tier
+TIER_AMOUNTS = [40000, 90000, 200000, 400000, 600000, 900000]
+
+
+def synthetic_universe(size, seed=0):
+    """
+    Equity dataset of ``size`` tickers resampled from the real Nifty 100 statistics.
+
+    Returns and volatilities are bootstrapped with a little multiplicative noise so
+    larger universes keep the shape of the real cross-section.
+    """
+    base = market_data.get('equity')
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(base), size)
+    columns = {
+        'symbol': np.array([f'SYN{i:05d}.NS' for i in range(size)]),
+        'mean_daily_return': base['mean_daily_return'][picks] * rng.normal(1.0, 0.1, size),
+        'daily_volatility': base['daily_volatility'][picks] * rng.normal(1.0, 0.05, size).clip(0.5),
+    }
+    return MarketDataset(f'synthetic-{size}', None, columns, f'synthetic-{size}-{seed}')
+
+
+def run_benchmark(sizes=UNIVERSE_SIZES, targets=TARGET_COUNTS, modes=BENCHMARK_MODES, repeats=3):
+    """
+    Time build_portfolio for every universe size, target count and mode.
+
+    Returns:
+        list: One dict per run with size, target, mode, best time, Sharpe and holdings
+    """
+    rows = []
+    for size in sizes:
+        dataset = synthetic_universe(size)
+        for target in targets:
+            for mode in modes:
+                optimizer = AdvancedMonteCarloOptimizer(mode=mode, use_cache=False)
+                timings = []
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    portfolio = optimizer.build_portfolio(target, dataset)
+                    timings.append(time.perf_counter() - started)
+                rows.append({
+                    'size': size,
+                    'target': target,
+                    'mode': mode,
+                    'ms': min(timings) * 1000,
+                    'sharpe': portfolio['sharpe_ratio'],
+                    'holdings': len(portfolio['recommendations'])
+                })
+    return rows
+
+
+def check_exact_tiers(amounts=TIER_AMOUNTS, dataset=None):
+    """
+    Compare the Sharpe ratio of 'exact' and 'monte_carlo' portfolios in every equity tier.
+
+    Exact mode prunes by stand-alone Sharpe ratio and solves the survivors
+    analytically, so it should never do worse than sampling.
+
+    Returns:
+        list: One (amount, target, monte_carlo Sharpe, exact Sharpe) tuple per tier
+
+    Raises:
+        AssertionError: If exact mode is worse than monte_carlo in any tier
+    """
+    sampled = AdvancedMonteCarloOptimizer(mode='monte_carlo', use_cache=False)
+    exact = AdvancedMonteCarloOptimizer(mode='exact', use_cache=False)
+    rows = []
+    for amount in amounts:
+        target = exact.get_target_count(amount)
+        rows.append((amount, target, sampled.build_portfolio(target, dataset)['sharpe_ratio'],
+                     exact.build_portfolio(target, dataset)['sharpe_ratio']))
+    worse = [row for row in rows if row[3] < row[2] - 1e-12]
+    assert not worse, f"Exact mode is worse than monte_carlo in tiers {[(a, t) for a, t, _, _ in worse]}"
+    return rows
+
+
+def main():
+    """Print how each optimizer mode scales with the size of the equity universe"""
+    rows = run_benchmark()
+
+    print(f"{'Universe':>8} {'Target':>6} {'Mode':>12} {'Time (ms)':>10} {'Sharpe':>8} {'Holdings':>8}")
+    for row in rows:
+        print(f"{row['size']:>8} {row['target']:>6} {row['mode']:>12} {row['ms']:>10.1f} "
+              f"{row['sharpe']:>8.4f} {row['holdings']:>8}")
+
+    print("\nAverage time (ms) by universe size:")
+    for mode in BENCHMARK_MODES:
+        per_size = []
+        for size in UNIVERSE_SIZES:
+            times = [row['ms'] for row in rows if row['mode'] == mode and row['size'] == size]
+            per_size.append(f"{size}: {np.mean(times):.1f}")
+        print(f"  {mode:>12}  " + "  ".join(per_size))
+
+    print("\nSharpe ratio by equity tier:")
+    print(f"{'Amount':>8} {'Target':>6} {'monte_carlo':>12} {'exact':>8}")
+    for amount, target, sampled, exact in check_exact_tiers():
+        print(f"{amount:>8} {target:>6} {sampled:>12.4f} {exact:>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import logging
+import warnings
+import numpy as np
+from shared_store import write_arrays, open_arrays
+
+logger = logging.getLogger(__name__)
+
+# Largest absolute difference from the sklearn path accepted by the consistency check
+CONSISTENCY_TOLERANCE = 1e-9
+
+# Profiles drawn for the consistency check run when the model is compiled
+CONSISTENCY_SAMPLES = 256
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _tanh(x):
+    return np.tanh(x, out=x)
+
+
+def _logistic(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    return np.reciprocal(x, out=x)
+
+
+def _identity(x):
+    return x
+
+
+# Hidden and output activations MLPRegressor can be fitted with
+ACTIVATIONS = {
+    'relu': _relu,
+    'tanh': _tanh,
+    'logistic': _logistic,
+    'identity': _identity,
+}
+
+
+class CompiledAllocationModel:
+    """
+    Scaler plus MLP forward pass as plain NumPy matrix products.
+
+    The scaler is folded into the first layer (``W1 / scale`` and
+    ``b1 - (mean / scale) @ W1``), so scoring is one product, bias add and
+    activation per layer with no pandas, input validation or estimator dispatch.
+    """
+
+    def __init__(self, coefs, intercepts, activation='relu', output_activation='identity'):
+        self.coefs = [np.ascontiguousarray(coef, dtype=float) for coef in coefs]
+        self.intercepts = [np.ascontiguousarray(intercept, dtype=float) for intercept in intercepts]
+        self.activation_name = activation
+        self.output_activation_name = output_activation
+        self.activation = ACTIVATIONS[activation]
+        self.output_activation = ACTIVATIONS[output_activation]
+
+    @property
+    def num_features(self):
+        return self.coefs[0].shape[0]
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        """
+        Compile a fitted MLPRegressor and optional StandardScaler.
+
+        Raises:
+            TypeError: If the model or scaler is of a kind that cannot be compiled
+        """
+        for attribute in ('coefs_', 'intercepts_', 'activation', 'out_activation_'):
+            if not hasattr(model, attribute):
+                raise TypeError(f"Cannot compile {type(model).__name__}: no {attribute}")
+        if model.activation not in ACTIVATIONS or model.out_activation_ not in ACTIVATIONS:
+            raise TypeError(f"Cannot compile activation '{model.activation}'/'{model.out_activation_}'")
+
+        coefs = [np.array(coef, dtype=float) for coef in model.coefs_]
+        intercepts = [np.array(intercept, dtype=float) for intercept in model.intercepts_]
+
+        if scaler is not None:
+            if type(scaler).__name__ != 'StandardScaler':
+                raise TypeError(f"Cannot compile scaler {type(scaler).__name__}")
+            if scaler.with_std:
+                coefs[0] = coefs[0] / np.asarray(scaler.scale_, dtype=float)[:, np.newaxis]
+            if scaler.with_mean:
+                intercepts[0] = intercepts[0] - np.asarray(scaler.mean_, dtype=float) @ coefs[0]
+
+        return cls(coefs, intercepts, model.activation, model.out_activation_)
+
+    def to_store(self, directory, version):
+        """Write the layers to a shared store entry tagged with the model version"""
+        arrays = {}
+        for index, (coef, intercept) in enumerate(zip(self.coefs, self.intercepts)):
+            arrays[f'coef_{index}'] = coef
+            arrays[f'intercept_{index}'] = intercept
+        write_arrays(directory, arrays, {
+            'version': version,
+            'layers': len(self.coefs),
+            'activation': self.activation_name,
+            'output_activation': self.output_activation_name,
+        })
+
+    @classmethod
+    def from_store(cls, directory, version=None):
+        """
+        Model whose layers are memory-mapped from a shared store entry.
+
+        Returns:
+            CompiledAllocationModel: The model, or None if the entry is missing,
+            unreadable or was written for another model version
+        """
+        try:
+            entry = open_arrays(directory)
+            if entry is None:
+                return None
+            arrays, metadata = entry
+            if version is not None and metadata['version'] != version:
+                logger.info(f"Shared model in {directory} is version {metadata['version']}, not {version}")
+                return None
+            layers = range(metadata['layers'])
+            return cls([arrays[f'coef_{index}'] for index in layers],
+                       [arrays[f'intercept_{index}'] for index in layers],
+                       metadata['activation'], metadata['output_activation'])
+        except Exception as e:
+            logger.error(f"Failed to load shared model from {directory}: {e}")
+            return None
+
+    def predict(self, X):
+        """
+        Raw model outputs for a batch of profiles.
+
+        Args:
+            X (np.ndarray): (n_profiles, n_features) unscaled feature matrix, or one row
+
+        Returns:
+            np.ndarray: (n_profiles, n_outputs) predictions
+
+        Raises:
+            ValueError: If the input has the wrong width or contains NaN, as sklearn would
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        if X.shape[1] != self.num_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.num_features}")
+        if np.isnan(X).any():
+            raise ValueError("Input X contains NaN")
+
+        # A single profile goes through as a vector; 1-D products skip the matrix-call overhead
+        activations = X[0] if len(X) == 1 else X
+        last = len(self.coefs) - 1
+        for index, (coef, intercept) in enumerate(zip(self.coefs, self.intercepts)):
+            activations = activations.dot(coef)
+            activations += intercept
+            activations = (self.output_activation if index == last else self.activation)(activations)
+        return activations.reshape(len(X), -1)
+
+
+def consistency_error(compiled, model, scaler, num_samples=CONSISTENCY_SAMPLES, seed=0):
+    """
+    Largest absolute difference between the compiled and sklearn predictions.
+
+    Profiles are drawn around the scaler's training distribution (mean +/- 3
+    standard deviations per feature), plus the mean profile itself.
+
+    Returns:
+        float: Max |compiled - sklearn| over every sampled profile and output
+    """
+    rng = np.random.default_rng(seed)
+    num_features = compiled.num_features
+    mean = np.asarray(getattr(scaler, 'mean_', np.zeros(num_features)), dtype=float)
+    scale = np.asarray(getattr(scaler, 'scale_', np.ones(num_features)), dtype=float)
+    X = mean + scale * rng.uniform(-3, 3, (num_samples, num_features))
+    X = np.vstack([mean, X])
+
+    with warnings.catch_warnings():
+        # Scalers fitted on a DataFrame warn about the missing feature names
+        warnings.simplefilter('ignore', UserWarning)
+        expected = np.atleast_2d(model.predict(scaler.transform(X) if scaler is not None else X))
+    actual = compiled.predict(X)
+    return float(np.max(np.abs(actual.reshape(expected.shape) - expected)))
+
+
+def compile_model(model, scaler=None, tolerance=CONSISTENCY_TOLERANCE):
+    """
+    Compile a model and check it against the sklearn path.
+
+    Returns:
+        CompiledAllocationModel: The compiled model, or None if the model cannot be
+        compiled or disagrees with sklearn by more than ``tolerance``
+    """
+    try:
+        compiled = CompiledAllocationModel.from_sklearn(model, scaler)
+    except TypeError as e:
+        logger.warning(f"Using the sklearn allocation model: {e}")
+        return None
+
+    error = consistency_error(compiled, model, scaler)
+    if not error <= tolerance:
+        logger.error(f"Compiled allocation model differs from sklearn by {error:.3g} "
+                     f"(tolerance {tolerance:.3g}); using the sklearn model")
+        return None
+    return compiled
+
+
+def main():
+    """Check the compiled allocation model against sklearn and compare single-profile latency"""
+    import time
+    import prediction_allocation
+
+    model, scaler = prediction_allocation.model, prediction_allocation.scaler
+    compiled = CompiledAllocationModel.from_sklearn(model, scaler)
+    error = consistency_error(compiled, model, scaler, num_samples=10000)
+    print(f"Max difference from sklearn over 10,001 profiles: {error:.3g} "
+          f"({'OK' if error <= CONSISTENCY_TOLERANCE else 'FAILED'}, tolerance {CONSISTENCY_TOLERANCE:.0e})")
+
+    row = np.asarray(scaler.mean_, dtype=float)[np.newaxis, :]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        for name, predict in (('sklearn', lambda: model.predict(scaler.transform(row))),
+                              ('compiled', lambda: compiled.predict(row))):
+            predict()
+            started = time.perf_counter()
+            for _ in range(1000):
+                predict()
+            print(f"{name:>8}: {(time.perf_counter() - started) * 1000:.1f} us per profile")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,94 +1,117 @@
-import pandas as pd
 import numpy as np
 import os
+import copy
 import logging
+from monte_carlo_engine import simulate_portfolios, simulation_frame, find_best_portfolio, validate_sampler, validate_mode, call_seed
+from recommendation_cache import recommendation_cache, scale_portfolio, is_complete
+from market_data import market_data
+from snapshot_history import dataset_as_of
+from factor_covariance import build_covariance, covariance_key, validate_covariance_model
 
 logger = logging.getLogger(__name__)
 
 class CryptoMonteCarloOptimizer:
-    def __init__(self):
+    """
+    Crypto optimizer. Instances hold configuration only: build_portfolio and
+    get_crypto_recommendations keep every intermediate frame local, so one instance
+    can serve concurrent threads.
+    """
+    
+    def __init__(self, mode='monte_carlo', use_cache=True, covariance_model='diagonal',
+                 adaptive=False, sampler='random', workers=None):
         self.script_dir = os.path.dirname(__file__)
         self.crypto_data = None
-        
-    def load_crypto_data(self):
-        """Load crypto data from CSV"""
-        try:
-            file_path = os.path.join(self.script_dir, "crypto_stats.csv")
-            self.crypto_data = pd.read_csv(file_path)
-            return True
-        except Exception as e:
-            logger.error(f"Failed to load crypto data: {e}")
+        self.mode = validate_mode(mode)
+        self.use_cache = use_cache
+        self.adaptive = adaptive
+        self.sampler = validate_sampler(sampler)
+        self.workers = workers
+        self.covariance_model = validate_covariance_model(covariance_model)
+        
+    def load_crypto_data(self, dataset=None):
+        """Load crypto data from the market data registry"""
+        crypto_data = self.read_crypto_data(dataset)
+        if crypto_data is None:
             return False
+        self.crypto_data = crypto_data
+        return True
+    
+    def read_crypto_data(self, dataset=None):
+        """Fresh DataFrame of the crypto dataset for one call, or None if it is unavailable"""
+        if dataset is None:
+            dataset = market_data.get('crypto')
+        if dataset is None:
+            logger.error("Failed to load crypto data")
+            return None
+        return dataset.to_frame()
     
-    def run_monte_carlo_simulation(self, num_simulations=5000):
+    def get_covariance(self, crypto_data):
+        """Covariance model for the given cryptos, None when they are treated as uncorrelated"""
+        return build_covariance(
+            'crypto',
+            crypto_data['symbol'].values,
+            crypto_data['daily_volatility'].values,
+            model=self.covariance_model
+        )
+    
+    def run_monte_carlo_simulation(self, num_simulations=5000, crypto_data=None, rng=None):
         """Run Monte Carlo simulation for crypto portfolio"""
-        if self.crypto_data is None or self.crypto_data.empty:
+        if crypto_data is None:
+            crypto_data = self.crypto_data
+        if crypto_data is None or crypto_data.empty:
             return None
         
-        np.random.seed(42)
-        
-        returns = self.crypto_data['Mean_Daily_Return'].values
-        volatilities = self.crypto_data['Daily_Volatility'].values
-        tickers = self.crypto_data['Ticker'].values
-        
-        num_assets = len(tickers)
-        risk_free_rate = 0.0001
-        
-        all_weights = []
-        all_returns = []
-        all_vols = []
-        all_sharpes = []
-        
-        for _ in range(num_simulations):
-            weights = np.random.random(num_assets)
-            weights /= np.sum(weights)
-            
-            port_return = np.dot(weights, returns)
-            port_volatility = np.sqrt(np.dot(weights.T, np.dot(np.diag(volatilities ** 2), weights)))
-            
-            sharpe_ratio = (port_return - risk_free_rate) / port_volatility if port_volatility > 0 else 0
-            
-            all_weights.append(weights)
-            all_returns.append(port_return)
-            all_vols.append(port_volatility)
-            all_sharpes.append(sharpe_ratio)
-        
-        results_df = pd.DataFrame({
-            "Return": all_returns,
-            "Volatility": all_vols,
-            "Sharpe Ratio": all_sharpes
-        })
-        
-        for i, ticker in enumerate(tickers):
-            results_df[ticker] = [w[i] for w in all_weights]
+        returns = crypto_data['mean_daily_return'].values
+        volatilities = crypto_data['daily_volatility'].values
+        tickers = crypto_data['symbol'].values
         
-        results_df_sorted = results_df.sort_values(by="Sharpe Ratio", ascending=False)
+        results = simulate_portfolios(returns, volatilities, num_simulations, seed=call_seed(rng),
+                                      covariance=self.get_covariance(crypto_data))
+        results_df_sorted = simulation_frame(results, tickers, include_var=False)
         return results_df_sorted, tickers
     
-    def get_crypto_recommendations(self, investment_amount):
-        """Get crypto recommendations based on investment amount"""
+    def select_best_portfolio(self, num_simulations=5000, deadline=None, crypto_data=None, rng=None):
+        """Find the best crypto portfolio with the configured optimizer mode"""
+        if crypto_data is None:
+            crypto_data = self.crypto_data
+        if crypto_data is None or crypto_data.empty:
+            return None, None
+        
+        returns = crypto_data['mean_daily_return'].values
+        volatilities = crypto_data['daily_volatility'].values
+        tickers = crypto_data['symbol'].values
+        
+        best = find_best_portfolio(returns, volatilities, num_simulations, mode=self.mode, seed=call_seed(rng),
+                                   adaptive=self.adaptive, sampler=self.sampler, deadline=deadline,
+                                   workers=self.workers,
+                                   covariance=self.get_covariance(crypto_data))
+        return best, tickers
+    
+    def get_target_count(self, investment_amount):
+        """Number of cryptos to recommend for an investment amount"""
         if investment_amount < 10000:
-            target_cryptos = 2
+            return 2
         elif investment_amount < 50000:
-            target_cryptos = 3
+            return 3
         elif investment_amount < 100000:
-            target_cryptos = 5
+            return 5
         else:
-            target_cryptos = 8
-        
-        if not self.load_crypto_data():
+            return 8
+    
+    def build_portfolio(self, target_cryptos, dataset=None, deadline=None, rng=None):
+        """Optimize the crypto portfolio for a target count, without amounts"""
+        crypto_data = self.read_crypto_data(dataset)
+        if crypto_data is None:
             return None
         
         # Filter to top cryptos by market cap (first entries are typically larger)
-        top_cryptos = self.crypto_data.head(min(30, len(self.crypto_data)))
-        self.crypto_data = top_cryptos
+        top_cryptos = crypto_data.head(min(30, len(crypto_data)))
         
-        results_df, tickers = self.run_monte_carlo_simulation()
-        if results_df is None:
+        best, tickers = self.select_best_portfolio(deadline=deadline, crypto_data=top_cryptos, rng=rng)
+        if best is None:
             return None
         
-        best_portfolio = results_df.iloc[0]
-        weights = best_portfolio[tickers].values
+        weights = best['weights']
         
         # Get top weighted cryptos
         crypto_weights = list(zip(tickers, weights))
@@ -101,19 +124,76 @@ class CryptoMonteCarloOptimizer:
         recommendations = []
         for ticker, weight in top_cryptos:
             normalized_weight = (weight / total_weight) * 100
-            amount = investment_amount * (normalized_weight / 100)
             
             recommendations.append({
                 'symbol': ticker.replace('-USD', ''),
-                'weight': normalized_weight,
-                'amount': amount
+                'weight': normalized_weight
             })
         
-        result = {
+        return {
             'recommendations': recommendations,
-            'portfolio_return': best_portfolio['Return'] * 365 * 100,
-            'portfolio_volatility': best_portfolio['Volatility'] * np.sqrt(365) * 100,
-            'sharpe_ratio': best_portfolio['Sharpe Ratio']
+            'portfolio_return': best['Return'] * 365 * 100,
+            'portfolio_volatility': best['Volatility'] * np.sqrt(365) * 100,
+            'sharpe_ratio': best['Sharpe Ratio'],
+            'simulations_used': best['simulations_used'],
+            'quality': best['quality']
         }
+    
+    def get_crypto_recommendations(self, investment_amount, deadline=None, as_of=None):
+        """
+        Get crypto recommendations based on investment amount, optionally as of a past date.
+        
+        A replay (``as_of``) always uses the diagonal covariance model, see
+        AdvancedMonteCarloOptimizer.get_stock_recommendations.
+        """
+        if as_of is not None and self.covariance_model != 'diagonal':
+            # Return histories are not versioned, so a replay uses uncorrelated assets
+            # rather than mixing the recorded statistics with today's correlations
+            replay = copy.copy(self)
+            replay.covariance_model = 'diagonal'
+            return replay.get_crypto_recommendations(investment_amount, deadline, as_of)
+        
+        target_cryptos = self.get_target_count(investment_amount)
+        
+        dataset = market_data.get('crypto') if as_of is None else dataset_as_of('crypto', as_of)
+        if dataset is None:
+            logger.error("Failed to load crypto data")
+            return None
+        
+        # Replays bypass the cache: their fingerprints would evict the live portfolios
+        if not self.use_cache or as_of is not None:
+            portfolio = self.build_portfolio(target_cryptos, dataset, deadline)
+        else:
+            cache_key = ('crypto', target_cryptos, self.mode, self.adaptive, self.sampler, self.workers,
+                         covariance_key('crypto', self.covariance_model), dataset.fingerprint)
+            portfolio = recommendation_cache.get_or_compute(
+                cache_key, lambda: self.build_portfolio(target_cryptos, dataset, deadline), cacheable=is_complete
+            )
         
-        return result
\ No newline at end of file
+        if portfolio is None:
+            return None
+        
+        return scale_portfolio(portfolio, investment_amount)
+
+
+def build_crypto_portfolio(dataset, target_cryptos, rng=None, deadline=None, mode='monte_carlo',
+                           covariance_model='diagonal', adaptive=False, sampler='random', workers=None):
+    """
+    Functional entry point: optimize a crypto portfolio from an explicit snapshot.
+    
+    Shares no mutable state with other calls, so concurrent calls need no locks
+    and equal inputs give equal portfolios.
+    
+    Args:
+        dataset (MarketDataset): Crypto snapshot
+        target_cryptos (int): Number of holdings to select
+        rng (np.random.Generator): Source of the weight draws; None uses the fixed seed
+        deadline (float): time.monotonic() value by which to return the best portfolio so far
+        mode, covariance_model, adaptive, sampler, workers: As for CryptoMonteCarloOptimizer
+    
+    Returns:
+        dict: Portfolio without amounts (see scale_portfolio), or None on failure
+    """
+    optimizer = CryptoMonteCarloOptimizer(mode=mode, use_cache=False, covariance_model=covariance_model,
+                                          adaptive=adaptive, sampler=sampler, workers=workers)
+    return optimizer.build_portfolio(target_cryptos, dataset, deadline, rng)
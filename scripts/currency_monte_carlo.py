@@ -1,99 +1,107 @@
-import pandas as pd
 import numpy as np
 import os
 import logging
+from monte_carlo_engine import simulate_portfolios, simulation_frame, find_best_portfolio, validate_sampler, validate_mode, call_seed
+from recommendation_cache import recommendation_cache, scale_portfolio, is_complete
+from market_data import market_data
+from snapshot_history import dataset_as_of
 
 logger = logging.getLogger(__name__)
 
 class CurrencyMonteCarloOptimizer:
-    def __init__(self):
+    """
+    Currency optimizer. Instances hold configuration only: build_portfolio and
+    get_currency_recommendations keep every intermediate frame local, so one instance
+    can serve concurrent threads.
+    """
+    
+    def __init__(self, mode='monte_carlo', use_cache=True, adaptive=False, sampler='random',
+                 workers=None):
         self.script_dir = os.path.dirname(__file__)
         self.currency_data = None
-        
-    def load_currency_data(self):
-        """Load currency data from CSV"""
-        try:
-            file_path = os.path.join(self.script_dir, "currency_stats_vs_inr.csv")
-            self.currency_data = pd.read_csv(file_path)
-            return True
-        except Exception as e:
-            logger.error(f"Failed to load currency data: {e}")
+        self.mode = validate_mode(mode)
+        self.use_cache = use_cache
+        self.adaptive = adaptive
+        self.sampler = validate_sampler(sampler)
+        self.workers = workers
+        
+    def load_currency_data(self, dataset=None):
+        """Load currency data from the market data registry"""
+        currency_data = self.read_currency_data(dataset)
+        if currency_data is None:
             return False
+        self.currency_data = currency_data
+        return True
+    
+    def read_currency_data(self, dataset=None):
+        """Fresh DataFrame of the currency dataset for one call, or None if it is unavailable"""
+        if dataset is None:
+            dataset = market_data.get('currency')
+        if dataset is None:
+            logger.error("Failed to load currency data")
+            return None
+        return dataset.to_frame()
     
-    def run_monte_carlo_simulation(self, num_simulations=3000):
+    def run_monte_carlo_simulation(self, num_simulations=3000, currency_data=None, rng=None):
         """Run Monte Carlo simulation for currency portfolio"""
-        if self.currency_data is None or self.currency_data.empty:
+        if currency_data is None:
+            currency_data = self.currency_data
+        if currency_data is None or currency_data.empty:
             return None
         
-        np.random.seed(42)
+        returns = currency_data['mean_daily_return'].values
+        volatilities = currency_data['daily_volatility'].values
+        currencies = currency_data['symbol'].values
         
-        returns = self.currency_data['Mean Daily Return'].values
-        volatilities = self.currency_data['Daily Volatility'].values
-        currencies = self.currency_data['Cuurency'].values
-        
-        num_assets = len(currencies)
-        risk_free_rate = 0.0001
-        
-        all_weights = []
-        all_returns = []
-        all_vols = []
-        all_sharpes = []
-        
-        for _ in range(num_simulations):
-            weights = np.random.random(num_assets)
-            weights /= np.sum(weights)
-            
-            port_return = np.dot(weights, returns)
-            port_volatility = np.sqrt(np.dot(weights.T, np.dot(np.diag(volatilities ** 2), weights)))
-            
-            sharpe_ratio = (port_return - risk_free_rate) / port_volatility if port_volatility > 0 else 0
-            
-            all_weights.append(weights)
-            all_returns.append(port_return)
-            all_vols.append(port_volatility)
-            all_sharpes.append(sharpe_ratio)
-        
-        results_df = pd.DataFrame({
-            "Return": all_returns,
-            "Volatility": all_vols,
-            "Sharpe Ratio": all_sharpes
-        })
-        
-        for i, currency in enumerate(currencies):
-            results_df[currency] = [w[i] for w in all_weights]
-        
-        results_df_sorted = results_df.sort_values(by="Sharpe Ratio", ascending=False)
+        results = simulate_portfolios(returns, volatilities, num_simulations, seed=call_seed(rng))
+        results_df_sorted = simulation_frame(results, currencies, include_var=False)
         return results_df_sorted, currencies
     
-    def get_currency_recommendations(self, investment_amount):
-        """Get currency recommendations based on investment amount"""
+    def select_best_portfolio(self, num_simulations=3000, deadline=None, currency_data=None, rng=None):
+        """Find the best currency portfolio with the configured optimizer mode"""
+        if currency_data is None:
+            currency_data = self.currency_data
+        if currency_data is None or currency_data.empty:
+            return None, None
+        
+        returns = currency_data['mean_daily_return'].values
+        volatilities = currency_data['daily_volatility'].values
+        currencies = currency_data['symbol'].values
+        
+        best = find_best_portfolio(returns, volatilities, num_simulations, mode=self.mode, seed=call_seed(rng),
+                                   adaptive=self.adaptive, sampler=self.sampler, deadline=deadline,
+                                   workers=self.workers)
+        return best, currencies
+    
+    def get_target_count(self, investment_amount):
+        """Number of currencies to recommend for an investment amount"""
         if investment_amount < 25000:
-            target_currencies = 2
+            return 2
         elif investment_amount < 100000:
-            target_currencies = 3
+            return 3
         else:
-            target_currencies = 5
-        
-        if not self.load_currency_data():
+            return 5
+    
+    def build_portfolio(self, target_currencies, dataset=None, deadline=None, rng=None):
+        """Optimize the currency portfolio for a target count, without amounts"""
+        currency_data = self.read_currency_data(dataset)
+        if currency_data is None:
             return None
         
         # Filter stable currencies (positive returns, lower volatility)
-        stable_currencies = self.currency_data[
-            (self.currency_data['Mean Daily Return'] >= 0) & 
-            (self.currency_data['Daily Volatility'] < 0.01)
+        stable_currencies = currency_data[
+            (currency_data['mean_daily_return'] >= 0) & 
+            (currency_data['daily_volatility'] < 0.01)
         ]
         
         if len(stable_currencies) < target_currencies:
-            stable_currencies = self.currency_data.nlargest(target_currencies * 2, 'Mean Daily Return')
-        
-        self.currency_data = stable_currencies
+            stable_currencies = currency_data.nlargest(target_currencies * 2, 'mean_daily_return')
         
-        results_df, currencies = self.run_monte_carlo_simulation()
-        if results_df is None:
+        best, currencies = self.select_best_portfolio(deadline=deadline, currency_data=stable_currencies, rng=rng)
+        if best is None:
             return None
         
-        best_portfolio = results_df.iloc[0]
-        weights = best_portfolio[currencies].values
+        weights = best['weights']
         
         # Get top weighted currencies
         currency_weights = list(zip(currencies, weights))
@@ -106,19 +114,64 @@ class CurrencyMonteCarloOptimizer:
         recommendations = []
         for currency, weight in top_currencies:
             normalized_weight = (weight / total_weight) * 100
-            amount = investment_amount * (normalized_weight / 100)
             
             recommendations.append({
                 'symbol': currency,
-                'weight': normalized_weight,
-                'amount': amount
+                'weight': normalized_weight
             })
         
-        result = {
+        return {
             'recommendations': recommendations,
-            'portfolio_return': best_portfolio['Return'] * 365 * 100,
-            'portfolio_volatility': best_portfolio['Volatility'] * np.sqrt(365) * 100,
-            'sharpe_ratio': best_portfolio['Sharpe Ratio']
+            'portfolio_return': best['Return'] * 365 * 100,
+            'portfolio_volatility': best['Volatility'] * np.sqrt(365) * 100,
+            'sharpe_ratio': best['Sharpe Ratio'],
+            'simulations_used': best['simulations_used'],
+            'quality': best['quality']
         }
+    
+    def get_currency_recommendations(self, investment_amount, deadline=None, as_of=None):
+        """Get currency recommendations based on investment amount, optionally as of a past date"""
+        target_currencies = self.get_target_count(investment_amount)
+        
+        dataset = market_data.get('currency') if as_of is None else dataset_as_of('currency', as_of)
+        if dataset is None:
+            logger.error("Failed to load currency data")
+            return None
+        
+        # Replays bypass the cache: their fingerprints would evict the live portfolios
+        if not self.use_cache or as_of is not None:
+            portfolio = self.build_portfolio(target_currencies, dataset, deadline)
+        else:
+            cache_key = ('currency', target_currencies, self.mode, self.adaptive, self.sampler, self.workers,
+                         dataset.fingerprint)
+            portfolio = recommendation_cache.get_or_compute(
+                cache_key, lambda: self.build_portfolio(target_currencies, dataset, deadline), cacheable=is_complete
+            )
         
-        return result
\ No newline at end of file
+        if portfolio is None:
+            return None
+        
+        return scale_portfolio(portfolio, investment_amount)
+
+
+def build_currency_portfolio(dataset, target_currencies, rng=None, deadline=None, mode='monte_carlo',
+                             adaptive=False, sampler='random', workers=None):
+    """
+    Functional entry point: optimize a currency portfolio from an explicit snapshot.
+    
+    Shares no mutable state with other calls, so concurrent calls need no locks
+    and equal inputs give equal portfolios.
+    
+    Args:
+        dataset (MarketDataset): Currency snapshot
+        target_currencies (int): Number of holdings to select
+        rng (np.random.Generator): Source of the weight draws; None uses the fixed seed
+        deadline (float): time.monotonic() value by which to return the best portfolio so far
+        mode, adaptive, sampler, workers: As for CurrencyMonteCarloOptimizer
+    
+    Returns:
+        dict: Portfolio without amounts (see scale_portfolio), or None on failure
+    """
+    optimizer = CurrencyMonteCarloOptimizer(mode=mode, use_cache=False, adaptive=adaptive, sampler=sampler,
+                                            workers=workers)
+    return optimizer.build_portfolio(target_currencies, dataset, deadline, rng)
@@ -1,229 +1,276 @@
-import pandas as pd
 import numpy as np
 import os
-from datetime import datetime
+import copy
 import warnings
 import logging
+from monte_carlo_engine import simulate_portfolios, simulation_frame, find_best_portfolio, prune_assets, validate_sampler, validate_mode, call_seed
+from exact_optimizer import cardinality_portfolio
+from factor_covariance import build_covariance, covariance_key, validate_covariance_model
+from recommendation_cache import recommendation_cache, scale_portfolio, is_complete
+from market_data import market_data
+from snapshot_history import dataset_as_of
 warnings.filterwarnings('ignore')
 
 logger = logging.getLogger(__name__)
 
+# Recommendations below this weight (%) are dropped and their weight redistributed
+MIN_WEIGHT_PERCENT = 5.0
+
 class AdvancedMonteCarloOptimizer:
-    def __init__(self):
+    """
+    Equity optimizer. Instances hold configuration only: build_portfolio and
+    get_stock_recommendations read an immutable market data snapshot and keep every
+    intermediate frame local, so one instance can serve concurrent threads.
+    """
+    
+    def __init__(self, mode='monte_carlo', use_cache=True, covariance_model='diagonal',
+                 adaptive=False, sampler='random', workers=None):
         self.script_dir = os.path.dirname(__file__)
         self.stock_data = None
-        
-    def load_stock_data(self):
-        """Load stock data with fallback mechanism"""
-        try:
-            # Try to fetch fresh data
-            from fetch_stock_data import fetch_nifty100_data
-            self.stock_data = fetch_nifty100_data()
-            return True
-        except Exception as e:
-            # Fallback to existing simulation data or generate it
-            try:
-                # Look for existing simulation data files
-                files = [f for f in os.listdir(self.script_dir) if f.startswith('nifty100_simulation_data_') and f.endswith('.csv')]
-                if files:
-                    latest_file = max(files)
-                    file_path = os.path.join(self.script_dir, latest_file)
-                    self.stock_data = pd.read_csv(file_path)
-                    return True
-                else:
-                    # Generate simulation data from existing stock_data.csv
-                    from generate_simulation_data import generate_simulation_data_from_existing
-                    self.stock_data = generate_simulation_data_from_existing()
-                    return True
-            except Exception as e2:
-                logger.error(f"Failed to load/generate simulation data: {e2}")
-            
+        self.mode = validate_mode(mode)
+        self.use_cache = use_cache
+        self.adaptive = adaptive
+        self.sampler = validate_sampler(sampler)
+        self.workers = workers
+        self.covariance_model = validate_covariance_model(covariance_model)
+        
+    def load_stock_data(self, dataset=None):
+        """Load the latest Nifty 100 simulation data from the market data registry"""
+        stock_data = self.read_stock_data(dataset)
+        if stock_data is None:
             return False
+        self.stock_data = stock_data
+        return True
+    
+    def read_stock_data(self, dataset=None):
+        """Fresh DataFrame of the equity dataset for one call, or None if it is unavailable"""
+        if dataset is None:
+            dataset = market_data.get('equity')
+        if dataset is None:
+            logger.error("Failed to load simulation data")
+            return None
+        return dataset.to_frame()
     
-    def run_monte_carlo_simulation(self, num_simulations=10000):
+    def get_covariance(self, stock_data):
+        """Covariance model for the given stocks, None when they are treated as uncorrelated"""
+        return build_covariance(
+            'equity',
+            stock_data['symbol'].values,
+            stock_data['daily_volatility'].values,
+            model=self.covariance_model
+        )
+    
+    def run_monte_carlo_simulation(self, num_simulations=10000, stock_data=None, rng=None):
         """Run Monte Carlo simulation based on notebook logic"""
-        if self.stock_data is None or self.stock_data.empty:
+        if stock_data is None:
+            stock_data = self.stock_data
+        if stock_data is None or stock_data.empty:
             return None
         
-        # Set random seed for reproducible results
-        np.random.seed(42)
-        
         # Convert to arrays for simulation
-        returns = self.stock_data['Mean Daily Return'].values
-        volatilities = self.stock_data['Daily Volatility'].values
-        tickers = self.stock_data['Ticker'].values
-        
-        num_assets = len(tickers)
-        risk_free_rate = 0.0001  # Daily risk-free return
-        
-        # Results containers
-        all_weights = []
-        all_returns = []
-        all_vols = []
-        all_sharpes = []
-        all_vars = []
-        
-        for _ in range(num_simulations):
-            # Generate random weights and normalize
-            weights = np.random.random(num_assets)
-            weights /= np.sum(weights)
-            
-            # Expected portfolio return and volatility
-            port_return = np.dot(weights, returns)
-            port_volatility = np.sqrt(np.dot(weights.T, np.dot(np.diag(volatilities ** 2), weights)))
-            
-            # Sharpe Ratio
-            sharpe_ratio = (port_return - risk_free_rate) / port_volatility if port_volatility > 0 else 0
-            
-            # Value at Risk (VaR) at 95% confidence
-            z_score = 1.645
-            port_var_95 = -(port_return - z_score * port_volatility)
-            
-            # Store results
-            all_weights.append(weights)
-            all_returns.append(port_return)
-            all_vols.append(port_volatility)
-            all_sharpes.append(sharpe_ratio)
-            all_vars.append(port_var_95)
-        
-        # Convert to DataFrame
-        results_df = pd.DataFrame({
-            "Return": all_returns,
-            "Volatility": all_vols,
-            "Sharpe Ratio": all_sharpes,
-            "VaR (95%)": all_vars
-        })
-        
-        # Add weights as columns
-        for i, ticker in enumerate(tickers):
-            results_df[ticker] = [w[i] for w in all_weights]
+        returns = stock_data['mean_daily_return'].values
+        volatilities = stock_data['daily_volatility'].values
+        tickers = stock_data['symbol'].values
+        
+        # Batched draws with a fixed seed (or the caller's generator) for reproducible results
+        results = simulate_portfolios(returns, volatilities, num_simulations, seed=call_seed(rng),
+                                      covariance=self.get_covariance(stock_data))
         
         # Sort by Sharpe Ratio descending, then VaR ascending
-        results_df_sorted = results_df.sort_values(by=["Sharpe Ratio", "VaR (95%)"], ascending=[False, True])
+        results_df_sorted = simulation_frame(results, tickers)
         
         return results_df_sorted, tickers
     
-    def prune_stocks(self, current_data, target_count):
-        """Prune stocks based on Monte Carlo results"""
-        if len(current_data) <= target_count:
-            return current_data
-        
-        # Temporarily set stock_data for simulation
-        original_data = self.stock_data
-        self.stock_data = current_data
-        
-        # Run Monte Carlo simulation
-        results_df, tickers = self.run_monte_carlo_simulation(num_simulations=5000)
-        
-        # Restore original data
-        self.stock_data = original_data
-        
-        if results_df is None:
-            return current_data
-        
-        # Get best portfolio weights
-        best_portfolio = results_df.iloc[0]
-        weights = best_portfolio[tickers].values
-        
-        # Create stock-weight pairs and sort by weight
-        stock_weights = list(zip(tickers, weights))
-        stock_weights.sort(key=lambda x: x[1], reverse=True)
-        
-        # Select top stocks
-        top_tickers = [ticker for ticker, _ in stock_weights[:target_count]]
-        
-        # Return filtered data
-        filtered_data = current_data[current_data['Ticker'].isin(top_tickers)].reset_index(drop=True)
-        return filtered_data
+    def select_best_portfolio(self, num_simulations=10000, deadline=None, stock_data=None, rng=None):
+        """Find the best portfolio with the configured optimizer mode"""
+        if stock_data is None:
+            stock_data = self.stock_data
+        if stock_data is None or stock_data.empty:
+            return None, None
+        
+        returns = stock_data['mean_daily_return'].values
+        volatilities = stock_data['daily_volatility'].values
+        tickers = stock_data['symbol'].values
+        
+        best = find_best_portfolio(returns, volatilities, num_simulations, mode=self.mode, seed=call_seed(rng),
+                                   adaptive=self.adaptive, sampler=self.sampler, deadline=deadline,
+                                   workers=self.workers,
+                                   covariance=self.get_covariance(stock_data))
+        return best, tickers
+    
+    def prune_stocks(self, current_data, target_count, num_simulations=2000, rng=None):
+        """Prune stocks to target_count, reusing one set of draws across every pruning stage"""
+        keep, simulations_used = prune_assets(
+            current_data['mean_daily_return'].values,
+            current_data['daily_volatility'].values,
+            target_count,
+            num_simulations=num_simulations,
+            mode=self.mode,
+            seed=call_seed(rng),
+            covariance=self.get_covariance(current_data)
+        )
+        return current_data.iloc[keep].reset_index(drop=True), simulations_used
     
-    def get_stock_recommendations(self, investment_amount):
-        """Get stock recommendations with iterative pruning based on investment amount"""
-        # Determine number of stocks based on investment amount
+    def get_target_count(self, investment_amount):
+        """Number of stocks to recommend for an investment amount"""
         if investment_amount < 50000:
-            target_stocks = 3
+            return 3
         elif investment_amount < 100000:
-            target_stocks = 5
+            return 5
         elif investment_amount < 300000:
-            target_stocks = 8
+            return 8
         elif investment_amount < 500000:
-            target_stocks = 10  
+            return 10  
         elif investment_amount < 800000:
-            target_stocks = 15      
+            return 15      
         else:
-            target_stocks = 18
-        
-        if not self.load_stock_data():
+            return 18
+    
+    def build_portfolio(self, target_stocks, dataset=None, deadline=None, rng=None):
+        """
+        Prune and optimize the stock portfolio for a target count, without amounts.
+        
+        Args:
+            target_stocks (int): Number of stocks to select
+            dataset (MarketDataset): Equity snapshot, defaults to the registry's current one
+            deadline (float): time.monotonic() value by which to return the best portfolio so far
+            rng (np.random.Generator): Source of the weight draws; None reproduces the
+                                       fixed-seed results
+        
+        Returns:
+            dict: Portfolio without amounts, or None if the data is unavailable
+        """
+        stock_data = self.read_stock_data(dataset)
+        if stock_data is None:
             return None
         
-        current_stocks = self.stock_data.copy()
-        
-        # Iterative pruning process
-        iteration = 1
-        while len(current_stocks) > target_stocks:
-            # Determine next pruning target
-            if len(current_stocks) > target_stocks * 3:
-                next_target = max(target_stocks * 2, len(current_stocks) // 2)
-            elif len(current_stocks) > target_stocks * 2:
-                next_target = target_stocks * 2
-            else:
-                next_target = target_stocks
-            
-            # Prune stocks
-            current_stocks = self.prune_stocks(current_stocks, next_target)
-            
-            iteration += 1
+        if self.mode == 'cardinality':
+            # Solve directly for exactly target_stocks holdings, each above the minimum weight
+            best = cardinality_portfolio(
+                stock_data['mean_daily_return'].values,
+                stock_data['daily_volatility'].values,
+                target_stocks,
+                min_weight=MIN_WEIGHT_PERCENT / 100,
+                covariance=self.get_covariance(stock_data)
+            )
+            tickers = stock_data['symbol'].values
+            simulations_used = 0
+        else:
+            # Prune the universe, then optimize the survivors with a fresh set of draws
+            current_stocks, simulations_used = self.prune_stocks(stock_data, target_stocks, rng=rng)
             
-            if iteration > 8:  # Safety break
-                break
-        
-        # Set current stocks for final simulation
-        self.stock_data = current_stocks
-        results_df, tickers = self.run_monte_carlo_simulation(num_simulations=10000)
+            best, tickers = self.select_best_portfolio(num_simulations=10000, deadline=deadline,
+                                                       stock_data=current_stocks, rng=rng)
+            if best is not None:
+                simulations_used += best['simulations_used']
         
-        if results_df is None:
+        if best is None:
             return None
         
         # Get best portfolio
-        best_portfolio = results_df.iloc[0]
-        weights = best_portfolio[tickers].values
+        weights = best['weights']
         
         # Create recommendations with only generated data
         recommendations = []
-        for i, ticker in enumerate(tickers):
-            weight = weights[i]
-            amount = investment_amount * weight
-            
+        for i in np.flatnonzero(weights):
             recommendations.append({
-                'symbol': ticker,
-                'weight': weight * 100,
-                'amount': amount
+                'symbol': tickers[i],
+                'weight': weights[i] * 100
             })
         
-        # Prune allocations less than 5% and redistribute
-        filtered_recs = [r for r in recommendations if r['weight'] >= 5.0]
-        pruned_weight = sum(r['weight'] for r in recommendations if r['weight'] < 5.0)
-        
-        if filtered_recs and pruned_weight > 0:
-            # Redistribute pruned weight proportionally
-            total_filtered_weight = sum(r['weight'] for r in filtered_recs)
-            for rec in filtered_recs:
-                rec['weight'] += (rec['weight'] / total_filtered_weight) * pruned_weight
-                rec['amount'] = investment_amount * (rec['weight'] / 100)
-        
-        recommendations = filtered_recs if filtered_recs else recommendations
+        # Prune allocations less than 5% and redistribute; cardinality weights are
+        # already bounded below by the minimum
+        if self.mode != 'cardinality':
+            filtered_recs = [r for r in recommendations if r['weight'] >= MIN_WEIGHT_PERCENT]
+            pruned_weight = sum(r['weight'] for r in recommendations if r['weight'] < MIN_WEIGHT_PERCENT)
+            
+            if filtered_recs and pruned_weight > 0:
+                # Redistribute pruned weight proportionally
+                total_filtered_weight = sum(r['weight'] for r in filtered_recs)
+                for rec in filtered_recs:
+                    rec['weight'] += (rec['weight'] / total_filtered_weight) * pruned_weight
+            
+            recommendations = filtered_recs if filtered_recs else recommendations
         recommendations.sort(key=lambda x: x['weight'], reverse=True)
         
-        result = {
+        return {
             'recommendations': recommendations,
-            'portfolio_return': best_portfolio['Return'] * 252 * 100,
-            'portfolio_volatility': best_portfolio['Volatility'] * np.sqrt(252) * 100,
-            'sharpe_ratio': best_portfolio['Sharpe Ratio'],
-            'var_95': best_portfolio['VaR (95%)'] * 252 * 100,
-            'total_amount': investment_amount
+            'portfolio_return': best['Return'] * 252 * 100,
+            'portfolio_volatility': best['Volatility'] * np.sqrt(252) * 100,
+            'sharpe_ratio': best['Sharpe Ratio'],
+            'var_95': best['VaR (95%)'] * 252 * 100,
+            'simulations_used': simulations_used,
+            'quality': best['quality']
         }
+    
+    def get_stock_recommendations(self, investment_amount, deadline=None, as_of=None):
+        """
+        Get stock recommendations for an investment amount.
+        
+        The number of stocks depends on the amount. The universe is pruned to that
+        many stocks, reusing one shared set of weight draws across the pruning
+        stages, and the survivors are then optimized. Exact mode ranks the
+        universe by stand-alone Sharpe ratio instead; cardinality mode skips
+        pruning and solves for the stock count directly.
+        
+        ``as_of`` (a date) replays the statistics recorded in the snapshot history
+        on or before that date instead of the current data. Return histories are
+        not versioned, so a replay always treats the stocks as uncorrelated, even
+        with the factor covariance model configured.
+        """
+        if as_of is not None and self.covariance_model != 'diagonal':
+            # Return histories are not versioned, so a replay uses uncorrelated assets
+            # rather than mixing the recorded statistics with today's correlations
+            replay = copy.copy(self)
+            replay.covariance_model = 'diagonal'
+            return replay.get_stock_recommendations(investment_amount, deadline, as_of)
+        
+        target_stocks = self.get_target_count(investment_amount)
+        
+        dataset = market_data.get('equity') if as_of is None else dataset_as_of('equity', as_of)
+        if dataset is None:
+            logger.error("Failed to load simulation data")
+            return None
+        
+        # Replays bypass the cache: their fingerprints would evict the live portfolios
+        if not self.use_cache or as_of is not None:
+            portfolio = self.build_portfolio(target_stocks, dataset, deadline)
+        else:
+            cache_key = ('equity', target_stocks, self.mode, self.adaptive, self.sampler, self.workers,
+                         covariance_key('equity', self.covariance_model), dataset.fingerprint)
+            portfolio = recommendation_cache.get_or_compute(
+                cache_key, lambda: self.build_portfolio(target_stocks, dataset, deadline), cacheable=is_complete
+            )
+        
+        if portfolio is None:
+            return None
         
+        result = scale_portfolio(portfolio, investment_amount)
+        result['total_amount'] = investment_amount
         return result
 
+def build_equity_portfolio(dataset, target_stocks, rng=None, deadline=None, mode='monte_carlo',
+                           covariance_model='diagonal', adaptive=False, sampler='random', workers=None):
+    """
+    Functional entry point: optimize a stock portfolio from an explicit snapshot.
+    
+    Shares no mutable state with other calls (no cache, instance attributes or
+    global RNG), so concurrent calls need no locks and equal inputs give equal portfolios.
+    
+    Args:
+        dataset (MarketDataset): Equity snapshot
+        target_stocks (int): Number of stocks to select
+        rng (np.random.Generator): Source of the weight draws; None uses the fixed seed
+        deadline (float): time.monotonic() value by which to return the best portfolio so far
+        mode, covariance_model, adaptive, sampler, workers: As for AdvancedMonteCarloOptimizer
+    
+    Returns:
+        dict: Portfolio without amounts (see scale_portfolio), or None on failure
+    """
+    optimizer = AdvancedMonteCarloOptimizer(mode=mode, use_cache=False, covariance_model=covariance_model,
+                                            adaptive=adaptive, sampler=sampler, workers=workers)
+    return optimizer.build_portfolio(target_stocks, dataset, deadline, rng)
+
 def main():
     """Test the advanced Monte Carlo optimizer"""
     optimizer = AdvancedMonteCarloOptimizer()
@@ -0,0 +1,206 @@
+import numpy as np
+import logging
+from scipy.optimize import minimize
+from monte_carlo_engine import RISK_FREE_RATE, portfolio_statistics, best_portfolio
+
+logger = logging.getLogger(__name__)
+
+
+def _solve_max_sharpe(returns, volatilities, risk_free_rate, min_weight=0.0, covariance=None):
+    """Numerically maximise the Sharpe ratio over long-only, fully invested weights"""
+    num_assets = len(returns)
+    variances = volatilities ** 2
+
+    def covariance_dot(weights):
+        if covariance is None:
+            return variances * weights
+        return covariance.dot(weights)
+
+    def negative_sharpe(weights):
+        port_volatility = np.sqrt(np.dot(weights, covariance_dot(weights)))
+        if port_volatility <= 0:
+            return 0.0
+        return -(np.dot(weights, returns) - risk_free_rate) / port_volatility
+
+    def negative_sharpe_gradient(weights):
+        sigma_w = covariance_dot(weights)
+        port_volatility = np.sqrt(np.dot(weights, sigma_w))
+        if port_volatility <= 0:
+            return np.zeros(num_assets)
+        excess = np.dot(weights, returns) - risk_free_rate
+        return -(returns * port_volatility - excess * sigma_w / port_volatility) / port_volatility ** 2
+
+    result = minimize(
+        negative_sharpe,
+        np.full(num_assets, 1.0 / num_assets),
+        jac=negative_sharpe_gradient,
+        method='SLSQP',
+        bounds=[(min_weight, 1.0)] * num_assets,
+        constraints=[{'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1.0}]
+    )
+    if not result.success:
+        logger.warning(f"Max-Sharpe solver did not converge: {result.message}")
+
+    weights = np.clip(result.x, min_weight, None)
+    return weights / weights.sum()
+
+
+def max_sharpe_weights(returns, volatilities, risk_free_rate=RISK_FREE_RATE, covariance=None):
+    """
+    Long-only maximum-Sharpe weights.
+
+    With uncorrelated assets the tangency portfolio is ``w_i ∝ max(mu_i - rf, 0) / sigma_i ** 2``,
+    which is exact whenever at least one asset beats the risk-free rate. Otherwise, or
+    with a correlated covariance model, the Sharpe ratio is maximised with scipy's
+    SLSQP solver.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+
+    Returns:
+        np.ndarray: Weights summing to 1
+    """
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+    if covariance is not None:
+        return _solve_max_sharpe(returns, volatilities, risk_free_rate, covariance=covariance)
+
+    excess = returns - risk_free_rate
+
+    # A riskless asset beating the risk-free rate has infinite Sharpe ratio on its own
+    riskless = (volatilities <= 0) & (excess > 0)
+    if riskless.any():
+        return riskless / riskless.sum()
+
+    positive = (excess > 0) & (volatilities > 0)
+    if positive.any():
+        raw = np.zeros_like(excess)
+        raw[positive] = excess[positive] / volatilities[positive] ** 2
+        return raw / raw.sum()
+
+    return _solve_max_sharpe(returns, volatilities, risk_free_rate)
+
+
+def exact_portfolio(returns, volatilities, risk_free_rate=RISK_FREE_RATE, covariance=None):
+    """
+    Maximum-Sharpe portfolio in the same layout as the Monte Carlo best portfolio.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+
+    Returns:
+        dict: 'Return', 'Volatility', 'Sharpe Ratio', 'VaR (95%)' and 'weights'
+    """
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+
+    weights = max_sharpe_weights(returns, volatilities, risk_free_rate, covariance)
+    selection = portfolio_statistics(weights[np.newaxis, :], returns, volatilities, risk_free_rate, covariance)
+    selection['weights'] = weights[np.newaxis, :]
+    return best_portfolio(selection)
+
+
+def sharpe_scores(returns, volatilities, risk_free_rate=RISK_FREE_RATE):
+    """Stand-alone Sharpe ratio per asset; riskless assets score +inf or -inf by their excess return"""
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+    excess = returns - risk_free_rate
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(volatilities > 0, excess / volatilities, np.where(excess > 0, np.inf, -np.inf))
+
+
+def top_sharpe_assets(returns, volatilities, count, risk_free_rate=RISK_FREE_RATE):
+    """
+    Indices of the ``count`` assets with the highest stand-alone Sharpe ratio.
+
+    A linear-time partial sort, so the cost grows linearly with the universe.
+
+    Returns:
+        np.ndarray: Indices, best score first and lower index on ties
+    """
+    scores = sharpe_scores(returns, volatilities, risk_free_rate)
+    count = min(count, len(scores))
+    if count < len(scores):
+        candidates = np.argpartition(-scores, count - 1)[:count]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def cardinality_weights(returns, volatilities, num_holdings, min_weight=0.0, risk_free_rate=RISK_FREE_RATE,
+                        covariance=None):
+    """
+    Maximum-Sharpe weights holding exactly ``num_holdings`` assets.
+
+    With a diagonal covariance the squared Sharpe ratio of a tangency portfolio is the
+    sum of its assets' squared stand-alone Sharpe ratios, so the best support of size k
+    is simply the k highest-scoring assets. They are found with a linear-time partial
+    sort, so the cost grows linearly with the universe; only the k-asset weight problem
+    is solved numerically, and only when ``min_weight`` binds. With a correlated
+    covariance model the same support is used as a heuristic and its weights are
+    solved against the full model.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        num_holdings (int): Number of assets to hold (capped at the universe size)
+        min_weight (float): Smallest weight of each holding, so none is dropped later
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+
+    Returns:
+        np.ndarray: Weights over the full universe, non-zero on exactly ``num_holdings`` assets
+    """
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+    num_assets = len(returns)
+    num_holdings = min(num_holdings, num_assets)
+    if num_holdings < 1:
+        raise ValueError("num_holdings must be at least 1")
+    if min_weight * num_holdings > 1.0:
+        raise ValueError(f"Cannot hold {num_holdings} assets with at least {min_weight:.0%} each")
+
+    support = top_sharpe_assets(returns, volatilities, num_holdings, risk_free_rate)
+
+    sub_returns = returns[support]
+    sub_volatilities = volatilities[support]
+    sub_covariance = covariance.subset(support) if covariance is not None else None
+    sub_weights = max_sharpe_weights(sub_returns, sub_volatilities, risk_free_rate, sub_covariance)
+    if sub_weights.min() < min_weight or np.count_nonzero(sub_weights) < num_holdings:
+        sub_weights = _solve_max_sharpe(sub_returns, sub_volatilities, risk_free_rate,
+                                        min_weight=max(min_weight, 1e-6), covariance=sub_covariance)
+
+    weights = np.zeros(num_assets)
+    weights[support] = sub_weights
+    return weights
+
+
+def cardinality_portfolio(returns, volatilities, num_holdings, min_weight=0.0, risk_free_rate=RISK_FREE_RATE,
+                          covariance=None):
+    """
+    Cardinality-constrained maximum-Sharpe portfolio in the Monte Carlo best portfolio layout.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        num_holdings (int): Number of assets to hold
+        min_weight (float): Smallest weight of each holding
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+
+    Returns:
+        dict: 'Return', 'Volatility', 'Sharpe Ratio', 'VaR (95%)' and 'weights'
+    """
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+
+    weights = cardinality_weights(returns, volatilities, num_holdings, min_weight, risk_free_rate, covariance)
+    selection = portfolio_statistics(weights[np.newaxis, :], returns, volatilities, risk_free_rate, covariance)
+    selection['weights'] = weights[np.newaxis, :]
+    return best_portfolio(selection)
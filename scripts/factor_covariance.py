@@ -0,0 +1,210 @@
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+from market_data import market_data
+
+logger = logging.getLogger(__name__)
+
+# Covariance models an optimizer can use
+COVARIANCE_MODELS = ('diagonal', 'factor')
+
+# Principal components kept by the factor model
+DEFAULT_NUM_FACTORS = 5
+
+# Days of history needed before correlations are estimated
+MIN_HISTORY_DAYS = 60
+
+# Floor on each asset's idiosyncratic share of its variance
+MIN_SPECIFIC_SHARE = 0.05
+
+# Return-history dataset behind each asset class that supports the factor model
+RETURN_HISTORY_DATASETS = {
+    'equity': 'equity_returns',
+    'crypto': 'crypto_returns',
+}
+
+# Fitted factors per (dataset, fingerprint, num_factors); only a few versions are ever live
+MAX_CACHED_MODELS = 8
+
+
+class FactorCovariance:
+    """
+    Low-rank plus diagonal covariance, ``Sigma = B B^T + diag(d)``.
+
+    ``B`` is the (n, k) matrix of factor loadings (factors are orthonormal) and ``d``
+    the idiosyncratic variances, so the variance of a batch of m weight vectors
+    costs O(m * n * k) and the n x n matrix is never built.
+    """
+
+    def __init__(self, loadings, specific_variances):
+        self.loadings = np.asarray(loadings, dtype=float)
+        self.specific_variances = np.asarray(specific_variances, dtype=float)
+
+    @property
+    def num_factors(self):
+        return self.loadings.shape[1]
+
+    @property
+    def variances(self):
+        """Total variance of each asset"""
+        return np.sum(self.loadings ** 2, axis=1) + self.specific_variances
+
+    def subset(self, indices):
+        """Covariance of a subset of the assets"""
+        return FactorCovariance(self.loadings[indices], self.specific_variances[indices])
+
+    def portfolio_variance(self, weights):
+        """
+        Variance of one weight vector or a batch of them.
+
+        Args:
+            weights (np.ndarray): (n,) vector or (m, n) matrix of weights
+
+        Returns:
+            float or np.ndarray: Portfolio variance, one per row for a batch
+        """
+        exposures = weights @ self.loadings
+        return np.sum(exposures ** 2, axis=-1) + (weights ** 2) @ self.specific_variances
+
+    def dot(self, weights):
+        """Covariance-weight product ``Sigma @ w`` in O(n * k)"""
+        return self.loadings @ (self.loadings.T @ weights) + self.specific_variances * weights
+
+    def matrix(self):
+        """Dense n x n covariance, for inspection and small problems only"""
+        return self.loadings @ self.loadings.T + np.diag(self.specific_variances)
+
+
+def estimate_correlation_factors(history, num_factors=DEFAULT_NUM_FACTORS):
+    """
+    Fit a factor model of the correlation matrix from daily returns.
+
+    Each column is standardised (missing days count as average days) and the
+    leading principal components of the result become the factors. Loadings and
+    residuals are scaled so every asset has unit total variance.
+
+    Args:
+        history (np.ndarray): (days, assets) matrix of daily returns, NaN where missing
+        num_factors (int): Principal components to keep
+
+    Returns:
+        tuple: (loadings (assets, k), specific variances (assets,))
+    """
+    history = np.asarray(history, dtype=float)
+    num_days = history.shape[0]
+
+    means = np.nanmean(history, axis=0)
+    stds = np.nanstd(history, axis=0, ddof=1)
+    stds[~(stds > 0)] = 1.0
+    standardized = np.nan_to_num((history - means) / stds)
+
+    _, singular_values, components = np.linalg.svd(standardized, full_matrices=False)
+    num_factors = min(num_factors, len(singular_values))
+    loadings = components[:num_factors].T * (singular_values[:num_factors] / np.sqrt(num_days - 1))
+
+    common = np.sum(loadings ** 2, axis=1)
+    specific = np.maximum(1.0 - common, MIN_SPECIFIC_SHARE)
+    scale = 1.0 / np.sqrt(common + specific)
+    return loadings * scale[:, np.newaxis], specific * scale ** 2
+
+
+_factor_cache = OrderedDict()
+_factor_cache_lock = threading.Lock()
+
+
+def _correlation_factors(dataset, num_factors):
+    """Fitted correlation factors for a return-history dataset, computed once per version"""
+    key = (dataset.name, dataset.fingerprint, num_factors)
+    with _factor_cache_lock:
+        if key in _factor_cache:
+            _factor_cache.move_to_end(key)
+            return _factor_cache[key]
+
+    tickers = [column for column in dataset.columns if column != 'Date']
+    if len(dataset) < MIN_HISTORY_DAYS or not tickers:
+        logger.warning(f"Return history '{dataset.name}' has {len(dataset)} days, "
+                       f"need {MIN_HISTORY_DAYS}; using uncorrelated assets")
+        factors = None
+    else:
+        history = np.column_stack([dataset[ticker].astype(float) for ticker in tickers])
+        loadings, specific = estimate_correlation_factors(history, num_factors)
+        factors = ({ticker: i for i, ticker in enumerate(tickers)}, loadings, specific)
+
+    with _factor_cache_lock:
+        for cached_key in [k for k in _factor_cache if k[0] == dataset.name and k[1] != dataset.fingerprint]:
+            del _factor_cache[cached_key]
+        _factor_cache[key] = factors
+        while len(_factor_cache) > MAX_CACHED_MODELS:
+            _factor_cache.popitem(last=False)
+    return factors
+
+
+def validate_covariance_model(model):
+    """Raise ValueError for an unknown covariance model and return it unchanged otherwise"""
+    if model not in COVARIANCE_MODELS:
+        raise ValueError(f"Unknown covariance model '{model}', expected one of {COVARIANCE_MODELS}")
+    return model
+
+
+def covariance_key(asset_class, model='diagonal', registry=None):
+    """
+    Identifier of the covariance an optimizer would use, for cache keys.
+
+    Returns:
+        str: 'diagonal', or 'factor:' plus the return-history fingerprint
+    """
+    validate_covariance_model(model)
+    dataset_name = RETURN_HISTORY_DATASETS.get(asset_class)
+    if model == 'diagonal' or dataset_name is None:
+        return 'diagonal'
+    fingerprint = (registry or market_data).fingerprint(dataset_name)
+    return f'factor:{fingerprint}' if fingerprint else 'diagonal'
+
+
+def build_covariance(asset_class, tickers, volatilities, model='diagonal',
+                     num_factors=DEFAULT_NUM_FACTORS, registry=None):
+    """
+    Covariance model for a set of assets, or None for uncorrelated assets.
+
+    Correlations come from the asset class's return history; each asset's own
+    variance stays the square of its volatility in the statistics file, so the
+    factor model only adds co-movement. Assets missing from the history are
+    treated as uncorrelated with everything else.
+
+    Args:
+        asset_class (str): 'equity' or 'crypto'
+        tickers (array-like): Asset identifiers as they appear in the history header
+        volatilities (array-like): Daily volatility per asset
+        model (str): 'diagonal' or 'factor'
+        num_factors (int): Principal components to keep
+        registry (MarketDataRegistry): Registry to read, defaults to the process-wide one
+
+    Returns:
+        FactorCovariance: Factor model, or None when the diagonal model applies
+    """
+    validate_covariance_model(model)
+    dataset_name = RETURN_HISTORY_DATASETS.get(asset_class)
+    if model == 'diagonal' or dataset_name is None:
+        return None
+
+    dataset = (registry or market_data).get(dataset_name)
+    if dataset is None:
+        logger.warning(f"No return history for {asset_class}; using uncorrelated assets")
+        return None
+
+    factors = _correlation_factors(dataset, num_factors)
+    if factors is None:
+        return None
+    index, correlation_loadings, correlation_specific = factors
+
+    volatilities = np.asarray(volatilities, dtype=float)
+    rows = np.array([index.get(ticker, -1) for ticker in tickers], dtype=np.int64)
+    known = rows >= 0
+
+    loadings = np.zeros((len(volatilities), correlation_loadings.shape[1]))
+    specific = np.ones(len(volatilities))
+    loadings[known] = correlation_loadings[rows[known]]
+    specific[known] = correlation_specific[rows[known]]
+
+    return FactorCovariance(loadings * volatilities[:, np.newaxis], specific * volatilities ** 2)
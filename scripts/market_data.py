@@ -0,0 +1,315 @@
+import io
+import os
+import time
+import hashlib
+import threading
+import logging
+import numpy as np
+import pandas as pd
+import shared_store
+from market_snapshot import SNAPSHOT_DIR, SNAPSHOT_EXTENSION, read_csv_columns, read_snapshot, snapshot_path
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds between filesystem checks for a changed data file
+DEFAULT_CHECK_INTERVAL = 2.0
+
+# Statistics file behind each asset class
+DATASET_FILES = {
+    'bond': 'bond_daily_stats.csv',
+    'crypto': 'crypto_stats.csv',
+    'currency': 'currency_stats_vs_inr.csv',
+}
+
+EQUITY_FILE_PREFIX = 'nifty100_simulation_data_'
+
+# Optional daily return histories (a 'Date' column plus one column per ticker)
+# used to estimate correlations
+EQUITY_RETURNS_FILE_PREFIX = 'nifty100_returns_'
+CRYPTO_RETURNS_FILE = 'crypto_returns.csv'
+
+
+def latest_file(data_dir, prefix):
+    """Path of the latest ``prefix``*.csv in ``data_dir``, or None"""
+    files = [f for f in os.listdir(data_dir) if f.startswith(prefix) and f.endswith('.csv')]
+    if not files:
+        return None
+    return os.path.join(data_dir, max(files))
+
+
+def latest_equity_file(data_dir=SCRIPT_DIR):
+    """Path of the latest nifty100_simulation_data_*.csv in ``data_dir``, or None"""
+    return latest_file(data_dir, EQUITY_FILE_PREFIX)
+
+
+def existing_file(path):
+    """``path`` if it exists, otherwise None"""
+    return path if os.path.exists(path) else None
+
+
+class MarketDataset:
+    """
+    Immutable snapshot of one statistics file.
+
+    Columns are read-only NumPy arrays keyed by their schema name (see
+    market_snapshot.SCHEMAS) for asset-class statistics, or by their CSV header
+    otherwise. ``fingerprint`` is the SHA-1 of the CSV contents they were parsed
+    from, or the content hash of a binary snapshot.
+    """
+
+    def __init__(self, name, path, columns, fingerprint):
+        self.name = name
+        self.path = path
+        self.columns = columns
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_bytes(cls, name, path, content, schema=None):
+        """Parse CSV bytes into a read-only dataset, normalised to an asset class's schema if given"""
+        if schema is not None:
+            columns = read_csv_columns(schema, content)
+        else:
+            frame = pd.read_csv(io.BytesIO(content))
+            columns = {}
+            for column in frame.columns:
+                values = frame[column].to_numpy()
+                if values.dtype == object:
+                    values = values.astype(str)
+                columns[column] = np.array(values, copy=True)
+        for values in columns.values():
+            values.setflags(write=False)
+        fingerprint = hashlib.sha1(content).hexdigest()
+        return cls(name, path, columns, fingerprint)
+
+    @classmethod
+    def from_snapshot(cls, name, path, schema=None):
+        """Memory-map a binary snapshot; only its header is read"""
+        header, columns = read_snapshot(path, schema)
+        return cls(name, path, columns, header['content_hash'])
+
+    def to_store(self, directory):
+        """Write the columns to a shared store entry tagged with the fingerprint"""
+        shared_store.write_arrays(directory, self.columns, {
+            'name': self.name,
+            'path': self.path,
+            'fingerprint': self.fingerprint,
+        })
+
+    @classmethod
+    def from_store(cls, directory, fingerprint=None):
+        """
+        Dataset whose columns are memory-mapped from a shared store entry.
+
+        Returns:
+            MarketDataset: The dataset, or None if the entry is missing, unreadable
+            or holds other contents than ``fingerprint``
+        """
+        try:
+            entry = shared_store.open_arrays(directory)
+            if entry is None:
+                return None
+            columns, metadata = entry
+            if fingerprint is not None and metadata['fingerprint'] != fingerprint:
+                return None
+            return cls(metadata['name'], metadata['path'], columns, metadata['fingerprint'])
+        except Exception as e:
+            logger.error(f"Failed to load shared market dataset from {directory}: {e}")
+            return None
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def to_frame(self):
+        """Fresh DataFrame view of the snapshot for pandas-based callers"""
+        return pd.DataFrame(self.columns)
+
+
+class MarketDataRegistry:
+    """
+    Loads each market dataset once per process and reloads it when its file changes.
+
+    ``get`` stats the file at most once per ``check_interval`` seconds. A changed
+    mtime or size triggers a re-read; the snapshot is only replaced when the
+    content hash differs, and the swap is a single reference assignment so
+    readers always see a complete dataset.
+
+    With a ``store_dir``, a file whose contents match the dataset exported there
+    by ``manage.py build_shared_store`` is memory-mapped instead of parsed, so
+    every process on the host shares one copy of its columns.
+    """
+
+    def __init__(self, check_interval=DEFAULT_CHECK_INTERVAL, store_dir=None):
+        self.check_interval = check_interval
+        self.store_dir = store_dir
+        self._resolvers = {}
+        self._schemas = {}
+        self._optional = set()
+        self._datasets = {}
+        self._stat_keys = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, resolve_path, optional=False, schema=None):
+        """
+        Register a dataset.
+
+        Args:
+            name (str): Dataset name, e.g. 'bond'
+            resolve_path (callable): Returns the current file path (a CSV or a .mds
+                snapshot), or None if missing
+            optional (bool): A missing file is expected and not logged as an error
+            schema (str): Asset class whose snapshot schema the columns are normalised to
+        """
+        with self._lock:
+            self._resolvers[name] = resolve_path
+            self._schemas[name] = schema
+            if optional:
+                self._optional.add(name)
+            else:
+                self._optional.discard(name)
+            self._datasets.pop(name, None)
+            self._stat_keys.pop(name, None)
+            self._checked_at.pop(name, None)
+
+    def get(self, name):
+        """
+        Current snapshot of a dataset, reloading it first if the file changed.
+
+        Args:
+            name (str): Registered dataset name
+
+        Returns:
+            MarketDataset: Snapshot, or None if the dataset was never loadable
+        """
+        dataset = self._datasets.get(name)
+        checked_at = self._checked_at.get(name)
+        if dataset is not None and checked_at is not None and time.monotonic() - checked_at < self.check_interval:
+            return dataset
+
+        with self._lock:
+            return self._refresh(name)
+
+    def names(self):
+        """Names of every registered dataset"""
+        return list(self._resolvers)
+
+    def fingerprint(self, name):
+        """Content hash of the current snapshot, or None"""
+        dataset = self.get(name)
+        return dataset.fingerprint if dataset is not None else None
+
+    def store_entry(self, name):
+        """Shared store directory of a dataset"""
+        return shared_store.entry_path(f'market/{name}', self.store_dir)
+
+    def refresh(self, name=None):
+        """Force a filesystem check now for one dataset, or for all of them"""
+        names = [name] if name else self.names()
+        with self._lock:
+            for dataset_name in names:
+                self._refresh(dataset_name, force=True)
+
+    def _refresh(self, name, force=False):
+        dataset = self._datasets.get(name)
+        checked_at = self._checked_at.get(name)
+        if (not force and dataset is not None and checked_at is not None
+                and time.monotonic() - checked_at < self.check_interval):
+            return dataset
+
+        resolve_path = self._resolvers.get(name)
+        if resolve_path is None:
+            raise KeyError(f"Unknown market dataset '{name}'")
+
+        self._checked_at[name] = time.monotonic()
+
+        try:
+            path = resolve_path()
+            if path is None:
+                if name not in self._optional:
+                    logger.error(f"No data file found for market dataset '{name}'")
+                return dataset
+
+            stat = os.stat(path)
+            stat_key = (path, stat.st_mtime_ns, stat.st_size)
+            if dataset is not None and self._stat_keys.get(name) == stat_key:
+                return dataset
+
+            if path.endswith(SNAPSHOT_EXTENSION):
+                # Only the header is read; its content hash is the fingerprint
+                fresh = MarketDataset.from_snapshot(name, path, self._schemas.get(name))
+                fingerprint = fresh.fingerprint
+            else:
+                with open(path, 'rb') as f:
+                    content = f.read()
+                fingerprint = hashlib.sha1(content).hexdigest()
+                fresh = None
+
+            if dataset is not None and dataset.fingerprint == fingerprint:
+                self._stat_keys[name] = stat_key
+                return dataset
+
+            if fresh is None and self.store_dir:
+                fresh = MarketDataset.from_store(self.store_entry(name), fingerprint)
+            if fresh is None:
+                fresh = MarketDataset.from_bytes(name, path, content, self._schemas.get(name))
+        except Exception as e:
+            logger.error(f"Failed to load market dataset '{name}': {e}")
+            return dataset
+
+        self._datasets[name] = fresh
+        self._stat_keys[name] = stat_key
+        if dataset is not None:
+            logger.info(f"Reloaded market dataset '{name}' from {os.path.basename(fresh.path)}")
+        return fresh
+
+
+def data_version(registry=None, names=None):
+    """
+    Combined version of several datasets, changing whenever any of their contents change.
+
+    Args:
+        registry (MarketDataRegistry): Registry to read, defaults to the process-wide one
+        names (list): Dataset names, defaults to every registered dataset
+
+    Returns:
+        str: Short hash of the datasets' content fingerprints
+    """
+    registry = registry or market_data
+    names = sorted(names or registry.names())
+    digest = hashlib.sha1()
+    for name in names:
+        digest.update(f"{name}:{registry.fingerprint(name)};".encode())
+    return digest.hexdigest()[:16]
+
+
+def register_default_datasets(registry, data_dir=SCRIPT_DIR, snapshot_dir=None):
+    """
+    Register the statistics files and optional return histories in ``data_dir``.
+
+    An asset class with a binary snapshot in ``snapshot_dir`` (by default
+    scripts/snapshots, written by ``manage.py convert_market_data``) is read from
+    it; the others are parsed from their CSV.
+    """
+    snapshot_dir = snapshot_dir or os.path.join(data_dir, os.path.basename(SNAPSHOT_DIR))
+
+    def resolver(asset_class, resolve_csv):
+        return lambda: existing_file(snapshot_path(asset_class, snapshot_dir)) or resolve_csv()
+
+    for name, filename in DATASET_FILES.items():
+        registry.register(name, resolver(name, lambda path=os.path.join(data_dir, filename): path), schema=name)
+    registry.register('equity', resolver('equity', lambda: latest_equity_file(data_dir)), schema='equity')
+    registry.register('equity_returns', lambda: latest_file(data_dir, EQUITY_RETURNS_FILE_PREFIX), optional=True)
+    registry.register('crypto_returns', lambda: existing_file(os.path.join(data_dir, CRYPTO_RETURNS_FILE)),
+                      optional=True)
+
+
+# Process-wide registry read by every optimizer
+market_data = MarketDataRegistry(store_dir=shared_store.DEFAULT_STORE_DIR)
+register_default_datasets(market_data)
@@ -0,0 +1,272 @@
+import os
+import io
+import mmap
+import json
+import struct
+import hashlib
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Snapshots live in scripts/snapshots, one <asset class>.mds file each
+SNAPSHOT_DIR = os.path.join(SCRIPT_DIR, 'snapshots')
+SNAPSHOT_EXTENSION = '.mds'
+
+# File layout: MAGIC, a little-endian uint32 header length, the JSON header, then each
+# column's raw values starting at a multiple of ALIGNMENT bytes from the start of the file
+MAGIC = b'NXMDSNAP'
+_LENGTH = struct.Struct('<I')
+ALIGNMENT = 64
+
+# Bumped whenever the layout changes; files written in another version are rejected
+SNAPSHOT_FORMAT_VERSION = 1
+
+# One column of a schema: canonical name, 'str' or 'float64', and the header the
+# statistics CSV has always used for it
+SchemaColumn = namedtuple('SchemaColumn', ['name', 'kind', 'csv_header'])
+
+# Normalised columns per asset class, in file order. Every optimizer reads these names;
+# the CSV headers differ between files ('Ticker', 'Mean_Daily_Return', 'Cuurency')
+SCHEMAS = {
+    'bond': (
+        SchemaColumn('name', 'str', 'Name'),
+        SchemaColumn('symbol', 'str', 'Symbol'),
+        SchemaColumn('mean_daily_return', 'float64', 'Mean Daily Return'),
+        SchemaColumn('daily_volatility', 'float64', 'Daily Volatility'),
+    ),
+    'crypto': (
+        SchemaColumn('symbol', 'str', 'Ticker'),
+        SchemaColumn('mean_daily_return', 'float64', 'Mean_Daily_Return'),
+        SchemaColumn('daily_volatility', 'float64', 'Daily_Volatility'),
+    ),
+    'currency': (
+        SchemaColumn('symbol', 'str', 'Cuurency'),
+        SchemaColumn('mean_daily_return', 'float64', 'Mean Daily Return'),
+        SchemaColumn('daily_volatility', 'float64', 'Daily Volatility'),
+    ),
+    'equity': (
+        SchemaColumn('symbol', 'str', 'Ticker'),
+        SchemaColumn('mean_daily_return', 'float64', 'Mean Daily Return'),
+        SchemaColumn('daily_volatility', 'float64', 'Daily Volatility'),
+    ),
+}
+
+
+def snapshot_path(asset_class, snapshot_dir=SNAPSHOT_DIR):
+    """Path of an asset class's snapshot file"""
+    return os.path.join(snapshot_dir, f'{asset_class}{SNAPSHOT_EXTENSION}')
+
+
+def _schema(asset_class):
+    if asset_class not in SCHEMAS:
+        raise ValueError(f"No snapshot schema for asset class '{asset_class}', expected one of {list(SCHEMAS)}")
+    return SCHEMAS[asset_class]
+
+
+def normalize_columns(asset_class, columns):
+    """
+    Rename and type raw columns to the asset class's schema.
+
+    Args:
+        asset_class (str): 'bond', 'crypto', 'currency' or 'equity'
+        columns (dict): Column name -> values, under either the CSV headers or
+            the canonical names; columns outside the schema are dropped
+
+    Returns:
+        dict: Canonical name -> np.ndarray (str or float64), in schema order
+
+    Raises:
+        ValueError: If a schema column is missing or has values of the wrong type
+    """
+    normalized = {}
+    for column in _schema(asset_class):
+        if column.name in columns:
+            values = columns[column.name]
+        elif column.csv_header in columns:
+            values = columns[column.csv_header]
+        else:
+            raise ValueError(f"{asset_class} data has no '{column.csv_header}' column")
+
+        values = np.asarray(values)
+        if column.kind == 'str':
+            values = values.astype(str)
+        else:
+            try:
+                values = values.astype(np.float64)
+            except ValueError as e:
+                raise ValueError(f"{asset_class} column '{column.csv_header}' is not numeric: {e}")
+        normalized[column.name] = values
+    return normalized
+
+
+def read_csv_columns(asset_class, content):
+    """Normalised columns of a statistics CSV, given its bytes"""
+    frame = pd.read_csv(io.BytesIO(content))
+    return normalize_columns(asset_class, {column: frame[column].to_numpy() for column in frame.columns})
+
+
+def write_csv_columns(path, asset_class, columns):
+    """
+    Write columns as the asset class's statistics CSV, under the headers that file has always used.
+
+    The file is written beside ``path`` and renamed over it, so the market data
+    registry never reads a partial file.
+    """
+    columns = normalize_columns(asset_class, columns)
+    frame = pd.DataFrame({column.csv_header: columns[column.name] for column in _schema(asset_class)})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    staging = f"{path}.tmp-{os.getpid()}"
+    frame.to_csv(staging, index=False)
+    os.replace(staging, path)
+
+
+def content_hash(asset_class, columns):
+    """SHA-1 of the asset class, the column names and dtypes, and every value"""
+    digest = hashlib.sha1(asset_class.encode())
+    for name, values in columns.items():
+        digest.update(f";{name}:{values.dtype.str}:{len(values)};".encode())
+        digest.update(np.ascontiguousarray(values).data)
+    return digest.hexdigest()
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_snapshot(path, asset_class, columns, source=None):
+    """
+    Write one asset class's statistics as a snapshot file.
+
+    The file is written beside ``path`` and renamed over it, so readers (which
+    may still map the previous file) never see a partial snapshot.
+
+    Args:
+        path (str): Snapshot file to write
+        asset_class (str): Schema to normalise ``columns`` to
+        columns (dict): Column name -> values, see normalize_columns
+        source (dict): JSON-serialisable provenance stored in the header, e.g. the CSV path
+
+    Returns:
+        str: Content hash of the snapshot
+    """
+    columns = normalize_columns(asset_class, columns)
+    rows = len(next(iter(columns.values())))
+    if any(len(values) != rows for values in columns.values()):
+        raise ValueError(f"{asset_class} columns have different lengths")
+
+    digest = content_hash(asset_class, columns)
+    layout = [{'name': name, 'dtype': values.dtype.str, 'nbytes': values.nbytes} for name, values in columns.items()]
+    header = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'asset_class': asset_class,
+        'rows': rows,
+        'content_hash': digest,
+        'source': source or {},
+        'columns': layout,
+    }
+
+    # Offsets depend on the header's length, which depends on the offsets; grow the
+    # space reserved for the header until the encoded header fits in it
+    header_size = ALIGNMENT
+    while True:
+        offset = header_size
+        for column in layout:
+            column['offset'] = offset
+            offset = _aligned(offset + column['nbytes'])
+        encoded = json.dumps(header).encode()
+        if len(MAGIC) + _LENGTH.size + len(encoded) <= header_size:
+            break
+        header_size = _aligned(len(MAGIC) + _LENGTH.size + len(encoded))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    staging = f"{path}.tmp-{os.getpid()}"
+    with open(staging, 'wb') as f:
+        f.write(MAGIC + _LENGTH.pack(len(encoded)) + encoded)
+        for column, values in zip(layout, columns.values()):
+            f.write(b'\0' * (column['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(values).data)
+    os.replace(staging, path)
+    return digest
+
+
+def read_header(path):
+    """
+    Header of a snapshot file, without touching its columns.
+
+    Raises:
+        ValueError: If the file is not a snapshot or was written in another format version
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + _LENGTH.size)
+        if len(prefix) < len(MAGIC) + _LENGTH.size or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a market data snapshot")
+        (length,) = _LENGTH.unpack(prefix[len(MAGIC):])
+        header = json.loads(f.read(length))
+    if header.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"{path} is snapshot format {header.get('format_version')}, "
+                         f"expected {SNAPSHOT_FORMAT_VERSION}")
+    return header
+
+
+def read_snapshot(path, asset_class=None):
+    """
+    Memory-map a snapshot file.
+
+    Only the header is parsed; each column is a read-only array over the mapped
+    file, so loading costs the same for ten instruments or ten thousand and every
+    process reading the file shares its pages.
+
+    Args:
+        path (str): Snapshot file
+        asset_class (str): Expected asset class, checked against the header and schema
+
+    Returns:
+        tuple: (header dict, canonical name -> read-only np.ndarray dict)
+
+    Raises:
+        ValueError: If the file is not a valid snapshot of the expected schema
+    """
+    header = read_header(path)
+    if asset_class is not None:
+        if header['asset_class'] != asset_class:
+            raise ValueError(f"{path} holds {header['asset_class']} data, not {asset_class}")
+        expected = [column.name for column in _schema(asset_class)]
+        if [column['name'] for column in header['columns']] != expected:
+            raise ValueError(f"{path} columns do not match the {asset_class} schema")
+
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    columns = {}
+    for column in header['columns']:
+        dtype = np.dtype(column['dtype'])
+        if column['offset'] + column['nbytes'] > len(mapped):
+            raise ValueError(f"{path} is truncated")
+        columns[column['name']] = np.frombuffer(mapped, dtype=dtype, count=header['rows'], offset=column['offset'])
+    return header, columns
+
+
+def verify_snapshot(path):
+    """True if the snapshot's columns still hash to the content hash in its header"""
+    header, columns = read_snapshot(path)
+    return content_hash(header['asset_class'], columns) == header['content_hash']
+
+
+def convert_csv(csv_path, asset_class, path=None):
+    """
+    Convert a statistics CSV to a snapshot.
+
+    Args:
+        csv_path (str): CSV in the format the asset class's file has always used
+        asset_class (str): 'bond', 'crypto', 'currency' or 'equity'
+        path (str): Snapshot to write, defaults to snapshot_path(asset_class)
+
+    Returns:
+        tuple: (snapshot path, content hash)
+    """
+    with open(csv_path, 'rb') as f:
+        content = f.read()
+    path = path or snapshot_path(asset_class)
+    source = {'path': os.path.basename(csv_path), 'sha1': hashlib.sha1(content).hexdigest()}
+    return path, write_snapshot(path, asset_class, read_csv_columns(asset_class, content), source)
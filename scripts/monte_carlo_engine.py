@@ -0,0 +1,626 @@
+import time
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seed behind the optimizers' reproducible results when no generator is passed
+DEFAULT_SEED = 42
+
+# Daily risk-free return shared by every optimizer
+RISK_FREE_RATE = 0.0001
+
+# One-sided z-score for Value at Risk at 95% confidence
+VAR_Z_SCORE = 1.645
+
+# Draws processed per chunk by the streaming selector; bounds peak memory
+DEFAULT_CHUNK_SIZE = 2000
+
+# Adaptive sampling: draws per chunk, hard cap, and the relative Sharpe improvement
+# that must be beaten within `patience` consecutive chunks to keep sampling
+ADAPTIVE_CHUNK_SIZE = 500
+ADAPTIVE_MAX_SIMULATIONS = 50000
+ADAPTIVE_TOLERANCE = 1e-3
+ADAPTIVE_PATIENCE = 3
+
+# Weight samplers: pseudo-random uniform draws or scrambled Sobol' points
+SAMPLERS = ('random', 'sobol')
+
+# Ways an optimizer can pick its best portfolio; 'cardinality' also fixes the
+# number of holdings where an optimizer has a target count (equity)
+OPTIMIZER_MODES = ('monte_carlo', 'exact', 'cardinality')
+
+# Draws per independent random stream when one simulation is split across processes;
+# fixed so the result depends on the seed but not on how many workers run the streams
+PARALLEL_STREAM_SIZE = 5000
+
+# Upper bound on pruning stages, matching the old iterative loop's safety break
+MAX_PRUNING_STAGES = 8
+
+# Share of the best draws whose mean weights rank assets at each pruning stage
+PRUNING_ELITE_FRACTION = 0.05
+
+
+def make_random_state(seed=42):
+    """
+    Build the random source used for weight draws.
+
+    A legacy RandomState seeded with ``seed`` produces exactly the same
+    sequence as the old ``np.random.seed(seed)`` + ``np.random.random`` loop,
+    without touching NumPy's global random state.
+    """
+    if isinstance(seed, (np.random.RandomState, np.random.Generator)):
+        return seed
+    return np.random.RandomState(seed)
+
+
+def call_seed(rng=None):
+    """
+    Seed for one optimizer call.
+
+    A caller-supplied ``numpy.random.Generator`` is used as is, so its draws depend
+    only on its own state; otherwise every call starts from DEFAULT_SEED and
+    returns the same portfolio as before. Nothing global is read or written.
+    """
+    return DEFAULT_SEED if rng is None else rng
+
+
+def _seed_entropy(seed):
+    """Integer seed derived from a seed, RandomState or Generator"""
+    if isinstance(seed, np.random.Generator):
+        return int(seed.integers(2 ** 32))
+    if isinstance(seed, np.random.RandomState):
+        return int(seed.randint(2 ** 31))
+    return seed
+
+
+def draw_weights(random_state, num_draws, num_assets):
+    """
+    Draw a matrix of random long-only portfolio weights.
+
+    Args:
+        random_state: RandomState or Generator to draw from
+        num_draws (int): Number of portfolios (rows)
+        num_assets (int): Number of assets (columns)
+
+    Returns:
+        np.ndarray: (num_draws, num_assets) matrix whose rows sum to 1
+    """
+    weights = random_state.random((num_draws, num_assets))
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights
+
+
+def make_weight_sampler(sampler, seed, num_assets):
+    """
+    Build a function returning ``size`` normalised weight vectors per call.
+
+    'random' draws from make_random_state(seed) exactly like draw_weights. 'sobol'
+    takes consecutive points of one scrambled Sobol' sequence, which covers the
+    weight space more evenly and usually converges in fewer draws.
+
+    Args:
+        sampler (str): 'random' or 'sobol'
+        seed: Seed, RandomState or Generator for the draws
+        num_assets (int): Number of assets (columns)
+
+    Returns:
+        callable: draw(size) -> (size, num_assets) weight matrix whose rows sum to 1
+    """
+    if sampler == 'random':
+        random_state = make_random_state(seed)
+        return lambda size: draw_weights(random_state, size, num_assets)
+    if sampler != 'sobol':
+        raise ValueError(f"Unknown sampler '{sampler}', expected one of {SAMPLERS}")
+
+    from scipy.stats import qmc
+    engine = qmc.Sobol(d=num_assets, scramble=True, seed=_seed_entropy(seed))
+
+    def draw(size):
+        with warnings.catch_warnings():
+            # Chunk sizes need not be powers of two; the sequence stays low-discrepancy
+            warnings.simplefilter('ignore', UserWarning)
+            weights = engine.random(size)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return weights
+
+    return draw
+
+
+def portfolio_statistics(weights, returns, volatilities, risk_free_rate=RISK_FREE_RATE, covariance=None):
+    """
+    Compute return, volatility, Sharpe ratio and VaR for a batch of portfolios.
+
+    Without a covariance model assets are uncorrelated, so portfolio variance is
+    ``(w ** 2) @ (vol ** 2)``; a factor model costs O(n * k) per portfolio. Neither
+    materialises the n x n matrix.
+
+    Args:
+        weights (np.ndarray): (num_draws, num_assets) weight matrix
+        returns (np.ndarray): Mean daily return per asset
+        volatilities (np.ndarray): Daily volatility per asset
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+
+    Returns:
+        dict: Arrays keyed by 'returns', 'volatilities', 'sharpe_ratios', 'vars'
+    """
+    port_returns = weights @ returns
+    if covariance is None:
+        port_volatilities = np.sqrt((weights ** 2) @ (volatilities ** 2))
+    else:
+        port_volatilities = np.sqrt(covariance.portfolio_variance(weights))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe_ratios = np.where(
+            port_volatilities > 0,
+            (port_returns - risk_free_rate) / port_volatilities,
+            0.0
+        )
+
+    port_vars = -(port_returns - VAR_Z_SCORE * port_volatilities)
+
+    return {
+        'returns': port_returns,
+        'volatilities': port_volatilities,
+        'sharpe_ratios': sharpe_ratios,
+        'vars': port_vars
+    }
+
+
+def simulate_portfolios(returns, volatilities, num_simulations, seed=42, risk_free_rate=RISK_FREE_RATE,
+                        covariance=None):
+    """
+    Run a batched Monte Carlo simulation over random long-only portfolios.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        num_simulations (int): Number of random portfolios to draw
+        seed: Seed, RandomState or Generator for the weight draws
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+
+    Returns:
+        dict: 'weights' matrix plus the per-draw statistics from portfolio_statistics
+    """
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+
+    random_state = make_random_state(seed)
+    weights = draw_weights(random_state, num_simulations, len(returns))
+
+    results = portfolio_statistics(weights, returns, volatilities, risk_free_rate, covariance)
+    results['weights'] = weights
+    return results
+
+
+def simulation_frame(results, labels, include_var=True):
+    """
+    Build the sorted results DataFrame the optimizers have always returned.
+
+    Args:
+        results (dict): Output of simulate_portfolios
+        labels (array-like): Column name for each asset's weight
+        include_var (bool): Add the 'VaR (95%)' column and use it as tie-breaker
+
+    Returns:
+        pd.DataFrame: One row per draw, best Sharpe ratio first
+    """
+    columns = {
+        "Return": results['returns'],
+        "Volatility": results['volatilities'],
+        "Sharpe Ratio": results['sharpe_ratios']
+    }
+    if include_var:
+        columns["VaR (95%)"] = results['vars']
+
+    stats_df = pd.DataFrame(columns)
+    weights_df = pd.DataFrame(results['weights'], columns=list(labels))
+    results_df = pd.concat([stats_df, weights_df], axis=1)
+
+    if include_var:
+        return results_df.sort_values(by=["Sharpe Ratio", "VaR (95%)"], ascending=[False, True])
+    return results_df.sort_values(by="Sharpe Ratio", ascending=False)
+
+
+def _rank_candidates(sharpe_ratios, port_vars, draw_ids, top_k):
+    """Indices of the best ``top_k`` rows: Sharpe descending, VaR ascending, earliest draw first."""
+    count = len(sharpe_ratios)
+    if count > top_k:
+        threshold = np.partition(sharpe_ratios, count - top_k)[count - top_k]
+        candidates = np.flatnonzero(sharpe_ratios >= threshold)
+    else:
+        candidates = np.arange(count)
+
+    order = np.lexsort((
+        draw_ids[candidates],
+        port_vars[candidates],
+        -sharpe_ratios[candidates]
+    ))
+    return candidates[order][:top_k]
+
+
+def select_top_portfolios(returns, volatilities, num_simulations, top_k=1,
+                          chunk_size=DEFAULT_CHUNK_SIZE, seed=42,
+                          risk_free_rate=RISK_FREE_RATE, covariance=None,
+                          sampler='random', tolerance=None, patience=ADAPTIVE_PATIENCE, deadline=None):
+    """
+    Stream Monte Carlo draws in fixed-size chunks and keep only the best portfolios.
+
+    Only ``top_k`` candidates survive between chunks, so peak memory depends on
+    ``chunk_size`` rather than ``num_simulations`` and no results DataFrame or
+    full sort is ever built. Draws come from the same random sequence as
+    simulate_portfolios, so the best portfolio matches the sorted frame.
+
+    With a ``tolerance`` the run stops early once the best Sharpe ratio has not
+    improved by more than ``tolerance`` (relative) for ``patience`` consecutive
+    chunks; ``num_simulations`` is then only a hard cap. With a ``deadline`` no new
+    chunk is started once it has passed (the first chunk always runs), so the best
+    portfolio found so far is returned on time.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        num_simulations (int): Total number of random portfolios to draw, or the cap when adaptive
+        top_k (int): Number of best portfolios to keep
+        chunk_size (int): Draws evaluated per chunk
+        seed: Seed, RandomState or Generator for the weight draws
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+        sampler (str): 'random' or 'sobol'
+        tolerance (float): Relative Sharpe improvement that counts as progress, None for a fixed count
+        patience (int): Chunks without progress before stopping
+        deadline (float): time.monotonic() value after which sampling stops, None for no limit
+
+    Returns:
+        dict: 'weights', 'returns', 'volatilities', 'sharpe_ratios', 'vars' for
+              at most ``top_k`` portfolios, best first (Sharpe desc, VaR asc),
+              plus 'simulations_used' and 'quality', the share of the planned
+              sampling completed (1.0 unless the deadline cut it short)
+    """
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+    num_assets = len(returns)
+
+    draw = make_weight_sampler(sampler, seed, num_assets)
+
+    best = {
+        'weights': np.empty((0, num_assets)),
+        'returns': np.empty(0),
+        'volatilities': np.empty(0),
+        'sharpe_ratios': np.empty(0),
+        'vars': np.empty(0),
+        'draws': np.empty(0, dtype=np.int64)
+    }
+
+    drawn = 0
+    best_sharpe = None
+    stalled = 0
+    finished = True
+    while drawn < num_simulations:
+        if deadline is not None and drawn > 0 and time.monotonic() >= deadline:
+            finished = False
+            break
+
+        size = min(chunk_size, num_simulations - drawn)
+        weights = draw(size)
+        chunk = portfolio_statistics(weights, returns, volatilities, risk_free_rate, covariance)
+        chunk['weights'] = weights
+        chunk['draws'] = np.arange(drawn, drawn + size)
+
+        merged = {key: np.concatenate((best[key], chunk[key])) for key in best}
+        keep = _rank_candidates(merged['sharpe_ratios'], merged['vars'], merged['draws'], top_k)
+        best = {key: values[keep] for key, values in merged.items()}
+
+        drawn += size
+
+        if tolerance is not None:
+            chunk_best = best['sharpe_ratios'][0]
+            if best_sharpe is not None and chunk_best - best_sharpe <= tolerance * max(abs(best_sharpe), 1e-12):
+                stalled += 1
+                if stalled >= patience:
+                    break
+            else:
+                stalled = 0
+            best_sharpe = chunk_best if best_sharpe is None else max(best_sharpe, chunk_best)
+
+    best.pop('draws')
+    best['simulations_used'] = drawn
+    best['quality'] = 1.0 if finished else drawn / num_simulations
+    return best
+
+
+def best_portfolio(selection, rank=0):
+    """
+    Return one selected portfolio in the row layout of the results DataFrame.
+
+    Args:
+        selection (dict): Output of select_top_portfolios
+        rank (int): Position in the selection, 0 being the best
+
+    Returns:
+        dict: 'Return', 'Volatility', 'Sharpe Ratio', 'VaR (95%)', 'weights',
+              'simulations_used' and 'quality', or None if nothing was selected
+    """
+    if len(selection['sharpe_ratios']) <= rank:
+        return None
+
+    return {
+        'Return': selection['returns'][rank],
+        'Volatility': selection['volatilities'][rank],
+        'Sharpe Ratio': selection['sharpe_ratios'][rank],
+        'VaR (95%)': selection['vars'][rank],
+        'weights': selection['weights'][rank],
+        'simulations_used': selection.get('simulations_used', 0),
+        'quality': selection.get('quality', 1.0)
+    }
+
+
+def validate_mode(mode):
+    """Raise ValueError for an unknown optimizer mode and return it unchanged otherwise"""
+    if mode not in OPTIMIZER_MODES:
+        raise ValueError(f"Unknown optimizer mode '{mode}', expected one of {OPTIMIZER_MODES}")
+    return mode
+
+
+def validate_sampler(sampler):
+    """Raise ValueError for an unknown weight sampler and return it unchanged otherwise"""
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Unknown sampler '{sampler}', expected one of {SAMPLERS}")
+    return sampler
+
+
+_simulation_pool = None
+_simulation_pool_workers = 0
+_simulation_pool_lock = threading.Lock()
+
+
+def get_simulation_pool(workers):
+    """
+    Shared process pool that runs simulation streams, grown on demand to ``workers``.
+
+    Returns:
+        ProcessPoolExecutor: Pool with at least ``workers`` processes
+    """
+    global _simulation_pool, _simulation_pool_workers
+    with _simulation_pool_lock:
+        if _simulation_pool is None or _simulation_pool_workers < workers:
+            if _simulation_pool is not None:
+                _simulation_pool.shutdown(wait=False)
+            _simulation_pool = ProcessPoolExecutor(max_workers=workers)
+            _simulation_pool_workers = workers
+        return _simulation_pool
+
+
+def _select_stream(returns, volatilities, num_simulations, top_k, seed_sequence, risk_free_rate,
+                   covariance, sampler, deadline):
+    """Best ``top_k`` portfolios of one independent stream; runs in a worker process"""
+    chunk_size = ADAPTIVE_CHUNK_SIZE if deadline is not None else DEFAULT_CHUNK_SIZE
+    return select_top_portfolios(returns, volatilities, num_simulations, top_k=top_k, chunk_size=chunk_size,
+                                 seed=np.random.default_rng(seed_sequence), risk_free_rate=risk_free_rate,
+                                 covariance=covariance, sampler=sampler, deadline=deadline)
+
+
+def parallel_select_top_portfolios(returns, volatilities, num_simulations, top_k=1, seed=42, workers=2,
+                                   stream_size=PARALLEL_STREAM_SIZE, risk_free_rate=RISK_FREE_RATE,
+                                   covariance=None, sampler='random', deadline=None):
+    """
+    Split one simulation into independent streams and select across all of them.
+
+    The draws are cut into streams of ``stream_size``, each with its own
+    generator spawned from ``seed`` by numpy.random.SeedSequence. Streams run on
+    a shared process pool and return only their ``top_k`` portfolios, which are
+    merged here, so a weight matrix never leaves its worker. The streams do not
+    depend on ``workers``: the same seed gives the same portfolio on any pool
+    size, including ``workers=1``, which runs them in this process. The
+    portfolios differ from the single-stream select_top_portfolios.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        num_simulations (int): Total number of random portfolios to draw
+        top_k (int): Number of best portfolios to keep
+        seed: Seed, RandomState or Generator the stream seeds are spawned from
+        workers (int): Processes to run the streams on
+        stream_size (int): Draws per stream
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+        sampler (str): 'random' or 'sobol'; each stream gets its own scrambled Sobol' sequence
+        deadline (float): time.monotonic() value after which every stream stops sampling
+
+    Returns:
+        dict: Same layout as select_top_portfolios
+    """
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+
+    num_streams = max(1, -(-num_simulations // stream_size))
+    seed_sequences = np.random.SeedSequence(_seed_entropy(seed)).spawn(num_streams)
+    sizes = [min(stream_size, num_simulations - index * stream_size) for index in range(num_streams)]
+    stream_args = [
+        (returns, volatilities, size, top_k, seed_sequence, risk_free_rate, covariance, sampler, deadline)
+        for size, seed_sequence in zip(sizes, seed_sequences)
+    ]
+
+    if workers > 1 and num_streams > 1:
+        pool = get_simulation_pool(workers)
+        streams = [future.result() for future in [pool.submit(_select_stream, *args) for args in stream_args]]
+    else:
+        streams = [_select_stream(*args) for args in stream_args]
+
+    # Merge in stream order, so ties go to the earlier stream as they would to the earlier draw
+    keys = ('weights', 'returns', 'volatilities', 'sharpe_ratios', 'vars')
+    merged = {key: np.concatenate([stream[key] for stream in streams]) for key in keys}
+    keep = _rank_candidates(merged['sharpe_ratios'], merged['vars'],
+                            np.arange(len(merged['sharpe_ratios'])), top_k)
+    best = {key: values[keep] for key, values in merged.items()}
+
+    drawn = sum(stream['simulations_used'] for stream in streams)
+    best['simulations_used'] = drawn
+    best['quality'] = 1.0 if all(stream['quality'] >= 1.0 for stream in streams) else drawn / num_simulations
+    return best
+
+
+def find_best_portfolio(returns, volatilities, num_simulations, mode='monte_carlo', seed=42,
+                        risk_free_rate=RISK_FREE_RATE, covariance=None, adaptive=False, sampler='random',
+                        deadline=None, workers=None):
+    """
+    Pick the best portfolio with the requested optimizer mode.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        num_simulations (int): Draws to evaluate in 'monte_carlo' mode
+        mode (str): 'monte_carlo' for random search, 'exact' for the analytic max-Sharpe portfolio;
+            'cardinality' solves like 'exact' when no holding count applies
+        seed: Seed, RandomState or Generator for the weight draws
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+        adaptive (bool): Sample in small chunks until the best Sharpe ratio converges,
+            up to ADAPTIVE_MAX_SIMULATIONS draws, instead of exactly ``num_simulations``
+        sampler (str): 'random' or 'sobol' weight draws
+        deadline (float): time.monotonic() value by which 'monte_carlo' sampling stops;
+            the analytic modes take milliseconds and ignore it
+        workers (int): Split 'monte_carlo' sampling into independent streams run on this many
+            processes (see parallel_select_top_portfolios); None keeps the single stream.
+            Adaptive sampling is sequential and always uses a single stream
+
+    Returns:
+        dict: Best portfolio as returned by best_portfolio, or None if nothing was selected
+    """
+    validate_mode(mode)
+
+    if mode in ('exact', 'cardinality'):
+        from exact_optimizer import exact_portfolio
+        return exact_portfolio(returns, volatilities, risk_free_rate, covariance)
+
+    if adaptive:
+        selection = select_top_portfolios(returns, volatilities, ADAPTIVE_MAX_SIMULATIONS, top_k=1,
+                                          chunk_size=ADAPTIVE_CHUNK_SIZE, seed=seed,
+                                          risk_free_rate=risk_free_rate, covariance=covariance,
+                                          sampler=sampler, tolerance=ADAPTIVE_TOLERANCE,
+                                          patience=ADAPTIVE_PATIENCE, deadline=deadline)
+    elif workers:
+        selection = parallel_select_top_portfolios(returns, volatilities, num_simulations, top_k=1, seed=seed,
+                                                   workers=workers, risk_free_rate=risk_free_rate,
+                                                   covariance=covariance, sampler=sampler, deadline=deadline)
+    else:
+        # Smaller chunks under a deadline stop closer to it; the draws are the same either way
+        chunk_size = ADAPTIVE_CHUNK_SIZE if deadline is not None else DEFAULT_CHUNK_SIZE
+        selection = select_top_portfolios(returns, volatilities, num_simulations, top_k=1,
+                                          chunk_size=chunk_size, seed=seed, risk_free_rate=risk_free_rate,
+                                          covariance=covariance, sampler=sampler, deadline=deadline)
+    return best_portfolio(selection)
+
+
+def pruning_targets(num_assets, target_count, max_stages=MAX_PRUNING_STAGES):
+    """
+    Asset counts kept after each pruning stage.
+
+    Halves large universes, then steps to twice the target and finally the target.
+
+    Args:
+        num_assets (int): Size of the starting universe
+        target_count (int): Number of assets to end with
+        max_stages (int): Most stages to run
+
+    Returns:
+        list: Asset count after each stage
+    """
+    targets = []
+    remaining = num_assets
+    while remaining > target_count and len(targets) < max_stages:
+        if remaining > target_count * 3:
+            remaining = max(target_count * 2, remaining // 2)
+        elif remaining > target_count * 2:
+            remaining = target_count * 2
+        else:
+            remaining = target_count
+        targets.append(remaining)
+    return targets
+
+
+def _top_weighted(weights, keep):
+    """Positions of the ``keep`` largest weights, ties resolved in original order"""
+    return np.sort(np.argsort(-weights, kind='stable')[:keep])
+
+
+def prune_assets(returns, volatilities, target_count, num_simulations=2000, mode='monte_carlo',
+                 seed=42, elite_fraction=PRUNING_ELITE_FRACTION, risk_free_rate=RISK_FREE_RATE,
+                 covariance=None):
+    """
+    Narrow a universe down to ``target_count`` assets for a final optimization.
+
+    In 'monte_carlo' mode one matrix of raw draws is generated up front and every
+    stage reuses it by restricting it to the surviving assets and renormalising
+    each draw; a renormalised subset of a uniform draw has the same distribution
+    as a fresh draw over that subset, so no stage needs new random numbers.
+    Each stage keeps the assets with the largest mean weight across its best
+    ``elite_fraction`` of draws, which is far less noisy than the weights of the
+    single best draw. In 'exact' mode the universe is ranked once by stand-alone
+    Sharpe ratio, as in exact_optimizer.cardinality_weights, and the survivors
+    are then solved exactly.
+
+    Args:
+        returns (array-like): Mean daily return per asset
+        volatilities (array-like): Daily volatility per asset
+        target_count (int): Number of assets to keep
+        num_simulations (int): Draws shared by every 'monte_carlo' stage
+        mode (str): 'monte_carlo', or 'exact'/'cardinality' for the one-pass ranking
+        seed: Seed, RandomState or Generator for the weight draws
+        elite_fraction (float): Share of the best draws averaged to rank assets
+        risk_free_rate (float): Daily risk-free return
+        covariance (FactorCovariance): Correlated covariance model, None for diagonal
+
+    Returns:
+        tuple: (sorted indices of the kept assets, simulations drawn)
+    """
+    validate_mode(mode)
+    returns = np.asarray(returns, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+    num_assets = len(returns)
+
+    active = np.arange(num_assets)
+    targets = pruning_targets(num_assets, target_count)
+    if not targets:
+        return active, 0
+
+    if mode != 'monte_carlo':
+        # Ranked by stand-alone Sharpe ratio, the best support of a diagonal tangency
+        # portfolio; ranking by max-Sharpe weight would favour low-volatility assets
+        from exact_optimizer import top_sharpe_assets
+        return np.sort(top_sharpe_assets(returns, volatilities, targets[-1], risk_free_rate)), 0
+
+    # Drawn asset-major so each stage gathers contiguous rows of the surviving assets
+    draws = make_random_state(seed).random((num_assets, num_simulations))
+    draw_ids = np.arange(num_simulations)
+    elite_count = max(1, int(num_simulations * elite_fraction))
+
+    for keep in targets:
+        # Statistics of the renormalised draws, computed from the raw ones:
+        # w = u / sum(u), so mean = (mu . u) / sum(u) and variance = (sigma^2 . u^2) / sum(u)^2
+        raw = draws[active]
+        totals = raw.sum(axis=0)
+        port_returns = (returns[active] @ raw) / totals
+        if covariance is None:
+            port_volatilities = np.sqrt((volatilities[active] ** 2) @ (raw ** 2)) / totals
+        else:
+            port_volatilities = np.sqrt(covariance.subset(active).portfolio_variance(raw.T)) / totals
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe_ratios = np.where(
+                port_volatilities > 0,
+                (port_returns - risk_free_rate) / port_volatilities,
+                0.0
+            )
+        port_vars = -(port_returns - VAR_Z_SCORE * port_volatilities)
+
+        elite = _rank_candidates(sharpe_ratios, port_vars, draw_ids, elite_count)
+        elite_weights = (raw[:, elite] / totals[elite]).mean(axis=1)
+        active = active[_top_weighted(elite_weights, keep)]
+
+    return active, num_simulations
@@ -1,9 +1,9 @@
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from joblib import load
-from scipy.special import softmax
+import shared_store
+from compiled_model import CompiledAllocationModel, compile_model
 import os
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,47 +11,149 @@ logger = logging.getLogger(__name__)
 # Get the absolute path to the script directory
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Load model and scaler with absolute paths
+# Model and scaler files, with absolute paths
 model_path = os.path.join(SCRIPT_DIR, "trained_allocation_model.joblib")
 scaler_path = os.path.join(SCRIPT_DIR, "scaler.joblib")
 
-model = load(model_path)
-scaler = load(scaler_path)
+def _file_version(*paths):
+    """Short content hash identifying the model files results were computed with"""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# Stored allocations computed with a different model are recomputed
+MODEL_VERSION = _file_version(model_path, scaler_path)
+
+def _load_sklearn_model():
+    """Unpickle the sklearn model and scaler, importing sklearn"""
+    global model, scaler
+    from joblib import load
+    model = load(model_path)
+    scaler = load(scaler_path)
+    return model, scaler
+
+def __getattr__(name):
+    # model and scaler are only unpickled when first used if the shared store supplied the model
+    if name in ('model', 'scaler'):
+        return _load_sklearn_model()[name == 'scaler']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Asset classes
 asset_classes = ['equity', 'debt', 'gold', 'real_estate', 'crypto', 'cash']
 
+# Model input features, in the column order the scaler was fitted on
+FEATURES = [
+    'age', 'income', 'capital', 'expenses', 'emi', 'liquidity_need', 'dependents',
+    'confidence', 'knowledge', 'comfort_with_negatives', 'market_awareness', 'experience'
+]
+
+# The same model as flat NumPy arrays; None falls back to sklearn. A model exported with
+# `manage.py build_shared_store` is memory-mapped, so every process on the host shares one
+# copy and sklearn is never imported; otherwise it is compiled and checked against sklearn
+compiled_model = CompiledAllocationModel.from_store(shared_store.entry_path('model'), MODEL_VERSION)
+if compiled_model is None:
+    compiled_model = compile_model(*_load_sklearn_model())
+
 # Import top instruments module (will be imported when needed)
 top_instruments_module = None
 
-def predict_allocation(input_data, include_instruments=True):
+def determine_risk_profile(input_data):
     """
-    Predict asset allocation based on input data.
+    Determine the risk profile from the user's risk tolerance parameters.
     
     Args:
-        input_data (dict): Dictionary containing user financial and risk profile data
-            with keys: age, income, capital, expenses, emi, liquidity_need, dependents,
-            confidence, knowledge, comfort_with_negatives, market_awareness, experience
-        include_instruments (bool): Whether to include recommended instruments in the response
+        input_data (dict): Profile data with comfort_with_negatives, confidence and experience
     
     Returns:
-        dict: Dictionary with allocation percentages and recommended instruments
+        str: 'low', 'medium' or 'high'
     """
-    # Convert to DataFrame and scale
-    X_input = pd.DataFrame([input_data])
-    X_scaled = scaler.transform(X_input)
+    # Use comfort_with_negatives, confidence, and experience to determine risk profile
+    comfort = input_data.get("comfort_with_negatives", 0)
+    confidence = input_data.get("confidence", 0)
+    experience = input_data.get("experience", 0)
     
-    # Predict
-    preds = model.predict(X_scaled)
+    risk_score = (comfort * 0.4 + confidence * 0.3 + experience * 0.3)
     
-    # Clip to ensure no negatives and re-normalize
-    predicted_weights = np.clip(preds, 0, None)
-    normalized_weights = predicted_weights / predicted_weights.sum()
-    normalized_weights = normalized_weights[0]  # Get first row
+    if risk_score < 0.3:
+        return "low"
+    elif risk_score > 0.6:
+        return "high"
+    return "medium"
+
+def determine_risk_profiles(X_input):
+    """
+    Vectorized determine_risk_profile for a DataFrame of profiles.
+    
+    Args:
+        X_input (pd.DataFrame): Profiles with comfort_with_negatives, confidence and experience
+    
+    Returns:
+        np.ndarray: 'low', 'medium' or 'high' per row
+    """
+    def column(name):
+        if name not in X_input:
+            return np.zeros(len(X_input))
+        return X_input[name].fillna(0).to_numpy(dtype=float)
+    
+    risk_score = column("comfort_with_negatives") * 0.4 + column("confidence") * 0.3 + column("experience") * 0.3
+    return np.select([risk_score < 0.3, risk_score > 0.6], ["low", "high"], default="medium")
+
+def predict_allocation_frame(X_input):
+    """
+    Score a DataFrame of profiles without building per-profile dictionaries.
+    
+    Args:
+        X_input (pd.DataFrame): One row per profile with the FEATURES columns
+    
+    Returns:
+        pd.DataFrame: Allocation percentage per asset class and risk_profile, same index as the input
+    """
+    percentages = np.round(predict_weights(X_input) * 100, 2)
+    scores = pd.DataFrame(percentages, columns=asset_classes, index=X_input.index)
+    scores["risk_profile"] = determine_risk_profiles(X_input)
+    return scores
+
+def feature_matrix(input_rows):
+    """
+    Build the (n_profiles, n_features) model input straight from profile dictionaries.
+    
+    Missing or None features become NaN, which the model rejects, as with a DataFrame.
+    """
+    return np.array([[row.get(feature, np.nan) for feature in FEATURES] for row in input_rows], dtype=float)
+
+def predict_weights(X_input):
+    """
+    Predict normalized allocation weights for a matrix of profiles.
     
+    Args:
+        X_input (pd.DataFrame or np.ndarray): One row per profile with the FEATURES
+            columns, or a matrix from feature_matrix
+    
+    Returns:
+        np.ndarray: (n_profiles, n_asset_classes) weights, each row summing to 1
+    """
+    if isinstance(X_input, pd.DataFrame):
+        X_input = X_input[FEATURES]
+    
+    if compiled_model is not None:
+        preds = compiled_model.predict(X_input)
+    else:
+        X_scaled = scaler.transform(X_input)
+        
+        # Predict
+        preds = np.atleast_2d(model.predict(X_scaled))
+    
+    # Clip to ensure no negatives and re-normalize each profile
+    predicted_weights = np.clip(preds, 0, None)
+    return predicted_weights / predicted_weights.sum(axis=1, keepdims=True)
+
+def _allocation_response(input_data, weights, include_instruments):
+    """Build the response dictionary for one profile from its normalized weights"""
     # Create result dictionary for allocation percentages
     allocation = {}
-    for asset, weight in zip(asset_classes, normalized_weights):
+    for asset, weight in zip(asset_classes, weights):
         percentage = round(float(weight) * 100, 2)
         allocation[asset] = percentage
     
@@ -70,19 +172,7 @@ def predict_allocation(input_data, include_instruments=True):
                 top_instruments_module = top_instruments
             
             # Determine risk profile based on user's risk tolerance parameters
-            risk_profile = "medium"  # Default
-            
-            # Use comfort_with_negatives, confidence, and experience to determine risk profile
-            comfort = input_data.get("comfort_with_negatives", 0)
-            confidence = input_data.get("confidence", 0)
-            experience = input_data.get("experience", 0)
-            
-            risk_score = (comfort * 0.4 + confidence * 0.3 + experience * 0.3)
-            
-            if risk_score < 0.3:
-                risk_profile = "low"
-            elif risk_score > 0.6:
-                risk_profile = "high"
+            risk_profile = determine_risk_profile(input_data)
             
             # Get recommended instruments based on allocation and risk profile
             instruments = top_instruments_module.get_recommended_instruments(allocation, risk_profile)
@@ -93,6 +183,43 @@ def predict_allocation(input_data, include_instruments=True):
     
     return response
 
+def predict_allocation(input_data, include_instruments=True):
+    """
+    Predict asset allocation based on input data.
+    
+    Args:
+        input_data (dict): Dictionary containing user financial and risk profile data
+            with keys: age, income, capital, expenses, emi, liquidity_need, dependents,
+            confidence, knowledge, comfort_with_negatives, market_awareness, experience
+        include_instruments (bool): Whether to include recommended instruments in the response
+    
+    Returns:
+        dict: Dictionary with allocation percentages and recommended instruments
+    """
+    return predict_allocations([input_data], include_instruments)[0]
+
+def predict_allocations(input_rows, include_instruments=True):
+    """
+    Predict asset allocations for many profiles with one scaler and model call.
+    
+    Args:
+        input_rows (list): Profile dictionaries, each with the keys predict_allocation expects
+        include_instruments (bool): Whether to include recommended instruments in each response
+    
+    Returns:
+        list: One response dictionary per profile, in input order
+    """
+    if not input_rows:
+        return []
+    
+    # Scale and predict the whole matrix at once
+    normalized_weights = predict_weights(feature_matrix(input_rows))
+    
+    return [
+        _allocation_response(input_data, weights, include_instruments)
+        for input_data, weights in zip(input_rows, normalized_weights)
+    ]
+
 # Example usage (only runs when script is executed directly)
 if __name__ == "__main__":
     # Sample input for testing
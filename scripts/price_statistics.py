@@ -0,0 +1,272 @@
+import os
+import numpy as np
+import pandas as pd
+import shared_store
+from market_snapshot import SNAPSHOT_DIR
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Raw price files are read from scripts/prices/<asset class>/*.csv by default
+PRICE_DIR = os.path.join(SCRIPT_DIR, 'prices')
+
+# Running per-instrument statistics live in scripts/snapshots/price_state/<asset class>
+STATE_DIR = os.path.join(SNAPSHOT_DIR, 'price_state')
+
+# Price rows parsed per chunk
+DEFAULT_CHUNK_SIZE = 200000
+
+# Daily returns an instrument needs before its volatility is reported
+MIN_OBSERVATIONS = 2
+
+# Accepted headers, first match wins. A file with a symbol column is read as one
+# row per (date, instrument); otherwise every column but the date is an instrument
+DATE_COLUMNS = ('Date', 'date', 'Datetime', 'timestamp')
+SYMBOL_COLUMNS = ('Symbol', 'Ticker', 'symbol', 'ticker', 'Currency', 'Cuurency')
+PRICE_COLUMNS = ('Adj Close', 'Adj_Close', 'Close', 'Price', 'adj_close', 'close', 'price')
+NAME_COLUMNS = ('Name', 'name')
+
+
+def _first_present(candidates, columns):
+    return next((column for column in candidates if column in columns), None)
+
+
+def _date_keys(values):
+    """Integer YYYYMMDD keys of a column of dates"""
+    dates = pd.to_datetime(pd.Series(values), errors='coerce')
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).to_numpy(dtype=float, na_value=np.nan)
+
+
+class PriceStatistics:
+    """
+    Running mean and volatility of daily returns for one asset class, built from raw prices.
+
+    For every instrument the state holds the return count, mean and sum of
+    squared deviations (merged chunk by chunk with Chan's parallel update, so
+    the result equals a single pass over the whole history), plus the last
+    date and price seen. Updates skip rows at or before an instrument's last
+    date, so feeding the same files again, or a file that gained a few days,
+    only processes the new days. Returns are simple close-to-close returns
+    between consecutive rows of an instrument, and volatility is the sample
+    standard deviation, as in the statistics files the optimizers read.
+    """
+
+    def __init__(self, asset_class, directory=None):
+        self.asset_class = asset_class
+        self.directory = directory or os.path.join(STATE_DIR, asset_class)
+        self.files = {}
+        self._load()
+
+    def _load(self):
+        entry = shared_store.open_arrays(self.directory)
+        if entry is None:
+            self.reset()
+            return
+        arrays, metadata = entry
+        # Copies, since updates write in place
+        self.symbols = np.array(arrays['symbols'])
+        self.names = np.array(arrays['names'])
+        self.counts = np.array(arrays['counts'])
+        self.means = np.array(arrays['means'])
+        self.squares = np.array(arrays['squares'])
+        self.last_dates = np.array(arrays['last_dates'])
+        self.last_prices = np.array(arrays['last_prices'])
+        self.files = metadata.get('files', {})
+
+    def reset(self):
+        """Forget every instrument and processed file"""
+        self.symbols = np.zeros(0, dtype='U1')
+        self.names = np.zeros(0, dtype='U1')
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.means = np.zeros(0)
+        self.squares = np.zeros(0)
+        self.last_dates = np.zeros(0, dtype=np.int64)
+        self.last_prices = np.zeros(0)
+        self.files = {}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def save(self):
+        """Write the state atomically; readers see either the previous or the new state"""
+        shared_store.write_arrays(self.directory, {
+            'symbols': self.symbols,
+            'names': self.names,
+            'counts': self.counts,
+            'means': self.means,
+            'squares': self.squares,
+            'last_dates': self.last_dates,
+            'last_prices': self.last_prices,
+        }, {'asset_class': self.asset_class, 'files': self.files})
+
+    def last_date(self):
+        """Latest price date seen, as a YYYYMMDD int, or None"""
+        return int(self.last_dates.max()) if len(self) and self.last_dates.max() > 0 else None
+
+    def _codes(self, symbols, names=None):
+        """Instrument index of every symbol, adding the instruments seen for the first time"""
+        symbols = np.asarray(symbols).astype(str)
+        unique, inverse = np.unique(symbols, return_inverse=True)
+        codes = pd.Index(self.symbols).get_indexer(unique)
+
+        new = codes < 0
+        if new.any():
+            added = unique[new]
+            codes[new] = np.arange(len(self), len(self) + len(added))
+            self.symbols = np.concatenate([self.symbols, added])
+            self.names = np.concatenate([self.names, added])
+            self.counts = np.concatenate([self.counts, np.zeros(len(added), dtype=np.int64)])
+            self.means = np.concatenate([self.means, np.zeros(len(added))])
+            self.squares = np.concatenate([self.squares, np.zeros(len(added))])
+            self.last_dates = np.concatenate([self.last_dates, np.zeros(len(added), dtype=np.int64)])
+            self.last_prices = np.concatenate([self.last_prices, np.full(len(added), np.nan)])
+
+        codes = codes[inverse]
+        if names is not None:
+            names = np.asarray(names).astype(str)
+            known = (names != '') & (names != 'nan')
+            if self.names.dtype.itemsize < names.dtype.itemsize:
+                self.names = self.names.astype(names.dtype)
+            self.names[codes[known]] = names[known]
+        return codes
+
+    def update(self, symbols, dates, prices, names=None):
+        """
+        Fold a batch of prices into the statistics.
+
+        Args:
+            symbols (array-like): Instrument of each row
+            dates (array-like): Date of each row as a YYYYMMDD int
+            prices (array-like): Close price of each row
+            names (array-like): Optional display name of each row's instrument
+
+        Returns:
+            int: Daily returns added
+        """
+        codes = self._codes(symbols, names)
+        dates = np.asarray(dates, dtype=float)
+        prices = np.asarray(prices, dtype=float)
+
+        # Only days after what each instrument has already seen, with a usable price
+        keep = np.isfinite(dates) & np.isfinite(prices) & (prices > 0)
+        keep[keep] = dates[keep] > self.last_dates[codes[keep]]
+        codes, dates, prices = codes[keep], dates[keep].astype(np.int64), prices[keep]
+        if not len(codes):
+            return 0
+
+        # Group by instrument in date order, keeping the last price of a repeated day
+        order = np.lexsort((dates, codes))
+        codes, dates, prices = codes[order], dates[order], prices[order]
+        last_of_day = np.ones(len(codes), dtype=bool)
+        last_of_day[:-1] = (codes[1:] != codes[:-1]) | (dates[1:] != dates[:-1])
+        codes, dates, prices = codes[last_of_day], dates[last_of_day], prices[last_of_day]
+
+        # Each row's previous price is the row before it, or the state's last price
+        # at the start of an instrument's run
+        first = np.ones(len(codes), dtype=bool)
+        first[1:] = codes[1:] != codes[:-1]
+        previous = np.empty(len(prices))
+        previous[1:] = prices[:-1]
+        previous[first] = self.last_prices[codes[first]]
+        returns = prices / previous - 1.0
+        valid = np.isfinite(returns)
+
+        size = len(self)
+        batch_codes, batch_returns = codes[valid], returns[valid]
+        batch_counts = np.bincount(batch_codes, minlength=size)
+        batch_sums = np.bincount(batch_codes, weights=batch_returns, minlength=size)
+        touched = batch_counts > 0
+        batch_means = np.zeros(size)
+        batch_means[touched] = batch_sums[touched] / batch_counts[touched]
+        batch_squares = np.bincount(batch_codes, weights=(batch_returns - batch_means[batch_codes]) ** 2,
+                                    minlength=size)
+
+        # Chan et al. merge of (count, mean, M2) pairs
+        counts = self.counts[touched]
+        merged = counts + batch_counts[touched]
+        delta = batch_means[touched] - self.means[touched]
+        self.means[touched] += delta * batch_counts[touched] / merged
+        self.squares[touched] += batch_squares[touched] + delta ** 2 * counts * batch_counts[touched] / merged
+        self.counts[touched] = merged
+
+        # The last row of each instrument's run holds its latest date and price
+        last = np.ones(len(codes), dtype=bool)
+        last[:-1] = codes[1:] != codes[:-1]
+        self.last_dates[codes[last]] = dates[last]
+        self.last_prices[codes[last]] = prices[last]
+        return int(valid.sum())
+
+    def update_from_file(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Stream a price CSV into the statistics in chunks of ``chunk_size`` rows.
+
+        The file either has a date, symbol and price column (one row per
+        instrument and day, e.g. Date,Symbol,Close) or a date column and one
+        price column per instrument. Rows must be in date order per instrument
+        across the file; a row at or before an instrument's last date is ignored.
+        A file whose size and modification time match the last run is skipped.
+
+        Returns:
+            int: Daily returns added, or None if the file was unchanged
+
+        Raises:
+            ValueError: If the file has no recognisable date or price columns
+        """
+        stat = os.stat(path)
+        stamp = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        key = os.path.abspath(path)
+        if self.files.get(key) == stamp:
+            return None
+
+        header = pd.read_csv(path, nrows=0).columns
+        date_column = _first_present(DATE_COLUMNS, header)
+        if date_column is None:
+            raise ValueError(f"{path} has no date column, expected one of {list(DATE_COLUMNS)}")
+        symbol_column = _first_present(SYMBOL_COLUMNS, header)
+        if symbol_column is not None:
+            price_column = _first_present(PRICE_COLUMNS, header)
+            if price_column is None:
+                raise ValueError(f"{path} has no price column, expected one of {list(PRICE_COLUMNS)}")
+            name_column = _first_present(NAME_COLUMNS, header)
+            usecols = [c for c in (date_column, symbol_column, price_column, name_column) if c is not None]
+            dtypes = {symbol_column: str, price_column: float}
+            if name_column is not None:
+                dtypes[name_column] = str
+        else:
+            tickers = [column for column in header if column != date_column]
+            if not tickers:
+                raise ValueError(f"{path} has no price columns")
+            usecols = None
+            dtypes = {ticker: float for ticker in tickers}
+
+        added = 0
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunk_size):
+            dates = _date_keys(chunk[date_column])
+            if symbol_column is not None:
+                added += self.update(chunk[symbol_column].to_numpy(), dates, chunk[price_column].to_numpy(),
+                                     chunk[name_column].to_numpy() if name_column is not None else None)
+            else:
+                # Wide rows -> one (date, instrument, price) triple per cell
+                prices = chunk[tickers].to_numpy(dtype=float)
+                added += self.update(np.tile(np.asarray(tickers, dtype=str), len(chunk)),
+                                     np.repeat(dates, len(tickers)), prices.ravel())
+
+        self.files[key] = stamp
+        return added
+
+    def columns(self, min_observations=MIN_OBSERVATIONS):
+        """
+        Statistics of every instrument with at least ``min_observations`` returns.
+
+        Returns:
+            dict: Canonical column name -> values for the asset class's schema
+            (see market_snapshot.SCHEMAS), in symbol order
+        """
+        keep = self.counts >= max(min_observations, 2)
+        order = np.argsort(self.symbols[keep], kind='stable')
+        counts = self.counts[keep][order]
+        return {
+            'symbol': self.symbols[keep][order],
+            'name': self.names[keep][order],
+            'mean_daily_return': self.means[keep][order],
+            'daily_volatility': np.sqrt(self.squares[keep][order] / (counts - 1)),
+        }
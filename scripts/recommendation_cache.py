@@ -0,0 +1,117 @@
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Buckets are few (a handful per asset class and mode), so this is generous
+DEFAULT_MAX_ENTRIES = 128
+
+
+def is_complete(portfolio):
+    """Whether a portfolio finished its full optimization, i.e. was not cut short by a deadline"""
+    return portfolio.get('quality', 1.0) >= 1.0
+
+
+def scale_portfolio(portfolio, investment_amount):
+    """
+    Turn a cached, amount-free portfolio into a result for one investment amount.
+
+    Args:
+        portfolio (dict): Cached portfolio whose recommendations carry 'weight' in percent
+        investment_amount (float): Amount to spread over the recommendations
+
+    Returns:
+        dict: Copy of the portfolio with an 'amount' on every recommendation
+    """
+    result = dict(portfolio)
+    result['recommendations'] = [
+        dict(rec, amount=investment_amount * (rec['weight'] / 100))
+        for rec in portfolio['recommendations']
+    ]
+    return result
+
+
+class RecommendationCache:
+    """
+    Size-bounded LRU cache of optimizer portfolios.
+
+    Keys are ``(asset_class, bucket, mode, ..., fingerprint)``. Storing an entry with a
+    new fingerprint drops every entry of that asset class built from older data,
+    so a reloaded dataset invalidates its recommendations automatically. Only
+    live data is cached for that reason; as-of replays skip the cache.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached portfolio for ``key`` or None"""
+        with self._lock:
+            portfolio = self._entries.get(key)
+            if portfolio is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return portfolio
+
+    def put(self, key, portfolio):
+        """Store a portfolio, evicting stale and least recently used entries"""
+        asset_class, fingerprint = key[0], key[-1]
+        with self._lock:
+            stale = [
+                cached_key for cached_key in self._entries
+                if cached_key[0] == asset_class and cached_key[-1] != fingerprint
+            ]
+            for cached_key in stale:
+                del self._entries[cached_key]
+            if stale:
+                logger.info(f"Invalidated {len(stale)} cached {asset_class} portfolios after data change")
+
+            self._entries[key] = portfolio
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """
+        Return the cached portfolio for ``key``, computing and storing it on a miss.
+
+        Args:
+            key (tuple): (asset_class, bucket, mode, ..., fingerprint)
+            compute (callable): Builds the portfolio; may return None on failure
+            cacheable (callable): Optional check on a computed portfolio; those it
+                rejects (e.g. cut short by a deadline) are returned but not stored
+
+        Returns:
+            dict: Portfolio, or None if compute failed (failures are not cached)
+        """
+        portfolio = self.get(key)
+        if portfolio is not None:
+            return portfolio
+
+        portfolio = compute()
+        if portfolio is not None and key[-1] is not None and (cacheable is None or cacheable(portfolio)):
+            self.put(key, portfolio)
+        return portfolio
+
+    def invalidate(self, asset_class=None):
+        """Drop every entry, or only those of one asset class"""
+        with self._lock:
+            if asset_class is None:
+                self._entries.clear()
+                return
+            for cached_key in [k for k in self._entries if k[0] == asset_class]:
+                del self._entries[cached_key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Process-wide cache shared by every optimizer instance
+recommendation_cache = RecommendationCache()
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import shutil
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Store read by every process on the host; NEXALT_SHARED_STORE moves it, e.g. to /dev/shm
+DEFAULT_STORE_DIR = os.environ.get('NEXALT_SHARED_STORE') or os.path.join(SCRIPT_DIR, 'shared_store')
+
+MANIFEST_NAME = 'manifest.json'
+
+# File in an entry directory naming its current version subdirectory
+CURRENT_NAME = 'CURRENT'
+
+# Versions of an entry kept on disk: the current one and the one before it, which a
+# reader that looked up the pointer just before a write may still be opening
+KEEP_VERSIONS = 2
+
+# Bumped whenever the layout changes; entries written by another version are ignored
+STORE_FORMAT_VERSION = 3
+
+
+def write_arrays(directory, arrays, metadata=None):
+    """
+    Write named arrays as a new version of a store entry and make it current atomically.
+
+    Each array becomes an .npy file and the names, file names and ``metadata``
+    go in a JSON manifest, all in a fresh version subdirectory of ``directory``.
+    The entry's CURRENT file is then replaced with one naming that subdirectory,
+    so a reader always finds a complete entry, the old one or the new one, and
+    never a mix of both. Older versions beyond KEEP_VERSIONS are removed;
+    processes that still map their files keep them until they let go.
+
+    Args:
+        directory (str): Entry directory, created if needed
+        arrays (dict): Name -> np.ndarray; object arrays must be converted to str first
+        metadata (dict): JSON-serialisable values stored alongside
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    version_dir = os.path.join(directory, version)
+    os.makedirs(version_dir)
+
+    files = {}
+    for index, (name, values) in enumerate(arrays.items()):
+        filename = f"{index}.npy"
+        np.save(os.path.join(version_dir, filename), np.ascontiguousarray(values), allow_pickle=False)
+        files[name] = filename
+
+    manifest = {'format_version': STORE_FORMAT_VERSION, 'arrays': files, 'metadata': metadata or {}}
+    with open(os.path.join(version_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    pointer = os.path.join(directory, f"{CURRENT_NAME}.tmp-{os.getpid()}")
+    with open(pointer, 'w') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(directory, CURRENT_NAME))
+
+    # Earlier versions, and the files of an entry written in an older layout
+    versions = sorted(name for name in os.listdir(directory) if name.startswith('v') and name != version)
+    stale = versions[:max(0, len(versions) - (KEEP_VERSIONS - 1))]
+    if os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        stale += [name for name in os.listdir(directory) if name == MANIFEST_NAME or name.endswith('.npy')]
+    for name in stale:
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def entry_version(directory):
+    """Name of an entry's current version, changing on every write, or None if it has none"""
+    try:
+        with open(os.path.join(directory, CURRENT_NAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def open_arrays(directory):
+    """
+    Memory-map the current version of a store entry written by write_arrays.
+
+    The arrays are read-only views of the files, so every process that opens
+    the same entry shares one copy in the page cache.
+
+    Returns:
+        tuple: (name -> read-only np.memmap dict, metadata dict), or None if the
+        entry is missing or was written in another format version
+    """
+    # A version can be pruned between reading the pointer and opening its files if
+    # two writes land in between; the pointer then names a newer one, so look again
+    for _ in range(3):
+        version = entry_version(directory)
+        if version is None:
+            return None
+        version_dir = os.path.join(directory, version)
+        try:
+            with open(os.path.join(version_dir, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+            if manifest.get('format_version') != STORE_FORMAT_VERSION:
+                logger.warning(f"Ignoring shared store entry {directory} in format {manifest.get('format_version')}")
+                return None
+            arrays = {
+                name: np.load(os.path.join(version_dir, filename), mmap_mode='r', allow_pickle=False)
+                for name, filename in manifest['arrays'].items()
+            }
+            return arrays, manifest['metadata']
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def entry_path(name, store_dir=None):
+    """Directory of a named entry, e.g. 'model' or 'market/bond'"""
+    return os.path.join(store_dir or DEFAULT_STORE_DIR, *name.split('/'))
@@ -0,0 +1,247 @@
+import os
+import datetime
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+import shared_store
+from market_data import MarketDataset
+from market_snapshot import SNAPSHOT_DIR, content_hash, normalize_columns, read_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Histories live in scripts/snapshots/history/<asset class>
+HISTORY_DIR = os.path.join(SNAPSHOT_DIR, 'history')
+
+# Dated datasets kept materialised per asset class
+MAX_CACHED_DATASETS = 16
+
+
+def date_key(value):
+    """
+    Integer YYYYMMDD key of a date.
+
+    Args:
+        value: datetime.date, 'YYYY-MM-DD' or 'YYYYMMDD' string, or YYYYMMDD int
+
+    Raises:
+        ValueError: If the value is not a valid date
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.year * 10000 + value.month * 100 + value.day
+    text = str(value).replace('-', '')
+    parsed = datetime.datetime.strptime(text, '%Y%m%d').date()
+    return parsed.year * 10000 + parsed.month * 100 + parsed.day
+
+
+def key_date(key):
+    """datetime.date of a YYYYMMDD key"""
+    key = int(key)
+    return datetime.date(key // 10000, key // 100 % 100, key % 100)
+
+
+class SnapshotHistory:
+    """
+    Dated versions of one asset class's statistics, with as-of lookup.
+
+    Every distinct instrument row ever recorded is stored once in a row pool
+    (a market_snapshot file), and each date holds only the pool indices of its
+    rows, so an instrument whose statistics do not change costs four bytes per
+    date. The index is a sorted array of dates with offsets into the
+    concatenated row indices; ``as_of`` is a binary search over it. Both files
+    are memory-mapped and replaced atomically, pool first, so a reader that
+    opens the index and then the pool always finds every row it refers to.
+    """
+
+    def __init__(self, asset_class, directory=None):
+        self.asset_class = asset_class
+        self.directory = directory or os.path.join(HISTORY_DIR, asset_class)
+        self.pool_path = os.path.join(self.directory, 'rows.mds')
+        self.index_path = os.path.join(self.directory, 'index')
+        self._lock = threading.Lock()
+        self._datasets = OrderedDict()
+        self._load()
+
+    def _load(self):
+        entry = shared_store.open_arrays(self.index_path)
+        if entry is None:
+            self.dates = np.zeros(0, dtype=np.int32)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.row_ids = np.zeros(0, dtype=np.int32)
+            self.hashes = np.zeros(0, dtype='U40')
+            self.sources = []
+            self.pool = None
+        else:
+            arrays, metadata = entry
+            self.dates = arrays['dates']
+            self.offsets = arrays['offsets']
+            self.row_ids = arrays['row_ids']
+            self.hashes = arrays['hashes']
+            self.sources = metadata.get('sources', [])
+            self.pool = read_snapshot(self.pool_path, self.asset_class)[1]
+        self._datasets.clear()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def pool_size(self):
+        """Distinct instrument rows stored across every date"""
+        return 0 if self.pool is None else len(next(iter(self.pool.values())))
+
+    def date_list(self):
+        """Recorded dates, oldest first"""
+        return [key_date(key) for key in self.dates]
+
+    def _position(self, date, exact=False):
+        key = date_key(date)
+        position = int(np.searchsorted(self.dates, key, side='right')) - 1
+        if position < 0 or (exact and self.dates[position] != key):
+            return None
+        return position
+
+    def as_of(self, date):
+        """
+        Statistics in force on ``date``: those recorded on it or on the latest date before it.
+
+        Returns:
+            MarketDataset: The dated dataset, or None if nothing was recorded that early
+        """
+        position = self._position(date)
+        return None if position is None else self._dataset(position)
+
+    def get(self, date):
+        """Statistics recorded on exactly ``date``, or None"""
+        position = self._position(date, exact=True)
+        return None if position is None else self._dataset(position)
+
+    def effective_date(self, date):
+        """Date of the version as_of(date) returns, or None"""
+        position = self._position(date)
+        return None if position is None else key_date(self.dates[position])
+
+    def _dataset(self, position):
+        key = int(self.dates[position])
+        with self._lock:
+            if key in self._datasets:
+                self._datasets.move_to_end(key)
+                return self._datasets[key]
+
+        rows = self.row_ids[self.offsets[position]:self.offsets[position + 1]]
+        columns = {}
+        for name, values in self.pool.items():
+            column = values[rows]
+            column.setflags(write=False)
+            columns[name] = column
+        dataset = MarketDataset(self.asset_class, f"{self.pool_path}@{key_date(key)}", columns,
+                                str(self.hashes[position]))
+
+        with self._lock:
+            self._datasets[key] = dataset
+            while len(self._datasets) > MAX_CACHED_DATASETS:
+                self._datasets.popitem(last=False)
+        return dataset
+
+    def add(self, date, columns, source=None):
+        """
+        Record the statistics for a date, replacing any version already recorded for it.
+
+        A version identical to the one already in force on that date is not
+        stored, since as-of lookups would return the same data anyway.
+
+        Args:
+            date: Date the statistics apply from, see date_key
+            columns (dict): Column name -> values, see market_snapshot.normalize_columns
+            source (dict): JSON-serialisable provenance, e.g. the CSV file name
+
+        Returns:
+            bool: True if a new version was stored
+        """
+        key = date_key(date)
+        columns = normalize_columns(self.asset_class, columns)
+        digest = content_hash(self.asset_class, columns)
+
+        with self._lock:
+            position = self._position(key)
+            if position is not None and self.hashes[position] == digest:
+                return False
+
+            # Pool rows by value; new rows are appended so existing indices stay valid
+            names = list(columns)
+            pool = {name: list(self.pool[name]) if self.pool is not None else [] for name in names}
+            known = {row: index for index, row in enumerate(zip(*(pool[name] for name in names)))}
+            rows = []
+            for row in zip(*(columns[name] for name in names)):
+                if row not in known:
+                    known[row] = len(known)
+                    for name, value in zip(names, row):
+                        pool[name].append(value)
+                rows.append(known[row])
+
+            rows = np.array(rows, dtype=np.int32)
+            lengths = np.diff(self.offsets)
+            index = int(np.searchsorted(self.dates, key))
+            start = self.offsets[index]
+            sources = list(self.sources)
+            if position is not None and self.dates[position] == key:
+                # Replace the version recorded for this date
+                end = self.offsets[index + 1]
+                dates = np.array(self.dates)
+                hashes = np.array(self.hashes)
+                hashes[index] = digest
+                lengths[index] = len(rows)
+                sources[index] = source or {}
+            else:
+                end = start
+                dates = np.insert(self.dates, index, key)
+                hashes = np.insert(self.hashes, index, digest)
+                lengths = np.insert(lengths, index, len(rows))
+                sources.insert(index, source or {})
+            row_ids = np.concatenate([self.row_ids[:start], rows, self.row_ids[end:]])
+
+            if len(known) > self.pool_size():
+                write_snapshot(self.pool_path, self.asset_class, pool, {'history': True})
+            shared_store.write_arrays(self.index_path, {
+                'dates': dates.astype(np.int32),
+                'offsets': np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                'row_ids': row_ids.astype(np.int32),
+                'hashes': hashes.astype('U40'),
+            }, {'asset_class': self.asset_class, 'sources': sources})
+            self._load()
+        return True
+
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def get_history(asset_class, directory=None):
+    """Shared SnapshotHistory for an asset class, reopened when another process updates it"""
+    history_dir = directory or os.path.join(HISTORY_DIR, asset_class)
+    stamp = shared_store.entry_version(os.path.join(history_dir, 'index'))
+
+    with _histories_lock:
+        cached = _histories.get(history_dir)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        history = SnapshotHistory(asset_class, history_dir)
+        _histories[history_dir] = (stamp, history)
+        return history
+
+
+def dataset_as_of(asset_class, date, directory=None):
+    """
+    Historical dataset for an asset class as of a date.
+
+    Returns:
+        MarketDataset: Statistics in force on ``date``, or None if the history has none
+    """
+    try:
+        dataset = get_history(asset_class, directory).as_of(date)
+    except Exception as e:
+        logger.error(f"Failed to read {asset_class} history as of {date}: {e}")
+        return None
+    if dataset is None:
+        logger.error(f"No {asset_class} statistics recorded on or before {date}")
+    return dataset